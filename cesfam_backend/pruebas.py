@@ -0,0 +1,21 @@
+"""
+Ejecutor de pruebas del proyecto.
+
+Igual que DiscoverRunner, pero con los ajustes que las pruebas necesitan
+distintos de producción (como Django hace con EMAIL_BACKEND).
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class EjecutorPruebas(DiscoverRunner):
+    """DiscoverRunner con la auditoría escrita en línea (AUDITORIA_ASINCRONA=False)."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._ajustes_prueba = override_settings(AUDITORIA_ASINCRONA=False)
+        self._ajustes_prueba.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._ajustes_prueba.disable()
+        super().teardown_test_environment(**kwargs)
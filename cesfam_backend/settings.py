@@ -62,6 +62,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'intranet.context_processors.bandeja_pendientes',
+                'intranet.context_processors.clave_idempotencia',
             ],
         },
     },
@@ -136,4 +138,47 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'intranet/static'),
 ]
 
-LOGIN_URL = 'login'
\ No newline at end of file
+LOGIN_URL = 'login'
+
+# Reglas del traspaso anual de saldos (python manage.py traspasar_saldos)
+# *_ARRASTRE_MAX: días que se conservan del año anterior (None = sin tope)
+SALDOS_ANUALES = {
+    'VACACIONES_BASE': 15,
+    'VACACIONES_ARRASTRE_MAX': 15,  # Feriado legal acumulable hasta dos periodos
+    'ADMIN_BASE': 6,
+    'ADMIN_ARRASTRE_MAX': 0,        # Los días administrativos no se acumulan
+    'HORAS_COMPENSACION_ARRASTRE_MAX': None,
+}
+
+# Envíos idempotentes (intranet/idempotencia.py): segundos que se recuerda una
+# clave ya usada y tiempo máximo que un reintento espera a la petición original.
+# Con varios procesos de servidor, configurar CACHES con un backend compartido.
+IDEMPOTENCIA_TTL = 600
+IDEMPOTENCIA_ESPERA = 5
+
+# Reportes en segundo plano (intranet/trabajos.py): horas que un archivo
+# generado queda disponible para descarga antes de que el worker lo elimine.
+REPORTES_VIGENCIA_HORAS = 24
+
+# Auditoría (intranet/auditoria.py): los registros se encolan al confirmar la
+# transacción y un hilo los inserta en lotes de AUDITORIA_TAMANO_LOTE o cada
+# AUDITORIA_INTERVALO segundos. Lo encolado y aún no escrito se pierde si el
+# proceso muere sin cerrarse (ver la docstring del módulo); con False se
+# escriben en línea. Las pruebas lo desactivan (ver TEST_RUNNER).
+AUDITORIA_ASINCRONA = True
+AUDITORIA_TAMANO_LOTE = 100
+AUDITORIA_INTERVALO = 2.0
+
+# Las pruebas corren con la auditoría en línea, para que cada prueba vea sus
+# registros de inmediato (cesfam_backend/pruebas.py).
+TEST_RUNNER = 'cesfam_backend.pruebas.EjecutorPruebas'
+
+# Retención de auditoría (intranet/archivo_auditoria.py): el comando
+# archivar_auditoria mueve los meses completos más antiguos que
+# AUDITORIA_RETENCION_DIAS a archivos comprimidos en AUDITORIA_ARCHIVO_DIR.
+AUDITORIA_RETENCION_DIAS = 365
+AUDITORIA_ARCHIVO_DIR = BASE_DIR / 'archivo_auditoria'
+
+# Importación masiva de funcionarios (intranet/importacion.py): procesos que
+# hashean las contraseñas en paralelo. None usa uno por CPU.
+IMPORTACION_PROCESOS = None
@@ -0,0 +1,253 @@
+"""
+Retención de Logs_Auditoria en archivos comprimidos.
+
+Los registros más antiguos que AUDITORIA_RETENCION_DIAS se mueven, por mes
+completo, a archivos JSONL comprimidos (logs_AAAA-MM.jsonl.gz) en
+AUDITORIA_ARCHIVO_DIR:
+
+1. Se escriben en un archivo temporal el contenido ya archivado del mes (si
+   una ejecución anterior quedó a medias) y, por lotes, los registros del mes
+   que aún no estaban archivados.
+2. Se relee el temporal y se compara la cantidad de líneas con la esperada;
+   si no coincide no se borra nada.
+3. El temporal se sincroniza a disco y reemplaza al archivo definitivo con
+   os.replace: ante una caída queda el archivo anterior o el nuevo completo,
+   nunca uno truncado.
+4. Los registros archivados se eliminan en bloques, cada uno en su propia
+   transacción, para no bloquear la tabla por mucho tiempo.
+
+Antes de archivar se actualizan los resúmenes mensuales de logs, que
+conservan los conteos de los meses archivados; por eso 'actualizar_resumenes
+--reconstruir' no borra el resumen de los meses que tienen archivo
+(meses_archivados).
+
+buscar_en_archivo() recorre solo los archivos de los meses pedidos, línea a
+línea, sin cargarlos en la base de datos.
+"""
+import gzip
+import json
+import os
+import shutil
+import zlib
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .estadisticas import limites_mes, meses_entre
+from .models import Logs_Auditoria
+from .resumenes import actualizar_fuente
+
+TAMANO_LOTE_ARCHIVO = 2000
+TAMANO_BLOQUE_BORRADO = 500
+
+
+class ArchivoInconsistente(Exception):
+    """El archivo escrito no contiene los mismos registros que la base."""
+
+
+def directorio_archivo():
+    """Directorio de los archivos de auditoría (se crea si no existe)."""
+    directorio = Path(getattr(settings, 'AUDITORIA_ARCHIVO_DIR', settings.BASE_DIR / 'archivo_auditoria'))
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def ruta_mes(mes):
+    """Archivo del mes indicado."""
+    return directorio_archivo() / f'logs_{mes:%Y-%m}.jsonl.gz'
+
+
+def meses_archivados():
+    """Meses (primer día) que tienen archivo en el directorio."""
+    meses = set()
+    for ruta in directorio_archivo().glob('logs_*.jsonl.gz'):
+        try:
+            meses.add(datetime.strptime(ruta.name, 'logs_%Y-%m.jsonl.gz').date())
+        except ValueError:
+            continue  # otro archivo con un nombre parecido
+    return meses
+
+
+def limite_retencion(dias=None):
+    """Primer día del mes más antiguo que se conserva en la base (se archiva por mes completo)."""
+    dias = getattr(settings, 'AUDITORIA_RETENCION_DIAS', 365) if dias is None else dias
+    return (timezone.localdate() - timedelta(days=dias)).replace(day=1)
+
+
+def _rango_mes(mes):
+    """Rango [inicio, fin) en fecha-hora local del mes."""
+    inicio, ultimo = limites_mes(mes)
+    return (timezone.make_aware(datetime.combine(inicio, time.min)),
+            timezone.make_aware(datetime.combine(ultimo + timedelta(days=1), time.min)))
+
+
+def _registros_mes(mes):
+    inicio, fin = _rango_mes(mes)
+    return Logs_Auditoria.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin)
+
+
+def _como_json(pk, fecha_hora, actor_id, actor, accion, detalle, codigo, app, modelo, id_objeto, datos):
+    return json.dumps({
+        'id': pk, 'fecha_hora': timezone.localtime(fecha_hora).isoformat(),
+        'actor_id': actor_id, 'actor': actor, 'accion': accion, 'detalle': detalle,
+        'codigo': codigo, 'objeto': f'{app}.{modelo}' if modelo else None, 'id_objeto': id_objeto,
+        'datos': datos,
+    }, ensure_ascii=False, cls=DjangoJSONEncoder)
+
+
+def leer_archivo(ruta):
+    """
+    Registros (dict) de un archivo, línea a línea.
+
+    Raises:
+        ArchivoInconsistente: si el archivo está truncado o dañado.
+    """
+    try:
+        with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+            for linea in archivo:
+                if linea.strip():
+                    yield json.loads(linea)
+    except (EOFError, gzip.BadGzipFile, zlib.error, UnicodeDecodeError, json.JSONDecodeError) as error:
+        raise ArchivoInconsistente(f'{Path(ruta).name} está dañado: {error}') from error
+
+
+def _sincronizar_directorio(directorio):
+    """Lleva a disco la entrada del directorio tras un os.replace (solo POSIX)."""
+    if os.name != 'posix':
+        return
+    descriptor = os.open(directorio, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def meses_por_archivar(limite):
+    """Meses (primer día) con registros anteriores al límite."""
+    primero = Logs_Auditoria.objects.filter(
+        fecha_hora__lt=timezone.make_aware(datetime.combine(limite, time.min))
+    ).order_by('fecha_hora').values_list('fecha_hora', flat=True).first()
+    if primero is None:
+        return []
+    return list(meses_entre(timezone.localdate(primero), limite - timedelta(days=1)))
+
+
+def archivar_mes(mes):
+    """
+    Archiva y elimina los registros de un mes.
+
+    Returns:
+        int: registros archivados.
+
+    Raises:
+        ArchivoInconsistente: si la verificación de conteo falla o el archivo
+        existente está dañado (no se elimina nada).
+    """
+    destino = ruta_mes(mes)
+    temporal = destino.with_name(destino.name + '.tmp')
+    ya_archivados = [registro['id'] for registro in leer_archivo(destino)] if destino.exists() else []
+
+    registros = _registros_mes(mes).order_by('pk')
+    ultimo_id = registros.values_list('pk', flat=True).last()
+    if ultimo_id is None:
+        return 0
+    registros = registros.filter(pk__lte=ultimo_id)
+
+    # 1. Escribir en el temporal lo ya archivado y los registros nuevos por lotes
+    escritos = omitidos = 0
+    omitir = set(ya_archivados)
+    with open(temporal, 'wb') as crudo:
+        if ya_archivados:
+            # Un gzip puede tener varios miembros concatenados: se copia tal cual
+            with open(destino, 'rb') as anterior:
+                shutil.copyfileobj(anterior, crudo)
+        with gzip.open(crudo, 'wt', encoding='utf-8') as archivo:
+            filas = registros.values_list(
+                'pk', 'fecha_hora', 'id_usuario_actor_id', 'id_usuario_actor__username', 'accion', 'detalle',
+                'codigo', 'tipo_objeto__app_label', 'tipo_objeto__model', 'id_objeto', 'datos',
+            ).iterator(chunk_size=TAMANO_LOTE_ARCHIVO)
+            for fila in filas:
+                if fila[0] in omitir:
+                    omitidos += 1
+                    continue
+                archivo.write(_como_json(*fila) + '\n')
+                escritos += 1
+        crudo.flush()
+        os.fsync(crudo.fileno())
+
+    # 2. Verificar el conteo antes de tocar la base: todo lo leído quedó en el archivo
+    try:
+        leidos = sum(1 for _ in leer_archivo(temporal))
+    except ArchivoInconsistente:
+        temporal.unlink()
+        raise
+    esperados = registros.count()
+    if leidos != len(ya_archivados) + escritos or escritos + omitidos != esperados:
+        temporal.unlink()
+        raise ArchivoInconsistente(
+            f'{mes:%Y-%m}: {esperados} registros en la base, {escritos + omitidos} procesados '
+            f'y {leidos - len(ya_archivados)} nuevos leídos del archivo.'
+        )
+
+    # 3. Publicar el archivo completo de una vez
+    os.replace(temporal, destino)
+    _sincronizar_directorio(destino.parent)
+
+    # 4. Eliminar en bloques cortos
+    while True:
+        with transaction.atomic():
+            bloque = list(registros.values_list('pk', flat=True)[:TAMANO_BLOQUE_BORRADO])
+            if not bloque:
+                break
+            Logs_Auditoria.objects.filter(pk__in=bloque).delete()
+    return escritos
+
+
+def archivar_anteriores(dias=None):
+    """
+    Archiva todos los meses completos anteriores a la retención.
+
+    Returns:
+        list: tuplas (mes, registros archivados).
+    """
+    limite = limite_retencion(dias)
+    meses = meses_por_archivar(limite)
+    if meses:
+        # Los resúmenes mensuales deben quedar al día antes de borrar el detalle
+        actualizar_fuente('logs')
+    return [(mes, archivar_mes(mes)) for mes in meses]
+
+
+def buscar_en_archivo(desde, hasta, accion=None, actor=None, texto=None, codigo=None):
+    """
+    Registros archivados entre desde y hasta (fechas, inclusive), en el orden
+    en que se archivaron (por id). Lee los archivos en flujo, sin cargarlos.
+
+    Args:
+        accion: acción exacta (opcional).
+        actor: nombre de usuario del actor (opcional).
+        texto: texto a buscar en el detalle, sin distinguir mayúsculas (opcional).
+        codigo: código estructurado exacto (opcional).
+    """
+    texto = texto.lower() if texto else None
+    for mes in meses_entre(desde, hasta):
+        ruta = ruta_mes(mes)
+        if not ruta.exists():
+            continue
+        for registro in leer_archivo(ruta):
+            dia = datetime.fromisoformat(registro['fecha_hora']).date()
+            if not desde <= dia <= hasta:
+                continue
+            if accion and registro['accion'] != accion:
+                continue
+            if actor and registro['actor'] != actor:
+                continue
+            if codigo and registro.get('codigo') != codigo:
+                continue
+            if texto and texto not in (registro['detalle'] or '').lower():
+                continue
+            yield registro
@@ -0,0 +1,286 @@
+"""
+Escritura de registros de auditoría.
+
+Las vistas llaman a registrar_auditoria() en lugar de crear el registro en la
+petición. Con AUDITORIA_ASINCRONA activo:
+
+1. El registro se arma con la hora de la acción y, cuando la transacción en
+   curso confirma, se deja en una cola en memoria del proceso.
+2. Un hilo de fondo toma hasta AUDITORIA_TAMANO_LOTE registros (o los que
+   lleguen en AUDITORIA_INTERVALO segundos) y los inserta con un bulk_create:
+   en SQLite es un solo bloqueo de escritura por lote y no uno por petición.
+3. Si la cola está llena el registro se escribe en línea; si un lote falla,
+   sus registros se reintentan uno a uno.
+4. Al terminar el proceso (atexit) o al recibir SIGTERM, si nadie más maneja
+   esa señal, se vacía la cola antes de salir.
+
+La cola vive en la memoria del proceso: si el proceso muere sin pasar por el
+paso 4 (SIGKILL, OOM, un worker que el servidor mata por timeout, o un
+manejador de SIGTERM ajeno que no termina con sys.exit) se pierden los
+registros aún no escritos, como máximo los de los últimos
+AUDITORIA_INTERVALO segundos. Donde eso no sea aceptable, desactivar
+AUDITORIA_ASINCRONA.
+
+Sin AUDITORIA_ASINCRONA (ej. al correr las pruebas) el registro se inserta
+en línea, dentro de la transacción de la vista.
+
+El visor de auditoría pagina por cursor (fecha_hora, id) en lugar de OFFSET:
+cada página es un rango del índice que parte del último registro mostrado,
+por lo que la página 1 y la página 1000 cuestan lo mismo.
+"""
+import atexit
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from .models import Funcionarios, Logs_Auditoria
+
+logger = logging.getLogger(__name__)
+
+TAMANO_COLA = 10000
+TAMANO_PAGINA_LOGS = 50
+CACHE_ACCIONES = 'auditoria:acciones'
+CACHE_ACCIONES_TTL = 600
+CACHE_ACTORES = 'auditoria:actores'
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ESPERA_CIERRE = 10  # segundos que el cierre espera al hilo escritor
+_FIN = object()
+
+
+def escribir_lote(registros):
+    """Inserta los registros en un solo INSERT; si falla, intenta uno por uno."""
+    try:
+        Logs_Auditoria.objects.bulk_create(registros)
+    except DatabaseError:
+        logger.exception('Falló la inserción en lote de %s registros de auditoría', len(registros))
+        for registro in registros:
+            try:
+                registro.save()
+            except DatabaseError:
+                logger.exception('Registro de auditoría perdido: %s - %s', registro.accion, registro.detalle)
+
+
+class EscritorAuditoria:
+    """Cola en memoria con un hilo que inserta los registros por lotes."""
+
+    def __init__(self, tamano_lote=None, intervalo=None):
+        self.tamano_lote = tamano_lote or getattr(settings, 'AUDITORIA_TAMANO_LOTE', 100)
+        self.intervalo = intervalo or getattr(settings, 'AUDITORIA_INTERVALO', 2.0)
+        self._cola = queue.Queue(maxsize=TAMANO_COLA)
+        self._hilo = None
+        self._candado = threading.Lock()
+
+    def encolar(self, registro):
+        """Deja el registro para el próximo lote (o lo escribe en línea si la cola está llena)."""
+        self._asegurar_hilo()
+        try:
+            self._cola.put_nowait(registro)
+        except queue.Full:
+            escribir_lote([registro])
+
+    def _asegurar_hilo(self):
+        # El hilo se crea al primer uso (y de nuevo si murió, ej. tras un fork)
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._candado:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._trabajar, name='escritor-auditoria', daemon=True)
+                self._hilo.start()
+
+    def _tomar_lote(self):
+        """Espera un registro y junta más hasta completar el lote o vencer el intervalo."""
+        lote = [self._cola.get()]
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamano_lote and lote[-1] is not _FIN:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _trabajar(self):
+        while True:
+            lote = self._tomar_lote()
+            terminar = lote[-1] is _FIN
+            registros = [registro for registro in lote if registro is not _FIN]
+            try:
+                if registros:
+                    escribir_lote(registros)
+            finally:
+                # El hilo usa su propia conexión; no dejarla abierta entre lotes
+                connections.close_all()
+            if terminar:
+                return
+
+    def detener(self):
+        """Escribe lo pendiente y detiene el hilo (al cerrar el proceso)."""
+        if self._hilo is not None and self._hilo.is_alive():
+            self._cola.put(_FIN)
+            self._hilo.join(ESPERA_CIERRE)
+        # Lo que quede (hilo detenido o que no alcanzó a terminar) se escribe aquí
+        pendientes = []
+        while True:
+            try:
+                registro = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if registro is not _FIN:
+                pendientes.append(registro)
+        if pendientes:
+            escribir_lote(pendientes)
+
+
+def _detener_por_senal(signum, frame):
+    # Se vacía la cola y se vuelve a enviar la señal con su acción por defecto
+    escritor.detener()
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+def _instalar_cierre_por_senal():
+    """
+    Vacía la cola también al recibir SIGTERM, que por defecto termina el
+    proceso sin ejecutar atexit. Solo se instala si nadie más maneja la señal
+    (gunicorn, uwsgi y similares instalan la suya y salen por sys.exit).
+    """
+    if not getattr(settings, 'AUDITORIA_ASINCRONA', False):
+        return
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _detener_por_senal)
+
+
+escritor = EscritorAuditoria()
+atexit.register(escritor.detener)
+_instalar_cierre_por_senal()
+
+
+def registrar_auditoria(actor, accion, detalle='', codigo='', objeto=None, datos=None):
+    """
+    Registra una acción en la auditoría.
+
+    Args:
+        actor: Funcionario que realiza la acción (o None).
+        accion: nombre corto de la acción (ej. 'Solicitud Aprobada').
+        detalle: descripción de la acción.
+        codigo: código estructurado (ver Logs_Auditoria.CODIGOS).
+        objeto: instancia afectada; su historial se consulta con historial_de().
+        datos: dict con los valores relevantes de la acción.
+    """
+    registro = Logs_Auditoria(
+        id_usuario_actor_id=getattr(actor, 'pk', None), accion=accion, detalle=detalle,
+        fecha_hora=timezone.now(), codigo=codigo, datos=datos or {},
+    )
+    if objeto is not None:
+        # get_for_model queda en caché del proceso: no agrega consultas
+        registro.tipo_objeto = ContentType.objects.get_for_model(objeto)
+        registro.id_objeto = objeto.pk
+    if not getattr(settings, 'AUDITORIA_ASINCRONA', False):
+        registro.save()
+        return
+    # Si la transacción de la vista se revierte, la acción no ocurrió
+    transaction.on_commit(lambda: escritor.encolar(registro))
+
+
+def historial_de(objeto):
+    """
+    Registros de auditoría de un objeto, más recientes primero.
+
+    Es un rango del índice log_objeto_fecha_idx (tipo, id, fecha): no recorre
+    el detalle de texto.
+    """
+    return Logs_Auditoria.objects.filter(
+        tipo_objeto=ContentType.objects.get_for_model(objeto), id_objeto=objeto.pk
+    ).order_by('-fecha_hora', '-pk')
+
+
+def _cursor(registro):
+    """Cursor opaco de un registro: microsegundos de su fecha_hora e id."""
+    return f'{(registro.fecha_hora - _EPOCA) // timedelta(microseconds=1)}.{registro.pk}'
+
+
+def _leer_cursor(cursor):
+    microsegundos, pk = cursor.split('.')
+    return _EPOCA + timedelta(microseconds=int(microsegundos)), int(pk)
+
+
+def pagina_logs(logs, params, tamano=TAMANO_PAGINA_LOGS):
+    """
+    Página de registros (más recientes primero) a partir del cursor recibido.
+
+    Args:
+        logs: queryset ya filtrado.
+        params: QueryDict con 'antes' (página más antigua) o 'despues' (más reciente).
+
+    Returns:
+        dict: 'registros' (con su actor cargado en la misma consulta) y los
+        cursores 'antes' y 'despues' para navegar (None si no hay más).
+
+    Raises:
+        ValueError: si el cursor es inválido.
+    """
+    # Actor en la misma consulta, solo con las columnas que se muestran
+    logs = logs.select_related('id_usuario_actor').only(
+        'fecha_hora', 'accion', 'detalle', 'codigo', 'tipo_objeto', 'id_objeto', 'id_usuario_actor__username',
+        'id_usuario_actor__first_name', 'id_usuario_actor__last_name',
+    )
+    if params.get('despues'):
+        fecha, pk = _leer_cursor(params['despues'])
+        # fecha_hora >= f (rango del índice) salvo los ya mostrados con la misma fecha
+        registros = list(
+            logs.filter(fecha_hora__gte=fecha).exclude(fecha_hora=fecha, pk__lte=pk)
+            .order_by('fecha_hora', 'pk')[:tamano + 1]
+        )
+        hay_recientes, hay_antiguos = len(registros) > tamano, True
+        registros = registros[:tamano][::-1]
+    else:
+        if params.get('antes'):
+            fecha, pk = _leer_cursor(params['antes'])
+            logs = logs.filter(fecha_hora__lte=fecha).exclude(fecha_hora=fecha, pk__gte=pk)
+        registros = list(logs.order_by('-fecha_hora', '-pk')[:tamano + 1])
+        hay_recientes, hay_antiguos = bool(params.get('antes')), len(registros) > tamano
+        registros = registros[:tamano]
+
+    return {
+        'registros': registros,
+        'antes': _cursor(registros[-1]) if registros and hay_antiguos else None,
+        'despues': _cursor(registros[0]) if registros and hay_recientes else None,
+    }
+
+
+def acciones_registradas():
+    """Acciones distintas de la auditoría (para el filtro del visor), desde caché."""
+    acciones = cache.get(CACHE_ACCIONES)
+    if acciones is None:
+        acciones = list(
+            Logs_Auditoria.objects.order_by('accion').values_list('accion', flat=True).distinct()
+        )
+        cache.set(CACHE_ACCIONES, acciones, CACHE_ACCIONES_TTL)
+    return acciones
+
+
+def actores_registrados():
+    """Usuarios (pk y username) que aparecen como actor en la auditoría, desde caché."""
+    actores = cache.get(CACHE_ACTORES)
+    if actores is None:
+        actores = list(
+            Funcionarios.objects.filter(
+                pk__in=Logs_Auditoria.objects.filter(id_usuario_actor__isnull=False).values('id_usuario_actor')
+            ).order_by('username').values('pk', 'username')
+        )
+        cache.set(CACHE_ACTORES, actores, CACHE_ACCIONES_TTL)
+    return actores
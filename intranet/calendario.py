@@ -0,0 +1,300 @@
+"""
+Datos del calendario institucional para FullCalendar.
+
+FullCalendar pide los eventos de la ventana visible con los parámetros 'start'
+y 'end' (fin exclusivo). Solo se leen los eventos que se solapan con esa
+ventana, con las columnas necesarias, de modo que el costo depende del mes
+mostrado y no del tamaño de la tabla.
+
+Además, el calendario tiene una versión (versiones.py, guardada en la base
+para que todos los procesos la compartan) que se renueva cada vez que se
+guarda o elimina un Eventos_Calendario (ver signals.py). Esa versión es el
+ETag/Last-Modified del feed y forma parte de la clave del JSON ya serializado
+de cada ventana: una petición sin cambios responde 304 con solo la lectura de
+la versión, y una con cambios recalcula solo la ventana pedida.
+
+Los eventos recurrentes (semanal/mensual) se guardan como una sola fila con su
+regla; las ocurrencias se expanden solo para la ventana pedida, saltando
+directamente a la primera que la toca y omitiendo las fechas canceladas.
+
+La capa de ausencias (?capa=ausencias) muestra los permisos aprobados y las
+licencias de los funcionarios que el usuario gestiona. Se lee con una consulta
+por fuente (con el nombre del funcionario en la misma consulta) y los días
+contiguos de cada persona se fusionan en un solo rango. Tiene su propia
+versión, renovada con cada cambio de SolicitudesPermiso o Licencias, y su
+caché y ETag incluyen el alcance del usuario (unidad, jefatura y rol), porque
+de eso depende a quién puede ver: un jefe degradado o trasladado deja de
+recibir la capa de su unidad anterior sin esperar a que cambie una ausencia.
+"""
+import json
+from calendar import monthrange
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from .cobertura import intervalos_fusionados
+from .estadisticas import limites_mes
+from .models import Eventos_Calendario, Licencias, SolicitudesPermiso
+from .versiones import renovar_version, version_datos
+
+COLOR_FERIADO = '#f4a460'
+COLOR_EVENTO = '#1E4A7B'
+COLOR_AUSENCIA = '#8e44ad'
+CAPA_AUSENCIAS = 'ausencias'
+# Ventana máxima aceptada (la vista de mes de FullCalendar abarca 6 semanas)
+MAX_DIAS_VENTANA = 400
+CAMPOS_EVENTO = ('id', 'titulo', 'fecha_inicio', 'fecha_fin', 'tipo_evento',
+                 'frecuencia', 'intervalo', 'repetir_hasta', 'excepciones')
+CACHE_VERSION_CALENDARIO = 'calendario:version'
+CACHE_VERSION_AUSENCIAS = 'calendario:ausencias:version'
+CACHE_FEED_CALENDARIO = 'calendario:feed:{version}:{inicio:%Y%m%d}:{fin:%Y%m%d}'
+CACHE_FEED_AUSENCIAS = 'calendario:ausencias:{version}:{alcance}:{inicio:%Y%m%d}:{fin:%Y%m%d}'
+# Las claves de versiones anteriores quedan huérfanas y caducan solas
+CACHE_FEED_TTL = 60 * 60 * 24
+
+
+def _fecha_iso(valor):
+    # FullCalendar envía fecha-hora ISO (ej. 2024-02-25T00:00:00-03:00); basta la fecha
+    return date.fromisoformat(valor[:10])
+
+
+def ventana_calendario(params):
+    """
+    Lee la ventana 'start'/'end' enviada por FullCalendar; por defecto el mes actual.
+
+    Returns:
+        tuple: (inicio, fin) con fin exclusivo.
+
+    Raises:
+        ValueError: si las fechas son inválidas, están invertidas o la ventana supera MAX_DIAS_VENTANA.
+    """
+    if params.get('start') and params.get('end'):
+        inicio, fin = _fecha_iso(params['start']), _fecha_iso(params['end'])
+    else:
+        inicio, ultimo = limites_mes(timezone.localdate())
+        fin = ultimo + timedelta(days=1)
+    if not inicio < fin or (fin - inicio).days > MAX_DIAS_VENTANA:
+        raise ValueError(f'La ventana debe estar ordenada y abarcar como máximo {MAX_DIAS_VENTANA} días.')
+    return inicio, fin
+
+
+def eventos_en_ventana(inicio, fin):
+    """
+    Eventos (y series recurrentes) que pueden tocar [inicio, fin). Un evento sin
+    fecha_fin dura un día. Las ramas usan los índices (fecha_fin, fecha_inicio)
+    y (frecuencia, fecha_inicio).
+    """
+    recurrentes = [clave for clave, _ in Eventos_Calendario.FRECUENCIAS if clave]
+    return Eventos_Calendario.objects.filter(
+        Q(fecha_fin__gte=inicio, fecha_inicio__lt=fin)
+        | Q(fecha_fin__isnull=True, fecha_inicio__gte=inicio, fecha_inicio__lt=fin)
+        | Q(Q(repetir_hasta__isnull=True) | Q(repetir_hasta__gte=inicio),
+            frecuencia__in=recurrentes, fecha_inicio__lt=fin)
+    ).values(*CAMPOS_EVENTO)
+
+
+def sumar_meses(fecha, meses, dia):
+    """Misma fecha 'meses' después; el día se ajusta al último del mes si no existe (ej. 31)."""
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    anio, mes = indice // 12, indice % 12 + 1
+    return date(anio, mes, min(dia, monthrange(anio, mes)[1]))
+
+
+def fechas_serie(evento, inicio, fin):
+    """
+    Fechas de inicio de las ocurrencias de una serie que tocan [inicio, fin),
+    sin recorrer las anteriores a la ventana ni incluir las canceladas.
+    """
+    primera = evento['fecha_inicio']
+    duracion = (evento['fecha_fin'] or primera) - primera
+    paso = max(evento['intervalo'] or 1, 1)
+    desde = inicio - duracion  # ocurrencias que comenzaron antes y siguen en curso
+    ultima = fin - timedelta(days=1)
+    if evento['repetir_hasta']:
+        ultima = min(ultima, evento['repetir_hasta'])
+    canceladas = set(evento['excepciones'] or ())
+
+    if evento['frecuencia'] == 'semanal':
+        n = max(0, (desde - primera).days // (7 * paso))
+        def ocurrencia(n):
+            return primera + timedelta(weeks=n * paso)
+    else:
+        n = max(0, ((desde.year - primera.year) * 12 + desde.month - primera.month) // paso)
+        def ocurrencia(n):
+            return sumar_meses(primera, n * paso, primera.day)
+
+    fecha = ocurrencia(n)
+    while fecha <= ultima:
+        if fecha >= desde and fecha.isoformat() not in canceladas:
+            yield fecha
+        n += 1
+        fecha = ocurrencia(n)
+
+
+def es_ocurrencia(evento, fecha):
+    """Indica si la serie (instancia de Eventos_Calendario) tiene una ocurrencia vigente que comienza en 'fecha'."""
+    datos = {campo: getattr(evento, campo) for campo in CAMPOS_EVENTO}
+    return fecha in fechas_serie(dict(datos, fecha_fin=None), fecha, fecha + timedelta(days=1))
+
+
+def ocurrencias_en_ventana(inicio, fin):
+    """Eventos de la ventana con las series recurrentes expandidas (una entrada por ocurrencia)."""
+    for evento in eventos_en_ventana(inicio, fin):
+        if not evento['frecuencia']:
+            yield evento
+            continue
+        duracion = (evento['fecha_fin'] or evento['fecha_inicio']) - evento['fecha_inicio']
+        for fecha in fechas_serie(evento, inicio, fin):
+            yield dict(evento, fecha_inicio=fecha, fecha_fin=fecha + duracion if evento['fecha_fin'] else None)
+
+
+def proximos_eventos(hoy, dias=7, limite=5):
+    """Ocurrencias que comienzan entre hoy y 'dias' después, por fecha (para el dashboard)."""
+    ocurrencias = [
+        evento for evento in ocurrencias_en_ventana(hoy, hoy + timedelta(days=dias + 1))
+        if evento['fecha_inicio'] >= hoy
+    ]
+    return sorted(ocurrencias, key=lambda evento: evento['fecha_inicio'])[:limite]
+
+
+def eventos_fullcalendar(inicio, fin):
+    """Eventos de la ventana en el formato que espera FullCalendar."""
+    return [
+        {
+            'title': f"{evento['tipo_evento']}: {evento['titulo']}",
+            'start': evento['fecha_inicio'].isoformat(),
+            # Si hay fecha fin, la usa, sino, usa la de inicio
+            'end': (evento['fecha_fin'] or evento['fecha_inicio']).isoformat(),
+            'color': COLOR_FERIADO if evento['tipo_evento'] == 'Feriado' else COLOR_EVENTO,
+            'allDay': True,
+        }
+        for evento in ocurrencias_en_ventana(inicio, fin)
+    ]
+
+
+def version_calendario(clave=CACHE_VERSION_CALENDARIO, request=None):
+    """
+    Versión actual del calendario o de la capa de ausencias (nanosegundos del
+    último cambio), leída de la base y recordada durante la petición.
+    """
+    return version_datos(clave, request)
+
+
+def invalidar_calendario(clave=CACHE_VERSION_CALENDARIO):
+    """Renueva la versión indicada; los feeds cacheados con la anterior dejan de usarse."""
+    renovar_version(clave)
+
+
+def invalidar_ausencias():
+    """Renueva la versión de la capa de ausencias."""
+    invalidar_calendario(CACHE_VERSION_AUSENCIAS)
+
+
+def ultima_modificacion(version):
+    """Fecha-hora (UTC) de una versión del calendario, para Last-Modified."""
+    return datetime.fromtimestamp(version // 10**9, tz=dt_timezone.utc)
+
+
+def etag_feed(version, inicio, fin):
+    """ETag del feed de una ventana para una versión del calendario."""
+    return f'{version}-{inicio:%Y%m%d}-{fin:%Y%m%d}'
+
+
+def feed_serializado(inicio, fin, version=None):
+    """JSON del feed de la ventana, serializado una sola vez por versión del calendario."""
+    version = version or version_calendario()
+    clave = CACHE_FEED_CALENDARIO.format(version=version, inicio=inicio, fin=fin)
+    contenido = cache.get(clave)
+    if contenido is None:
+        contenido = json.dumps(eventos_fullcalendar(inicio, fin), cls=DjangoJSONEncoder)
+        cache.set(clave, contenido, CACHE_FEED_TTL)
+    return contenido
+
+
+def ausencias_en_ventana(funcionarios, inicio, fin):
+    """
+    Intervalos (persona, inicio, fin) de permisos aprobados y licencias de los
+    funcionarios indicados que tocan [inicio, fin), y el nombre de cada persona.
+    Una consulta por fuente, con el nombre en la misma fila.
+    """
+    nombres = {}
+    intervalos = []
+    consultas = (
+        SolicitudesPermiso.objects.filter(
+            id_funcionario_solicitante__in=funcionarios, estado='Aprobado',
+            fecha_inicio__lt=fin, fecha_fin__gte=inicio,
+        ).values_list('id_funcionario_solicitante_id', 'id_funcionario_solicitante__first_name',
+                      'id_funcionario_solicitante__last_name', 'id_funcionario_solicitante__username',
+                      'fecha_inicio', 'fecha_fin'),
+        Licencias.objects.filter(
+            id_funcionario__in=funcionarios, fecha_inicio__lt=fin, fecha_fin__gte=inicio,
+        ).values_list('id_funcionario_id', 'id_funcionario__first_name', 'id_funcionario__last_name',
+                      'id_funcionario__username', 'fecha_inicio', 'fecha_fin'),
+    )
+    for consulta in consultas:
+        for persona, nombre, apellido, username, desde, hasta in consulta:
+            nombres[persona] = f'{nombre} {apellido}'.strip() or username
+            intervalos.append((persona, desde, hasta))
+    return intervalos, nombres
+
+
+def ausencias_fullcalendar(funcionarios, inicio, fin):
+    """Ausencias de la ventana fusionadas por persona, en el formato de FullCalendar."""
+    intervalos, nombres = ausencias_en_ventana(funcionarios, inicio, fin)
+    return [
+        {
+            'title': f'Ausente: {nombres[persona]}',
+            'start': desde.isoformat(),
+            # En eventos de día completo FullCalendar usa fin exclusivo
+            'end': (hasta + timedelta(days=1)).isoformat(),
+            'color': COLOR_AUSENCIA,
+            'allDay': True,
+        }
+        for persona, desde, hasta in intervalos_fusionados(intervalos)
+    ]
+
+
+def alcance_ausencias(user):
+    """Identifica al usuario y los campos que deciden qué ausencias puede ver."""
+    return f'{user.pk}.{user.id_unidad_id or 0}.{int(user.es_jefe_unidad)}.{user.id_rol_id or 0}'
+
+
+def ausencias_serializadas(user, funcionarios, inicio, fin, version=None):
+    """JSON de la capa de ausencias del usuario, serializado una vez por versión y alcance."""
+    clave = CACHE_FEED_AUSENCIAS.format(
+        version=version or version_calendario(CACHE_VERSION_AUSENCIAS), alcance=alcance_ausencias(user),
+        inicio=inicio, fin=fin,
+    )
+    contenido = cache.get(clave)
+    if contenido is None:
+        contenido = json.dumps(ausencias_fullcalendar(funcionarios, inicio, fin), cls=DjangoJSONEncoder)
+        cache.set(clave, contenido, CACHE_FEED_TTL)
+    return contenido
+
+
+def es_capa_ausencias(request):
+    """Indica si la petición al feed pide la capa de ausencias."""
+    return request.GET.get('capa') == CAPA_AUSENCIAS
+
+
+def etag_eventos(request):
+    """ETag de la petición al feed (None si la ventana es inválida; la vista responde 400)."""
+    try:
+        inicio, fin = ventana_calendario(request.GET)
+    except ValueError:
+        return None
+    if es_capa_ausencias(request):
+        # La capa depende de quién consulta y de su alcance actual
+        version = version_calendario(CACHE_VERSION_AUSENCIAS, request)
+        return f'a{alcance_ausencias(request.user)}-{etag_feed(version, inicio, fin)}'
+    return etag_feed(version_calendario(request=request), inicio, fin)
+
+
+def ultima_modificacion_eventos(request):
+    """Last-Modified de la petición al feed."""
+    if es_capa_ausencias(request):
+        return ultima_modificacion(version_calendario(CACHE_VERSION_AUSENCIAS, request))
+    return ultima_modificacion(version_calendario(request=request))
@@ -0,0 +1,122 @@
+"""
+Cobertura de dotación por unidad.
+
+Convierte las ausencias aprobadas de una unidad (SolicitudesPermiso en estado
+Aprobado y Licencias) en un arreglo día a día de personas ausentes, con un
+único barrido de intervalos:
+
+1. Se leen ambas fuentes con una consulta cada una (solo las columnas necesarias).
+2. Los intervalos de cada persona se fusionan, para no contar dos veces a quien
+   tiene una licencia y un permiso el mismo día.
+3. Cada intervalo fusionado suma +1 en su primer día y -1 al día siguiente de su
+   término en un arreglo de diferencias; la suma acumulada da los ausentes por día.
+
+El costo es proporcional a (días del periodo + cantidad de ausencias), no a
+días x personas.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+from itertools import accumulate, chain
+
+from .models import Funcionarios, SolicitudesPermiso, Licencias
+
+
+def intervalos_fusionados(intervalos):
+    """Fusiona los intervalos (persona, inicio, fin) solapados o contiguos de cada persona."""
+    persona_actual = inicio_actual = fin_actual = None
+    for persona, inicio, fin in sorted(intervalos):
+        if persona == persona_actual and inicio <= fin_actual + timedelta(days=1):
+            fin_actual = max(fin_actual, fin)
+            continue
+        if persona_actual is not None:
+            yield persona_actual, inicio_actual, fin_actual
+        persona_actual, inicio_actual, fin_actual = persona, inicio, fin
+    if persona_actual is not None:
+        yield persona_actual, inicio_actual, fin_actual
+
+
+def ausencias_unidad(id_unidad, desde, hasta):
+    """Retorna los intervalos (persona, inicio, fin) de ausencias aprobadas que tocan el periodo."""
+    solicitudes = SolicitudesPermiso.objects.filter(
+        id_funcionario_solicitante__id_unidad_id=id_unidad,
+        id_funcionario_solicitante__is_active=True,
+        estado='Aprobado',
+        fecha_inicio__lte=hasta,
+        fecha_fin__gte=desde,
+    ).values_list('id_funcionario_solicitante_id', 'fecha_inicio', 'fecha_fin')
+    licencias = Licencias.objects.filter(
+        id_funcionario__id_unidad_id=id_unidad,
+        id_funcionario__is_active=True,
+        fecha_inicio__lte=hasta,
+        fecha_fin__gte=desde,
+    ).values_list('id_funcionario_id', 'fecha_inicio', 'fecha_fin')
+    return chain(solicitudes, licencias)
+
+
+def ausentes_por_dia(intervalos, desde, hasta):
+    """
+    Cantidad de personas ausentes por cada día entre desde y hasta (inclusive).
+
+    Args:
+        intervalos: iterable de (persona, inicio, fin).
+
+    Returns:
+        list[int]: un valor por día del periodo.
+    """
+    total_dias = (hasta - desde).days + 1
+    diferencias = [0] * (total_dias + 1)
+    for _persona, inicio, fin in intervalos_fusionados(intervalos):
+        primero = max((inicio - desde).days, 0)
+        ultimo = min((fin - desde).days, total_dias - 1)
+        if primero > ultimo:
+            continue
+        diferencias[primero] += 1
+        diferencias[ultimo + 1] -= 1
+    return list(accumulate(diferencias[:total_dias]))
+
+
+def cobertura_unidad(id_unidad, desde, hasta):
+    """
+    Calcula la cobertura diaria de una unidad en el periodo.
+
+    Returns:
+        dict: 'dotacion' (funcionarios activos) y 'ausentes' (lista por día).
+    """
+    dotacion = Funcionarios.objects.filter(id_unidad_id=id_unidad, is_active=True).count()
+    ausentes = ausentes_por_dia(ausencias_unidad(id_unidad, desde, hasta), desde, hasta)
+    return {'desde': desde, 'hasta': hasta, 'dotacion': dotacion, 'ausentes': ausentes}
+
+
+def cobertura_mes(id_unidad, anio, mes):
+    """Cobertura de la unidad para un mes calendario completo."""
+    desde = date(anio, mes, 1)
+    hasta = date(anio, mes, monthrange(anio, mes)[1])
+    return cobertura_unidad(id_unidad, desde, hasta)
+
+
+def anotar_cobertura(solicitudes):
+    """
+    Agrega a cada solicitud abierta el atributo 'cobertura' con el máximo de
+    colegas ya ausentes durante su periodo y la dotación de su unidad.
+    Calcula un solo barrido por unidad, cubriendo el rango de todas sus solicitudes.
+    """
+    por_unidad = {}
+    for sol in solicitudes:
+        id_unidad = sol.id_funcionario_solicitante.id_unidad_id
+        if sol.estado in ('Pendiente', 'Pre-Aprobado') and id_unidad:
+            por_unidad.setdefault(id_unidad, []).append(sol)
+
+    for id_unidad, pendientes in por_unidad.items():
+        desde = min(sol.fecha_inicio for sol in pendientes)
+        hasta = max(sol.fecha_fin for sol in pendientes)
+        cobertura = cobertura_unidad(id_unidad, desde, hasta)
+        for sol in pendientes:
+            tramo = cobertura['ausentes'][(sol.fecha_inicio - desde).days:(sol.fecha_fin - desde).days + 1]
+            max_ausentes = max(tramo, default=0)
+            sol.cobertura = {
+                'max_ausentes': max_ausentes,
+                'dotacion': cobertura['dotacion'],
+                # Alerta si con esta ausencia queda menos de la mitad de la unidad
+                'critica': (max_ausentes + 1) * 2 > cobertura['dotacion'],
+            }
+    return solicitudes
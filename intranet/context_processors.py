@@ -0,0 +1,18 @@
+"""
+Procesadores de contexto de la intranet (variables disponibles en todas las plantillas).
+"""
+from .flujo_solicitudes import contar_pendientes
+from .idempotencia import nueva_clave
+
+
+def bandeja_pendientes(request):
+    """Agrega 'pendientes_bandeja' para el aviso del menú lateral."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'pendientes_bandeja': contar_pendientes(user)}
+
+
+def clave_idempotencia(request):
+    """Agrega 'idempotency_key' para los formularios protegidos con @idempotente."""
+    return {'idempotency_key': nueva_clave()}
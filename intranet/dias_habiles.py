@@ -0,0 +1,94 @@
+"""
+Cálculo de días hábiles para solicitudes de permiso.
+
+Un día hábil es un día de lunes a viernes que no está marcado como
+'Feriado' en Eventos_Calendario. Los feriados se precalculan una sola vez
+como una tupla ordenada de ordinales (solo los que caen en día de semana)
+y se guardan en caché bajo la versión de los feriados (versiones.py), que
+signals.py renueva cada vez que se guarda o elimina un evento del calendario.
+La versión se lee de la base, así un feriado nuevo se ve en todos los
+procesos del servidor y no solo en el que lo guardó.
+
+El conteo entre dos fechas no recorre día por día: los días de semana se
+obtienen aritméticamente y los feriados del rango con dos búsquedas
+binarias (bisect) sobre la tupla precalculada.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.core.cache import cache
+
+from .models import Eventos_Calendario
+from .versiones import renovar_version, version_datos
+
+VERSION_FERIADOS = 'feriados'
+CACHE_KEY_FERIADOS = 'dias_habiles:feriados:{version}'
+# Las claves de versiones anteriores quedan huérfanas y caducan solas
+CACHE_FERIADOS_TTL = 60 * 60 * 24
+TIPO_FERIADO = 'Feriado'
+
+
+def _construir_feriados():
+    """Lee los eventos 'Feriado' y retorna los ordinales hábiles ordenados."""
+    ordinales = set()
+    rangos = Eventos_Calendario.objects.filter(
+        tipo_evento=TIPO_FERIADO
+    ).values_list('fecha_inicio', 'fecha_fin')
+    for inicio, fin in rangos:
+        fin = fin or inicio
+        dia = inicio
+        while dia <= fin:
+            # Los feriados en fin de semana no restan días hábiles adicionales
+            if dia.weekday() < 5:
+                ordinales.add(dia.toordinal())
+            dia += timedelta(days=1)
+    return tuple(sorted(ordinales))
+
+
+def obtener_feriados():
+    """Retorna la tupla ordenada de feriados hábiles, desde caché si está al día."""
+    clave = CACHE_KEY_FERIADOS.format(version=version_datos(VERSION_FERIADOS))
+    feriados = cache.get(clave)
+    if feriados is None:
+        feriados = _construir_feriados()
+        cache.set(clave, feriados, CACHE_FERIADOS_TTL)
+    return feriados
+
+
+def invalidar_feriados():
+    """Renueva la versión de los feriados (el conjunto se reconstruye en el próximo uso)."""
+    renovar_version(VERSION_FERIADOS)
+
+
+def contar_dias_semana(inicio, fin):
+    """Cuenta los días de lunes a viernes entre inicio y fin (ambos inclusive)."""
+    if fin < inicio:
+        return 0
+    semanas, resto = divmod((fin - inicio).days + 1, 7)
+    dias = semanas * 5
+    primer_dia = inicio.weekday()
+    # El resto es siempre menor a 7 días
+    dias += sum(1 for i in range(resto) if (primer_dia + i) % 7 < 5)
+    return dias
+
+
+def contar_feriados(inicio, fin, feriados=None):
+    """Cuenta los feriados hábiles entre inicio y fin usando búsqueda binaria."""
+    if fin < inicio:
+        return 0
+    if feriados is None:
+        feriados = obtener_feriados()
+    return bisect_right(feriados, fin.toordinal()) - bisect_left(feriados, inicio.toordinal())
+
+
+def calcular_dias_habiles(inicio, fin):
+    """
+    Retorna la cantidad de días hábiles entre inicio y fin (ambos inclusive).
+    Descuenta fines de semana y feriados del calendario institucional.
+    """
+    return contar_dias_semana(inicio, fin) - contar_feriados(inicio, fin)
+
+
+def es_dia_habil(fecha):
+    """Indica si la fecha es un día hábil."""
+    return calcular_dias_habiles(fecha, fecha) == 1
@@ -0,0 +1,239 @@
+"""
+Cálculos agregados para los reportes de ausencias.
+
+Los días se calculan en la base de datos (resta de fechas como DurationField),
+de modo que los totales por funcionario y por unidad son un GROUP BY y no
+requieren recorrer las licencias en Python.
+
+El pivote mensual de ausencias (unidad x tipo x mes) guarda los meses cerrados
+en ResumenAusenciasMes: se calculan una vez y luego se leen de la tabla. El mes
+en curso (y los futuros) se calculan en vivo con una caché corta. Cada ausencia
+se reparte entre los meses que abarca: los permisos cuentan días hábiles y las
+licencias días corridos (la fila indica la unidad en 'unidad_dias').
+"""
+from calendar import monthrange
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, DateField, DurationField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .dias_habiles import contar_dias_semana, contar_feriados, obtener_feriados
+from .models import Licencias, ResumenAusenciasMes, SolicitudesPermiso
+
+UN_DIA = timedelta(days=1)
+TIPO_LICENCIA = 'licencia'
+CACHE_PIVOTE_MES_ABIERTO = 'ausencias:pivote:{:%Y-%m}'
+CACHE_PIVOTE_TTL = 300
+MAX_MESES_PIVOTE = 36
+
+
+def expresion_dias(campo_inicio='fecha_inicio', campo_fin='fecha_fin', desde=None, hasta=None):
+    """
+    Duración inclusiva (fin - inicio + 1 día) de cada registro, como DurationField.
+    Si se indica un periodo, el intervalo se recorta a él para contar solo los días dentro.
+    """
+    inicio = F(campo_inicio)
+    fin = F(campo_fin)
+    if desde:
+        inicio = Greatest(inicio, Value(desde, output_field=DateField()))
+    if hasta:
+        fin = Least(fin, Value(hasta, output_field=DateField()))
+    return ExpressionWrapper(fin - inicio + Value(UN_DIA), output_field=DurationField())
+
+
+def dias_duracion(duracion):
+    """Días enteros de una duración agregada (0 si no hubo registros)."""
+    return duracion.days if duracion else 0
+
+
+def totales_licencias(licencias, desde=None, hasta=None, limite_funcionarios=None):
+    """
+    Totales de licencias en una sola pasada por agrupación.
+
+    Args:
+        licencias: queryset ya filtrado (alcance del usuario y filtros del reporte).
+        desde, hasta: periodo al que se recortan los días (opcional).
+        limite_funcionarios: cantidad máxima de filas de 'por_funcionario'; el
+            orden y el corte se aplican en la consulta (opcional).
+
+    Returns:
+        dict: 'total_licencias', 'total_dias', 'por_unidad' y 'por_funcionario'
+        (listas de dicts con cantidad y días, de mayor a menor).
+    """
+    dias = expresion_dias(desde=desde, hasta=hasta)
+    licencias = licencias.order_by()
+
+    por_unidad = list(
+        licencias.values('id_funcionario__id_unidad', 'id_funcionario__id_unidad__nombre_unidad')
+        .annotate(cantidad=Count('pk'), duracion=Sum(dias))
+        .order_by('-duracion', 'id_funcionario__id_unidad__nombre_unidad')
+    )
+    por_funcionario = (
+        licencias.values('id_funcionario', 'id_funcionario__first_name', 'id_funcionario__last_name',
+                         'id_funcionario__username', 'id_funcionario__id_unidad__nombre_unidad')
+        .annotate(cantidad=Count('pk'), duracion=Sum(dias))
+        .order_by('-duracion', 'id_funcionario__last_name')
+    )
+    por_funcionario = list(por_funcionario[:limite_funcionarios] if limite_funcionarios else por_funcionario)
+    for fila in por_unidad + por_funcionario:
+        fila['dias'] = dias_duracion(fila.pop('duracion'))
+
+    return {
+        'total_licencias': sum(fila['cantidad'] for fila in por_unidad),
+        'total_dias': sum(fila['dias'] for fila in por_unidad),
+        'por_unidad': por_unidad,
+        'por_funcionario': por_funcionario,
+    }
+
+
+def dias_habiles_recortados(desde, hasta, inicio, fin, feriados):
+    """Días hábiles de [desde, hasta] que caen dentro de [inicio, fin] (feriados de obtener_feriados)."""
+    desde, hasta = max(desde, inicio), min(hasta, fin)
+    return contar_dias_semana(desde, hasta) - contar_feriados(desde, hasta, feriados)
+
+
+def limites_mes(mes):
+    """Primer y último día del mes de la fecha indicada."""
+    inicio = mes.replace(day=1)
+    return inicio, inicio.replace(day=monthrange(inicio.year, inicio.month)[1])
+
+
+def meses_entre(desde, hasta):
+    """Primer día de cada mes entre desde y hasta (inclusive)."""
+    mes = desde.replace(day=1)
+    while mes <= hasta:
+        yield mes
+        mes = (mes + timedelta(days=32)).replace(day=1)
+
+
+def rango_meses(params):
+    """
+    Lee el rango 'desde'/'hasta' (YYYY-MM) del pivote; por defecto los últimos 12 meses.
+
+    Returns:
+        tuple: (primer día del mes inicial, último día del mes final).
+
+    Raises:
+        ValueError: si el formato es inválido, el rango está invertido o supera MAX_MESES_PIVOTE.
+    """
+    hoy = timezone.localdate()
+    hasta = datetime.strptime(params.get('hasta') or f'{hoy:%Y-%m}', '%Y-%m').date()
+    if params.get('desde'):
+        desde = datetime.strptime(params['desde'], '%Y-%m').date()
+    else:
+        desde = restar_meses(hasta, 11)
+    if desde > hasta or (hasta.year - desde.year) * 12 + hasta.month - desde.month >= MAX_MESES_PIVOTE:
+        raise ValueError(f'El rango debe estar ordenado y abarcar como máximo {MAX_MESES_PIVOTE} meses.')
+    return desde, limites_mes(hasta)[1]
+
+
+def restar_meses(mes, cantidad):
+    """Primer día del mes que está 'cantidad' meses antes del indicado."""
+    indice = mes.year * 12 + mes.month - 1 - cantidad
+    return mes.replace(year=indice // 12, month=indice % 12 + 1, day=1)
+
+
+def calcular_pivote_mes(mes):
+    """
+    Días de ausencia aprobados del mes agrupados por unidad y tipo.
+    - Permisos aprobados: días hábiles de la parte del permiso que cae en el mes.
+    - Licencias: días corridos recortados al mes (una licencia puede abarcar varios).
+    Las solicitudes de tipo licencia se omiten porque al aprobarse quedan en Licencias.
+
+    Returns:
+        list: filas [id_unidad, nombre_unidad, tipo, cantidad, dias].
+    """
+    inicio, fin = limites_mes(mes)
+    # Los días hábiles dependen de los feriados: se recortan y cuentan por permiso
+    permisos = (
+        SolicitudesPermiso.objects.filter(estado='Aprobado', fecha_inicio__lte=fin, fecha_fin__gte=inicio)
+        .exclude(tipo_permiso=TIPO_LICENCIA)
+        .values_list('id_funcionario_solicitante__id_unidad', 'id_funcionario_solicitante__id_unidad__nombre_unidad',
+                     'tipo_permiso', 'fecha_inicio', 'fecha_fin')
+    )
+    licencias = (
+        Licencias.objects.filter(fecha_inicio__lte=fin, fecha_fin__gte=inicio)
+        .values('id_funcionario__id_unidad', 'id_funcionario__id_unidad__nombre_unidad')
+        .annotate(cantidad=Count('pk'), duracion=Sum(expresion_dias(desde=inicio, hasta=fin)))
+        .order_by()
+    )
+    feriados = obtener_feriados()
+    por_tipo = {}
+    for id_unidad, nombre_unidad, tipo, desde, hasta in permisos:
+        fila = por_tipo.setdefault((id_unidad, nombre_unidad, tipo), [id_unidad, nombre_unidad, tipo, 0, 0])
+        fila[3] += 1
+        fila[4] += dias_habiles_recortados(desde, hasta, inicio, fin, feriados)
+    filas = list(por_tipo.values())
+    filas += [
+        [l['id_funcionario__id_unidad'], l['id_funcionario__id_unidad__nombre_unidad'],
+         TIPO_LICENCIA, l['cantidad'], dias_duracion(l['duracion'])]
+        for l in licencias
+    ]
+    return filas
+
+
+def pivote_mes(mes):
+    """
+    Pivote de un mes: los meses cerrados se leen (o se guardan la primera vez)
+    en ResumenAusenciasMes; el mes en curso se calcula con caché corta.
+    """
+    mes = mes.replace(day=1)
+    if mes >= timezone.localdate().replace(day=1):
+        clave = CACHE_PIVOTE_MES_ABIERTO.format(mes)
+        filas = cache.get(clave)
+        if filas is None:
+            filas = calcular_pivote_mes(mes)
+            cache.set(clave, filas, CACHE_PIVOTE_TTL)
+        return filas
+
+    resumen = ResumenAusenciasMes.objects.filter(mes=mes).first()
+    if resumen is None:
+        resumen, _ = ResumenAusenciasMes.objects.get_or_create(mes=mes, defaults={'datos': calcular_pivote_mes(mes)})
+    return resumen.datos
+
+
+def invalidar_pivote(fecha_inicio, fecha_fin):
+    """Descarta los meses guardados que toca una ausencia nueva o modificada."""
+    # Las vistas pueden guardar las fechas tal como llegan del formulario
+    fecha_inicio = DateField().to_python(fecha_inicio)
+    fecha_fin = DateField().to_python(fecha_fin)
+    ResumenAusenciasMes.objects.filter(mes__range=(fecha_inicio.replace(day=1), fecha_fin)).delete()
+    for mes in meses_entre(max(fecha_inicio, timezone.localdate().replace(day=1)), fecha_fin):
+        cache.delete(CACHE_PIVOTE_MES_ABIERTO.format(mes))
+
+
+def pivote_ausencias(desde, hasta):
+    """
+    Pivote unidad x tipo x mes para el rango de meses indicado.
+
+    Returns:
+        dict: 'meses' (YYYY-MM), 'filas' (unidad, tipo, 'unidad_dias', 'dias'
+        alineado con 'meses' y total; ordenadas por unidad y tipo), 'totales' por
+        mes y 'total' general (días hábiles de permisos más días corridos de licencias).
+    """
+    meses = list(meses_entre(desde, hasta))
+    tipos = dict(SolicitudesPermiso.TIPOS_PERMISO)
+    filas = {}
+    totales = [0] * len(meses)
+    for posicion, mes in enumerate(meses):
+        for id_unidad, nombre_unidad, tipo, cantidad, dias in pivote_mes(mes):
+            fila = filas.setdefault((nombre_unidad or 'Sin unidad', tipo), {
+                'id_unidad': id_unidad,
+                'unidad': nombre_unidad or 'Sin unidad',
+                'tipo': tipo,
+                'tipo_nombre': tipos.get(tipo, tipo),
+                'unidad_dias': 'corridos' if tipo == TIPO_LICENCIA else 'hábiles',
+                'dias': [0] * len(meses),
+                'total': 0,
+            })
+            fila['dias'][posicion] += dias
+            fila['total'] += dias
+            totales[posicion] += dias
+    return {
+        'meses': [f'{mes:%Y-%m}' for mes in meses],
+        'filas': [filas[clave] for clave in sorted(filas)],
+        'totales': totales,
+        'total': sum(totales),
+    }
@@ -0,0 +1,334 @@
+"""
+Exportación de reportes a archivos descargables.
+
+Los reportes se recorren por lotes con iterator() y se escriben fila a fila,
+de modo que exportar años de historial usa memoria constante:
+- Excel: openpyxl en modo write-only sobre un archivo temporal, que luego
+  se envía al cliente por bloques con FileResponse.
+- CSV: StreamingHttpResponse; cada fila se envía apenas se lee, así la
+  descarga comienza de inmediato sin acumular filas en memoria.
+
+Cada reporte define sus ENCABEZADOS_* y un generador filas_*(queryset); las
+vistas les pasan el queryset ya filtrado según el rol del usuario.
+
+Los textos libres (detalle de auditoría, nombres, observaciones) que empiezan
+con =, +, -, @, tabulación o retorno de carro se exportan como texto: en el
+CSV con un apóstrofo delante y en Excel como celda de texto, para que la
+planilla no los evalúe como fórmulas.
+"""
+import csv
+import io
+import tempfile
+from itertools import chain
+from datetime import datetime, time, timedelta
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import SolicitudesPermiso, Licencias, Logs_Auditoria
+from .roles import es_subdireccion
+
+FORMATO_CSV = 'csv'
+
+TAMANO_LOTE = 2000
+# Primeros caracteres con los que Excel y LibreOffice interpretan una celda como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+ENCABEZADOS_SOLICITUDES = ['Funcionario', 'Unidad', 'Tipo Permiso', 'Desde', 'Hasta', 'Días', 'Fecha Solicitud', 'Estado']
+ENCABEZADOS_LICENCIAS = ['Funcionario', 'Unidad', 'Desde', 'Hasta', 'Días', 'Fecha Registro', 'Cargada por']
+ENCABEZADOS_LOGS = ['Fecha', 'Usuario', 'Acción', 'Detalle']
+ENCABEZADOS_FUNCIONARIOS = ['Usuario', 'Nombre', 'Email', 'Unidad', 'Rol', 'Jefe de Unidad', 'Activo']
+ENCABEZADOS_HISTORIAL = ['Origen', 'Tipo', 'Desde', 'Hasta', 'Días', 'Fecha', 'Estado']
+
+
+def _fecha_param(valor):
+    """Convierte un parámetro YYYY-MM-DD en date (None si viene vacío)."""
+    return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+
+
+def fechas_periodo(params):
+    """
+    Lee el periodo 'desde'/'hasta' (YYYY-MM-DD) de los parámetros.
+
+    Raises:
+        ValueError: si alguna fecha tiene un formato inválido.
+    """
+    return _fecha_param(params.get('desde')), _fecha_param(params.get('hasta'))
+
+
+def filtrar_solicitudes(params, queryset=None):
+    """
+    Aplica los filtros de exportación a las solicitudes.
+
+    Args:
+        params: QueryDict con 'desde', 'hasta' (YYYY-MM-DD), 'unidad' (id)
+            y 'estado' (por defecto 'Pendiente'; 'todos' no filtra).
+        queryset: solicitudes de partida (por defecto todas).
+
+    Raises:
+        ValueError: si alguna fecha o la unidad tienen un formato inválido.
+    """
+    solicitudes = SolicitudesPermiso.objects.all() if queryset is None else queryset
+    desde, hasta = fechas_periodo(params)
+    unidad = params.get('unidad')
+    estado = params.get('estado') or 'Pendiente'
+
+    # Solicitudes cuyo periodo toca el rango pedido
+    if desde:
+        solicitudes = solicitudes.filter(fecha_fin__gte=desde)
+    if hasta:
+        solicitudes = solicitudes.filter(fecha_inicio__lte=hasta)
+    if unidad:
+        solicitudes = solicitudes.filter(id_funcionario_solicitante__id_unidad_id=int(unidad))
+    if estado != 'todos':
+        solicitudes = solicitudes.filter(estado=estado)
+    return solicitudes
+
+
+def licencias_visibles(user):
+    """Licencias que el usuario puede consultar: Subdirección todas, Jefe de Unidad las de su unidad."""
+    if es_subdireccion(user):
+        return Licencias.objects.all()
+    return Licencias.objects.filter(id_funcionario__id_unidad=user.id_unidad)
+
+
+def filtrar_licencias(params, queryset=None):
+    """
+    Aplica los filtros del reporte de licencias.
+
+    Args:
+        params: QueryDict con 'desde', 'hasta' (YYYY-MM-DD), 'unidad' y 'funcionario' (ids).
+        queryset: licencias de partida (por defecto todas).
+
+    Raises:
+        ValueError: si alguna fecha o id tienen un formato inválido.
+    """
+    licencias = Licencias.objects.all() if queryset is None else queryset
+    desde, hasta = fechas_periodo(params)
+
+    # Licencias cuyo periodo toca el rango pedido
+    if desde:
+        licencias = licencias.filter(fecha_fin__gte=desde)
+    if hasta:
+        licencias = licencias.filter(fecha_inicio__lte=hasta)
+    if params.get('unidad'):
+        licencias = licencias.filter(id_funcionario__id_unidad_id=int(params['unidad']))
+    if params.get('funcionario'):
+        licencias = licencias.filter(id_funcionario_id=int(params['funcionario']))
+    return licencias
+
+
+def filtrar_logs(params, queryset=None):
+    """
+    Aplica los filtros del visor de auditoría.
+
+    Args:
+        params: QueryDict con 'actor' (id), 'accion', 'codigo', 'desde', 'hasta'
+            (YYYY-MM-DD, inclusive) y el objeto afectado 'tipo_objeto', 'id_objeto' (ids).
+        queryset: registros de partida (por defecto todos).
+
+    Raises:
+        ValueError: si alguna fecha o el actor tienen un formato inválido.
+    """
+    logs = Logs_Auditoria.objects.all() if queryset is None else queryset
+    desde, hasta = fechas_periodo(params)
+
+    # Rango de fecha-hora local, para usar los índices sobre fecha_hora
+    if desde:
+        logs = logs.filter(fecha_hora__gte=timezone.make_aware(datetime.combine(desde, time.min)))
+    if hasta:
+        logs = logs.filter(fecha_hora__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min)))
+    if params.get('actor'):
+        logs = logs.filter(id_usuario_actor_id=int(params['actor']))
+    if params.get('accion'):
+        logs = logs.filter(accion=params['accion'])
+    if params.get('codigo'):
+        logs = logs.filter(codigo=params['codigo'])
+    if params.get('tipo_objeto') and params.get('id_objeto'):
+        logs = logs.filter(tipo_objeto_id=int(params['tipo_objeto']), id_objeto=int(params['id_objeto']))
+    return logs
+
+
+def _fecha_hora(valor):
+    return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M') if valor else ''
+
+
+def _lotes(queryset):
+    return queryset.iterator(chunk_size=TAMANO_LOTE)
+
+
+def pide_csv(request):
+    """Indica si la vista debe responder con la exportación CSV (?exportar=csv)."""
+    return request.GET.get('exportar') == FORMATO_CSV
+
+
+def filas_solicitudes(solicitudes):
+    """Genera las filas de ENCABEZADOS_SOLICITUDES leyendo la base por lotes."""
+    tipos = dict(SolicitudesPermiso.TIPOS_PERMISO)
+    filas = solicitudes.order_by('-fecha_solicitud', '-pk').values_list(
+        'id_funcionario_solicitante__first_name',
+        'id_funcionario_solicitante__last_name',
+        'id_funcionario_solicitante__id_unidad__nombre_unidad',
+        'tipo_permiso', 'fecha_inicio', 'fecha_fin', 'dias_solicitados', 'fecha_solicitud', 'estado',
+    )
+    for nombre, apellido, unidad, tipo, inicio, fin, dias, fecha_solicitud, estado in _lotes(filas):
+        yield [
+            f"{nombre} {apellido}",
+            unidad or 'Sin unidad',
+            tipos.get(tipo, tipo),
+            inicio.strftime('%Y-%m-%d'),
+            fin.strftime('%Y-%m-%d'),
+            dias,
+            _fecha_hora(fecha_solicitud),
+            estado,
+        ]
+
+
+def filas_licencias(licencias):
+    """Genera las filas de ENCABEZADOS_LICENCIAS leyendo la base por lotes."""
+    filas = licencias.order_by('-fecha_registro', '-pk').values_list(
+        'id_funcionario__first_name', 'id_funcionario__last_name',
+        'id_funcionario__id_unidad__nombre_unidad',
+        'fecha_inicio', 'fecha_fin', 'fecha_registro', 'id_subdireccion_carga__username',
+    )
+    for nombre, apellido, unidad, inicio, fin, registro, cargada_por in _lotes(filas):
+        yield [
+            f"{nombre} {apellido}",
+            unidad or 'Sin unidad',
+            inicio.strftime('%Y-%m-%d'),
+            fin.strftime('%Y-%m-%d'),
+            (fin - inicio).days + 1,
+            _fecha_hora(registro),
+            cargada_por or '',
+        ]
+
+
+def filas_logs(logs):
+    """Genera las filas de ENCABEZADOS_LOGS leyendo la base por lotes."""
+    filas = logs.order_by('-fecha_hora', '-pk').values_list(
+        'fecha_hora', 'id_usuario_actor__username', 'accion', 'detalle'
+    )
+    for fecha_hora, usuario, accion, detalle in _lotes(filas):
+        yield [_fecha_hora(fecha_hora), usuario or 'Sistema', accion, detalle or '']
+
+
+def filas_funcionarios(funcionarios):
+    """Genera las filas de ENCABEZADOS_FUNCIONARIOS leyendo la base por lotes."""
+    filas = funcionarios.order_by('id_unidad__nombre_unidad', 'last_name', 'pk').values_list(
+        'username', 'first_name', 'last_name', 'email',
+        'id_unidad__nombre_unidad', 'id_rol__nombre_rol', 'es_jefe_unidad', 'is_active',
+    )
+    for usuario, nombre, apellido, email, unidad, rol, es_jefe, activo in _lotes(filas):
+        yield [
+            usuario,
+            f"{nombre} {apellido}".strip(),
+            email,
+            unidad or 'Sin unidad',
+            rol or 'Sin rol',
+            'Sí' if es_jefe else 'No',
+            'Sí' if activo else 'No',
+        ]
+
+
+def filas_historial(solicitudes, licencias):
+    """Genera las filas de ENCABEZADOS_HISTORIAL: solicitudes y luego licencias del funcionario."""
+    tipos = dict(SolicitudesPermiso.TIPOS_PERMISO)
+    filas_sol = solicitudes.order_by('-fecha_solicitud', '-pk').values_list(
+        'tipo_permiso', 'fecha_inicio', 'fecha_fin', 'dias_solicitados', 'fecha_solicitud', 'estado'
+    )
+    filas_lic = licencias.order_by('-fecha_inicio', '-pk').values_list('fecha_inicio', 'fecha_fin', 'fecha_registro')
+    return chain(
+        (
+            ['Solicitud', tipos.get(tipo, tipo), inicio.strftime('%Y-%m-%d'), fin.strftime('%Y-%m-%d'),
+             dias, _fecha_hora(fecha), estado]
+            for tipo, inicio, fin, dias, fecha, estado in _lotes(filas_sol)
+        ),
+        (
+            ['Licencia', 'Licencia Médica', inicio.strftime('%Y-%m-%d'), fin.strftime('%Y-%m-%d'),
+             (fin - inicio).days + 1, _fecha_hora(registro), 'Registrada']
+            for inicio, fin, registro in _lotes(filas_lic)
+        ),
+    )
+
+
+def _texto_seguro(valor):
+    """Valor de celda CSV; los textos que parecen fórmula llevan un apóstrofo delante."""
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def _fila_csv(fila):
+    return [_texto_seguro(valor) for valor in fila]
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de escribirla."""
+
+    def write(self, valor):
+        return valor
+
+
+def respuesta_csv(nombre_archivo, encabezados, filas):
+    """
+    Envía las filas como CSV a medida que se generan.
+    Incluye BOM para que Excel reconozca los acentos (UTF-8).
+    """
+    escritor = csv.writer(_Eco())
+
+    def lineas():
+        yield '\ufeff' + escritor.writerow(encabezados)
+        for fila in filas:
+            yield escritor.writerow(_fila_csv(fila))
+
+    response = StreamingHttpResponse(lineas(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
+
+
+def escribir_csv(archivo, encabezados, filas):
+    """Escribe el CSV (UTF-8 con BOM) en un archivo binario abierto."""
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    escritor = csv.writer(texto)
+    escritor.writerow(encabezados)
+    for fila in filas:
+        escritor.writerow(_fila_csv(fila))
+    texto.flush()
+    texto.detach()
+
+
+def _celda_excel(ws, valor):
+    """openpyxl guarda como fórmula todo texto que empieza con '=': esos van como celda de texto."""
+    if isinstance(valor, str) and valor.startswith('='):
+        celda = WriteOnlyCell(ws, value=valor)
+        celda.data_type = 's'
+        return celda
+    return valor
+
+
+def escribir_excel(archivo, titulo, encabezados, filas):
+    """Escribe las filas en un libro write-only sobre un archivo binario abierto."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=titulo)
+    ws.append(encabezados)
+    for fila in filas:
+        ws.append([_celda_excel(ws, valor) for valor in fila])
+    wb.save(archivo)
+
+
+def respuesta_excel(nombre_archivo, titulo, encabezados, filas):
+    """
+    Escribe las filas en un libro write-only y lo envía como descarga.
+    El libro se arma en un archivo temporal (se elimina al cerrarse la respuesta).
+    """
+    archivo = tempfile.TemporaryFile()
+    escribir_excel(archivo, titulo, encabezados, filas)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=nombre_archivo,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -0,0 +1,263 @@
+"""
+Flujo de aprobación de solicitudes de permiso.
+
+Pendiente → Pre-Aprobado (Jefe de Unidad) → Aprobado (Subdirección/Director)
+o Rechazado en cualquier etapa.
+
+Las transiciones permitidas se declaran en TRANSICIONES. Cada solicitud
+guarda en 'aprobador_actual' la bandeja que debe actuar sobre ella
+('jefe:<id_unidad>', 'subdireccion', 'director' o vacío si ya se resolvió),
+y las solicitudes abiertas se replican en la tabla BandejaAprobacion, de
+modo que las bandejas, contadores y avisos leen esa tabla por índice en vez
+de recalcular las reglas de ruteo en cada consulta. Cuando cambia la
+jefatura de una unidad (un jefe asciende, se degrada, se desactiva o cambia
+de unidad) sus solicitudes pendientes se rerutean con rerutear_unidades.
+
+Cada transición se aplica en una transacción y se reclama con un UPDATE
+condicionado al estado leído: si dos aprobadores actúan a la vez sobre la
+misma solicitud solo uno la resuelve, y el saldo se descuenta (y la Licencia
+se crea) una sola vez.
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Funcionarios, Dias_Administrativos, Licencias, BandejaAprobacion, SolicitudesPermiso
+from .roles import es_director, es_subdireccion
+
+BANDEJA_DIRECTOR = 'director'
+BANDEJA_SUBDIRECCION = 'subdireccion'
+SIN_BANDEJA = ''
+
+# Roles del usuario frente a una solicitud (ver rol_en_solicitud)
+ROL_JEFE = 'jefe'
+ROL_SUBDIRECCION = 'subdireccion'
+ROL_DIRECTOR = 'director'
+ROL_DIRECTOR_SOLICITANTE = 'director_solicitante'
+
+# accion: estados de origen, estado destino, roles autorizados y bandeja siguiente
+TRANSICIONES = {
+    'pre_aprobar': {
+        'desde': ('Pendiente',),
+        'hacia': 'Pre-Aprobado',
+        'roles': (ROL_JEFE,),
+        'siguiente': BANDEJA_SUBDIRECCION,
+    },
+    'aprobar': {
+        'desde': ('Pendiente', 'Pre-Aprobado'),
+        'hacia': 'Aprobado',
+        'roles': (ROL_SUBDIRECCION, ROL_DIRECTOR),
+        'siguiente': SIN_BANDEJA,
+    },
+    'rechazar': {
+        'desde': ('Pendiente', 'Pre-Aprobado'),
+        'hacia': 'Rechazado',
+        'roles': (ROL_JEFE, ROL_SUBDIRECCION, ROL_DIRECTOR),
+        'siguiente': SIN_BANDEJA,
+    },
+    # El Director no tiene superior: sus solicitudes se aprueban al crearse
+    'auto_aprobar': {
+        'desde': ('Pendiente',),
+        'hacia': 'Aprobado',
+        'roles': (ROL_DIRECTOR_SOLICITANTE,),
+        'siguiente': SIN_BANDEJA,
+    },
+}
+
+# Saldo que descuenta cada tipo de permiso al aprobarse: (campo, unidades por día)
+DESCUENTOS_SALDO = {
+    'vacaciones': ('vacaciones_restantes', 1),
+    'administrativo': ('admin_restantes', 1),
+    'compensacion': ('horas_compensacion', 8),  # 8 horas por día
+}
+
+
+class TransicionInvalida(Exception):
+    """La acción no está permitida para el estado de la solicitud o el rol del usuario."""
+
+
+def bandeja_jefe(id_unidad):
+    """Clave de la bandeja del Jefe de una unidad."""
+    return f'jefe:{id_unidad}'
+
+
+def bandeja_inicial(solicitante):
+    """
+    Calcula quién debe revisar primero una solicitud nueva.
+    - Director / Subdirección: la revisa el Director
+    - Jefe de Unidad o funcionario sin unidad: va directo a Subdirección
+    - Funcionario de unidad con jefe: la pre-aprueba su Jefe
+    - Funcionario de unidad sin jefe: va directo a Subdirección
+    """
+    if es_subdireccion(solicitante):
+        return BANDEJA_DIRECTOR
+    if solicitante.es_jefe_unidad or not solicitante.id_unidad_id:
+        return BANDEJA_SUBDIRECCION
+    tiene_jefe = Funcionarios.objects.filter(
+        id_unidad_id=solicitante.id_unidad_id, es_jefe_unidad=True, is_active=True
+    ).exclude(pk=solicitante.pk).exists()
+    return bandeja_jefe(solicitante.id_unidad_id) if tiene_jefe else BANDEJA_SUBDIRECCION
+
+
+def bandejas_de_usuario(user):
+    """Bandejas en las que el usuario debe actuar."""
+    if es_director(user):
+        return [BANDEJA_DIRECTOR, BANDEJA_SUBDIRECCION]
+    if es_subdireccion(user):
+        return [BANDEJA_SUBDIRECCION]
+    if user.es_jefe_unidad and user.id_unidad_id:
+        return [bandeja_jefe(user.id_unidad_id)]
+    return []
+
+
+def rol_en_solicitud(user, solicitud):
+    """Rol con el que el usuario puede actuar sobre la solicitud (o None)."""
+    if solicitud.id_funcionario_solicitante_id == user.pk:
+        # Nadie revisa su propia solicitud, salvo la auto-aprobación del Director
+        return ROL_DIRECTOR_SOLICITANTE if es_director(user) else None
+    if es_director(user):
+        return ROL_DIRECTOR
+    if es_subdireccion(user):
+        # Subdirección no actúa sobre lo que está en la bandeja del Director
+        return None if solicitud.aprobador_actual == BANDEJA_DIRECTOR else ROL_SUBDIRECCION
+    if user.es_jefe_unidad and solicitud.aprobador_actual == bandeja_jefe(user.id_unidad_id):
+        return ROL_JEFE
+    return None
+
+
+def acciones_disponibles(user, solicitud):
+    """Acciones de TRANSICIONES que el usuario puede ejecutar sobre la solicitud."""
+    rol = rol_en_solicitud(user, solicitud)
+    return [
+        accion for accion, regla in TRANSICIONES.items()
+        if solicitud.estado in regla['desde'] and rol in regla['roles']
+    ]
+
+
+@transaction.atomic
+def sincronizar_bandeja(solicitud):
+    """
+    Refleja aprobador_actual en la tabla BandejaAprobacion.
+    Las solicitudes resueltas salen de la bandeja; las reruteadas
+    cambian de bandeja y renuevan su fecha de ruteo.
+    """
+    if not solicitud.aprobador_actual:
+        BandejaAprobacion.objects.filter(solicitud_id=solicitud.pk).delete()
+        return
+    entrada, creada = BandejaAprobacion.objects.get_or_create(
+        solicitud_id=solicitud.pk, defaults={'bandeja': solicitud.aprobador_actual}
+    )
+    if not creada and entrada.bandeja != solicitud.aprobador_actual:
+        entrada.bandeja = solicitud.aprobador_actual
+        entrada.fecha_ruteo = timezone.now()
+        entrada.save(update_fields=['bandeja', 'fecha_ruteo'])
+
+
+@transaction.atomic
+def rerutear_unidades(id_unidades, funcionario_id=None):
+    """
+    Recalcula la bandeja inicial de las solicitudes 'Pendiente' de las
+    unidades indicadas (y de las del funcionario dado, si ya no tiene unidad).
+    Las Pre-Aprobadas ya pasaron por el jefe y no se mueven.
+    """
+    filtro = Q(id_funcionario_solicitante__id_unidad_id__in=[u for u in id_unidades if u])
+    if funcionario_id is not None:
+        filtro |= Q(id_funcionario_solicitante_id=funcionario_id)
+    pendientes = SolicitudesPermiso.objects.filter(filtro, estado='Pendiente').select_related(
+        'id_funcionario_solicitante__id_rol'
+    )
+    bandejas = {}  # solicitante -> bandeja: una consulta de jefatura por persona
+    for solicitud in pendientes:
+        solicitante = solicitud.id_funcionario_solicitante
+        if solicitante.pk not in bandejas:
+            bandejas[solicitante.pk] = bandeja_inicial(solicitante)
+        nueva = bandejas[solicitante.pk]
+        if nueva == solicitud.aprobador_actual:
+            continue
+        # Condicionado como aplicar_transicion: no pisa una acción concurrente
+        movida = SolicitudesPermiso.objects.filter(
+            pk=solicitud.pk, estado='Pendiente', aprobador_actual=solicitud.aprobador_actual,
+        ).update(aprobador_actual=nueva)
+        if movida:
+            solicitud.aprobador_actual = nueva
+            sincronizar_bandeja(solicitud)
+
+
+def solicitudes_en_bandejas(bandejas):
+    """Solicitudes abiertas de las bandejas indicadas, leídas desde BandejaAprobacion."""
+    return SolicitudesPermiso.objects.filter(entrada_bandeja__bandeja__in=bandejas)
+
+
+def contar_pendientes(user):
+    """Cantidad de solicitudes que esperan una acción del usuario."""
+    bandejas = bandejas_de_usuario(user)
+    if not bandejas:
+        return 0
+    return BandejaAprobacion.objects.filter(bandeja__in=bandejas).count()
+
+
+def descontar_saldo(solicitud):
+    """Descuenta del saldo del solicitante los días de una solicitud aprobada."""
+    descuento = DESCUENTOS_SALDO.get(solicitud.tipo_permiso)
+    if descuento is None:
+        # Sin goce, Duelo, Hora médica: no descuentan saldo
+        return
+    campo, factor = descuento
+    Dias_Administrativos.objects.get_or_create(id_funcionario_id=solicitud.id_funcionario_solicitante_id)
+    Dias_Administrativos.objects.filter(id_funcionario_id=solicitud.id_funcionario_solicitante_id).update(
+        **{campo: F(campo) - solicitud.dias_solicitados * factor}
+    )
+
+
+@transaction.atomic
+def aplicar_transicion(solicitud, accion, user, comentario=''):
+    """
+    Ejecuta una acción del flujo sobre la solicitud y la guarda.
+
+    Raises:
+        TransicionInvalida: si la acción no existe, el estado no la admite,
+        el usuario no tiene un rol autorizado para ejecutarla o la solicitud
+        cambió desde que se leyó (otro aprobador actuó antes).
+    """
+    regla = TRANSICIONES.get(accion)
+    if regla is None:
+        raise TransicionInvalida(f'Acción desconocida: {accion}')
+    if solicitud.estado not in regla['desde']:
+        raise TransicionInvalida(f'No se puede {accion.replace("_", "-")} una solicitud en estado {solicitud.estado}.')
+    if rol_en_solicitud(user, solicitud) not in regla['roles']:
+        raise TransicionInvalida('No tienes permisos para realizar esta acción sobre la solicitud.')
+
+    # Se reclama la transición solo si la solicitud sigue como se leyó; el
+    # segundo de dos aprobadores simultáneos no actualiza ninguna fila
+    reclamada = SolicitudesPermiso.objects.filter(
+        pk=solicitud.pk, estado=solicitud.estado, aprobador_actual=solicitud.aprobador_actual,
+    ).update(estado=regla['hacia'], aprobador_actual=regla['siguiente'])
+    if not reclamada:
+        solicitud.refresh_from_db(fields=['estado', 'aprobador_actual'])
+        raise TransicionInvalida(f'La solicitud ya fue procesada (estado actual: {solicitud.estado}).')
+
+    ahora = timezone.now()
+    solicitud.estado = regla['hacia']
+    solicitud.aprobador_actual = regla['siguiente']
+
+    if accion == 'pre_aprobar':
+        solicitud.pre_aprobado_por = user
+        solicitud.fecha_pre_aprobacion = ahora
+    elif accion == 'rechazar':
+        solicitud.comentario_rechazo = comentario
+    else:
+        solicitud.aprobado_por = user
+        solicitud.fecha_aprobacion = ahora
+        descontar_saldo(solicitud)
+        # Licencia Médica: queda registrada en la tabla Licencias
+        if solicitud.tipo_permiso == 'licencia':
+            Licencias.objects.create(
+                id_funcionario_id=solicitud.id_funcionario_solicitante_id,
+                id_subdireccion_carga=user,
+                fecha_inicio=solicitud.fecha_inicio,
+                fecha_fin=solicitud.fecha_fin,
+                ruta_foto_licencia=solicitud.justificativo_archivo,
+            )
+
+    solicitud.save()
+    return solicitud
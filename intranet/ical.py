@@ -0,0 +1,174 @@
+"""
+Suscripción iCalendar (.ics) por funcionario.
+
+Las aplicaciones de calendario del teléfono consultan el enlace cada pocos
+minutos y sin sesión, por lo que el enlace lleva un token secreto
+(Funcionarios.token_calendario) y cada consulta debe ser barata:
+
+1. El token se resuelve a un funcionario con una búsqueda por índice único
+   (sin caché: al regenerar el token, el enlace anterior deja de funcionar en
+   todos los procesos del servidor de inmediato).
+2. El ETag combina la versión del calendario institucional, la versión de las
+   solicitudes del funcionario (ambas en la base, ver versiones.py) y el día
+   (la ventana avanza con la fecha). Si coincide con If-None-Match se responde
+   304 sin generar el archivo.
+3. El archivo se arma por partes: los VEVENT institucionales se generan una
+   vez por versión y se comparten entre todos los usuarios; los permisos
+   aprobados se generan por funcionario y solo cuando cambian sus solicitudes.
+"""
+import secrets
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .calendario import (
+    CACHE_FEED_TTL, CACHE_VERSION_CALENDARIO, invalidar_calendario, ocurrencias_en_ventana, version_calendario,
+)
+from .models import Funcionarios, SolicitudesPermiso
+
+# Ventana publicada: historial reciente y lo que viene
+DIAS_ATRAS = 90
+DIAS_ADELANTE = 365
+DOMINIO_UID = 'intranet.cesfam'
+CACHE_VERSION_ICS_USUARIO = 'ics:version:{usuario}'
+CACHE_ICS_EVENTOS = 'ics:eventos:{version}:{dia:%Y%m%d}'
+CACHE_ICS_PERMISOS = 'ics:permisos:{usuario}:{version}:{dia:%Y%m%d}'
+
+
+def _escapar(texto):
+    """Escapa un valor de texto según RFC 5545."""
+    return (str(texto or '').replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _plegar(linea):
+    """Pliega una línea de más de 75 octetos en líneas de continuación (RFC 5545)."""
+    partes = []
+    actual = ''
+    for caracter in linea:
+        if len((actual + caracter).encode('utf-8')) > 75:
+            partes.append(actual)
+            actual = ' '
+        actual += caracter
+    partes.append(actual)
+    return '\r\n'.join(partes)
+
+
+def _vevent(uid, inicio, fin_inclusivo, titulo, marca):
+    """Bloque VEVENT de día completo (DTEND es exclusivo)."""
+    lineas = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}@{DOMINIO_UID}',
+        f'DTSTAMP:{marca:%Y%m%dT%H%M%SZ}',
+        f'DTSTART;VALUE=DATE:{inicio:%Y%m%d}',
+        f'DTEND;VALUE=DATE:{fin_inclusivo + timedelta(days=1):%Y%m%d}',
+        f'SUMMARY:{_escapar(titulo)}',
+        'TRANSP:TRANSPARENT',
+        'END:VEVENT',
+    ]
+    return ''.join(_plegar(linea) + '\r\n' for linea in lineas)
+
+
+def ventana_ics(hoy=None):
+    """Ventana publicada (inicio, fin exclusivo) para el día indicado."""
+    hoy = hoy or timezone.localdate()
+    return hoy - timedelta(days=DIAS_ATRAS), hoy + timedelta(days=DIAS_ADELANTE)
+
+
+def generar_token(user):
+    """Asigna un token nuevo al funcionario; el enlace anterior deja de funcionar."""
+    user.token_calendario = secrets.token_urlsafe(32)
+    user.save(update_fields=['token_calendario'])
+    return user.token_calendario
+
+
+def usuario_de_token(token, request=None):
+    """Id del funcionario activo dueño del token (o None), recordado durante la petición."""
+    memoria = request.__dict__.setdefault('_usuarios_ics', {}) if request is not None else {}
+    if token not in memoria:
+        memoria[token] = Funcionarios.objects.filter(
+            token_calendario=token, is_active=True
+        ).values_list('pk', flat=True).first()
+    return memoria[token]
+
+
+def invalidar_permisos_usuario(usuario_id):
+    """Renueva la versión de los permisos publicados de un funcionario."""
+    invalidar_calendario(CACHE_VERSION_ICS_USUARIO.format(usuario=usuario_id))
+
+
+def etag_ics(usuario_id, hoy=None, request=None):
+    """ETag del .ics del funcionario para el día indicado."""
+    hoy = hoy or timezone.localdate()
+    return '{}-{}-{:%Y%m%d}'.format(
+        version_calendario(CACHE_VERSION_CALENDARIO, request),
+        version_calendario(CACHE_VERSION_ICS_USUARIO.format(usuario=usuario_id), request),
+        hoy,
+    )
+
+
+def etag_suscripcion(request, token):
+    """ETag de la petición al .ics (None si el token no es válido; la vista responde 404)."""
+    usuario_id = usuario_de_token(token, request)
+    return etag_ics(usuario_id, request=request) if usuario_id else None
+
+
+def _uid_evento(evento):
+    # Cada ocurrencia de una serie recurrente es un VEVENT propio
+    if evento['frecuencia']:
+        return f"evento-{evento['id']}-{evento['fecha_inicio']:%Y%m%d}"
+    return f"evento-{evento['id']}"
+
+
+def _bloque_eventos(hoy, request=None):
+    """VEVENT del calendario institucional, compartidos por todos los suscriptores."""
+    version = version_calendario(CACHE_VERSION_CALENDARIO, request)
+    clave = CACHE_ICS_EVENTOS.format(version=version, dia=hoy)
+    bloque = cache.get(clave)
+    if bloque is None:
+        inicio, fin = ventana_ics(hoy)
+        marca = timezone.now()
+        bloque = ''.join(
+            _vevent(_uid_evento(evento), evento['fecha_inicio'],
+                    evento['fecha_fin'] or evento['fecha_inicio'],
+                    f"{evento['tipo_evento']}: {evento['titulo']}", marca)
+            for evento in ocurrencias_en_ventana(inicio, fin)
+        )
+        cache.set(clave, bloque, CACHE_FEED_TTL)
+    return bloque
+
+
+def _bloque_permisos(usuario_id, hoy, request=None):
+    """VEVENT de los permisos aprobados del funcionario."""
+    version = version_calendario(CACHE_VERSION_ICS_USUARIO.format(usuario=usuario_id), request)
+    clave = CACHE_ICS_PERMISOS.format(usuario=usuario_id, version=version, dia=hoy)
+    bloque = cache.get(clave)
+    if bloque is None:
+        inicio, fin = ventana_ics(hoy)
+        tipos = dict(SolicitudesPermiso.TIPOS_PERMISO)
+        marca = timezone.now()
+        bloque = ''.join(
+            _vevent(f'permiso-{pk}', desde, hasta, f'Permiso: {tipos.get(tipo, tipo)}', marca)
+            for pk, tipo, desde, hasta in SolicitudesPermiso.objects.filter(
+                id_funcionario_solicitante_id=usuario_id, estado='Aprobado',
+                fecha_inicio__lt=fin, fecha_fin__gte=inicio,
+            ).values_list('pk', 'tipo_permiso', 'fecha_inicio', 'fecha_fin')
+        )
+        cache.set(clave, bloque, CACHE_FEED_TTL)
+    return bloque
+
+
+def calendario_ics(usuario_id, hoy=None, request=None):
+    """Contenido completo del .ics del funcionario (con request, reutiliza las versiones leídas)."""
+    hoy = hoy or timezone.localdate()
+    return (
+        'BEGIN:VCALENDAR\r\n'
+        'VERSION:2.0\r\n'
+        'PRODID:-//CESFAM//Intranet//ES\r\n'
+        'CALSCALE:GREGORIAN\r\n'
+        'X-WR-CALNAME:CESFAM\r\n'
+        + _bloque_eventos(hoy, request)
+        + _bloque_permisos(usuario_id, hoy, request)
+        + 'END:VCALENDAR\r\n'
+    )
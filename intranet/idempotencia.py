@@ -0,0 +1,78 @@
+"""
+Envíos idempotentes de formularios.
+
+Cada formulario protegido incluye un campo oculto 'idempotency_key' con una
+clave única por página renderizada. La primera petición POST con esa clave
+reserva la clave en caché (cache.add es atómico) y, al terminar, guarda la
+redirección resultante. Los reintentos con la misma clave (doble clic, red
+lenta) esperan a que termine la primera y reciben la misma redirección en vez
+de repetir el trabajo.
+"""
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseRedirect
+
+CAMPO_IDEMPOTENCIA = 'idempotency_key'
+EN_PROCESO = 'en_proceso'
+
+
+def nueva_clave():
+    """Genera una clave de idempotencia para un formulario."""
+    return uuid.uuid4().hex
+
+
+def _clave_cache(request, clave):
+    # La clave se asocia al usuario y a la URL para que no choque entre formularios
+    return f'idempotencia:{request.user.pk}:{request.path}:{clave}'
+
+
+def _esperar_resultado(clave_cache, espera_maxima):
+    """Espera a que la petición original termine y retorna su resultado (o None)."""
+    limite = time.monotonic() + espera_maxima
+    while time.monotonic() < limite:
+        resultado = cache.get(clave_cache)
+        if resultado != EN_PROCESO:
+            return resultado
+        time.sleep(0.1)
+    return None
+
+
+def idempotente(vista):
+    """
+    Decorador para vistas que procesan formularios POST.
+    Las peticiones sin clave se procesan normalmente.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        clave = request.POST.get(CAMPO_IDEMPOTENCIA) if request.method == 'POST' else None
+        if not clave or not request.user.is_authenticated:
+            return vista(request, *args, **kwargs)
+
+        ttl = getattr(settings, 'IDEMPOTENCIA_TTL', 600)
+        clave_cache = _clave_cache(request, clave)
+
+        if not cache.add(clave_cache, EN_PROCESO, ttl):
+            # Reintento: se responde con el resultado de la petición original
+            resultado = _esperar_resultado(clave_cache, getattr(settings, 'IDEMPOTENCIA_ESPERA', 5))
+            if resultado is None or resultado == EN_PROCESO:
+                return HttpResponse('La solicitud ya se está procesando.', status=409)
+            return HttpResponseRedirect(resultado)
+
+        try:
+            response = vista(request, *args, **kwargs)
+        except Exception:
+            cache.delete(clave_cache)
+            raise
+
+        if response.status_code in (301, 302, 303) and response.has_header('Location'):
+            cache.set(clave_cache, response['Location'], ttl)
+        else:
+            # Formulario con errores: no se hizo nada, se permite reintentar
+            cache.delete(clave_cache)
+        return response
+
+    return envoltura
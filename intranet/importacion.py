@@ -0,0 +1,248 @@
+"""
+Importación masiva de funcionarios desde CSV o Excel (.xlsx).
+
+Al incorporar un CESFAM completo se cargan cientos o miles de funcionarios y
+crear cada uno con crear_usuario_view cuesta un hash Argon2 y varias
+inserciones por persona. La importación:
+
+1. Lee y valida todas las filas antes de escribir nada: columnas obligatorias,
+   usuarios repetidos en el archivo o ya existentes, unidad, rol, email y
+   contraseña. Si alguna fila falla no se crea ningún usuario y se informan
+   todos los errores juntos.
+2. Hashea las contraseñas (lento a propósito) en un pool de procesos, uno por
+   CPU o IMPORTACION_PROCESOS.
+3. Inserta Funcionarios y Dias_Administrativos con bulk_create en una sola
+   transacción y escribe un único registro de auditoría con el resumen.
+"""
+import csv
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .auditoria import registrar_auditoria
+from .flujo_solicitudes import rerutear_unidades
+from .models import Dias_Administrativos, Funcionarios, Roles, Unidades
+
+TAMANO_LOTE_IMPORTACION = 500
+MAXIMO_FILAS = 5000
+
+# Encabezado aceptado (en minúsculas) -> campo
+COLUMNAS = {
+    'usuario': 'username', 'username': 'username',
+    'contraseña': 'password', 'contrasena': 'password', 'password': 'password',
+    'nombre': 'first_name', 'nombres': 'first_name', 'first_name': 'first_name',
+    'apellido': 'last_name', 'apellidos': 'last_name', 'last_name': 'last_name',
+    'email': 'email', 'correo': 'email',
+    'unidad': 'unidad',
+    'rol': 'rol',
+    'jefe de unidad': 'es_jefe_unidad', 'es_jefe_unidad': 'es_jefe_unidad',
+}
+OBLIGATORIAS = ('username', 'password', 'first_name', 'last_name')
+VALORES_SI = {'si', 'sí', 's', 'x', '1', 'true', 'verdadero'}
+
+
+class ImportacionInvalida(Exception):
+    """El archivo no se pudo leer o tiene filas con errores; no se creó ningún usuario."""
+
+    def __init__(self, errores):
+        # Lista de (número de fila, mensaje); la fila 1 es el encabezado
+        self.errores = errores
+        super().__init__(f'{len(errores)} error(es) en el archivo')
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _filas_xlsx(archivo):
+    try:
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        raise ImportacionInvalida([(0, 'El archivo Excel no es válido.')])
+    return libro.active.iter_rows(values_only=True)
+
+
+def _filas_csv(archivo):
+    try:
+        contenido = archivo.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ImportacionInvalida([(0, 'El archivo CSV debe estar codificado en UTF-8.')])
+    try:
+        # Excel en español guarda los CSV separados por punto y coma
+        dialecto = csv.Sniffer().sniff(contenido[:4096], delimiters=',;')
+    except csv.Error:
+        dialecto = csv.excel
+    return csv.reader(io.StringIO(contenido), dialecto)
+
+
+def leer_filas(archivo):
+    """
+    Filas del archivo subido.
+
+    Returns:
+        list: tuplas (número de fila, dict {campo: texto}); se omiten las filas vacías.
+
+    Raises:
+        ImportacionInvalida: formato no soportado o encabezado sin las columnas obligatorias.
+    """
+    nombre = archivo.name.lower()
+    if nombre.endswith('.xlsx'):
+        filas = _filas_xlsx(archivo)
+    elif nombre.endswith('.csv'):
+        filas = _filas_csv(archivo)
+    else:
+        raise ImportacionInvalida([(0, 'El archivo debe ser .csv o .xlsx.')])
+
+    encabezado = [COLUMNAS.get(_texto(columna).lower()) for columna in next(filas, ())]
+    faltantes = [campo for campo in OBLIGATORIAS if campo not in encabezado]
+    if faltantes:
+        raise ImportacionInvalida([(1, 'Faltan las columnas: ' + ', '.join(faltantes) + '.')])
+
+    resultado = []
+    for numero, valores in enumerate(filas, start=2):
+        fila = {campo: _texto(valor) for campo, valor in zip(encabezado, valores) if campo}
+        if any(fila.values()):
+            resultado.append((numero, fila))
+    return resultado
+
+
+def validar_filas(filas):
+    """
+    Valida todas las filas contra la base con un número fijo de consultas.
+
+    Returns:
+        list: dicts listos para crear el funcionario (unidad y rol resueltos a id).
+
+    Raises:
+        ImportacionInvalida: con todos los errores encontrados.
+    """
+    if not filas:
+        raise ImportacionInvalida([(0, 'El archivo no tiene funcionarios.')])
+    if len(filas) > MAXIMO_FILAS:
+        raise ImportacionInvalida([(0, f'El archivo supera el máximo de {MAXIMO_FILAS} filas.')])
+
+    unidades = {nombre.lower(): pk for pk, nombre in
+                Unidades.objects.filter(activa=True).values_list('pk', 'nombre_unidad')}
+    roles = {nombre.lower(): pk for pk, nombre in Roles.objects.values_list('pk', 'nombre_rol')}
+    existentes = set(Funcionarios.objects.filter(
+        username__in=[fila.get('username', '') for _, fila in filas]
+    ).values_list('username', flat=True))
+
+    errores = []
+    validas = []
+    vistos = set()
+    for numero, fila in filas:
+        problemas = [f'falta {campo}' for campo in OBLIGATORIAS if not fila.get(campo)]
+        username = fila.get('username', '')
+        if username in vistos:
+            problemas.append(f"el usuario '{username}' está repetido en el archivo")
+        elif username in existentes:
+            problemas.append(f"el usuario '{username}' ya existe")
+        vistos.add(username)
+        if username:
+            try:
+                Funcionarios.username_validator(username)
+            except ValidationError:
+                problemas.append(f"el usuario '{username}' tiene caracteres no permitidos")
+
+        email = fila.get('email', '')
+        if email:
+            try:
+                validate_email(email)
+            except ValidationError:
+                problemas.append(f"el email '{email}' no es válido")
+
+        unidad = fila.get('unidad', '')
+        if unidad and unidad.lower() not in unidades:
+            problemas.append(f"la unidad '{unidad}' no existe o está inactiva")
+        rol = fila.get('rol', '')
+        if rol and rol.lower() not in roles:
+            problemas.append(f"el rol '{rol}' no existe")
+
+        datos = {
+            'username': username,
+            'password': fila.get('password', ''),
+            'first_name': fila.get('first_name', ''),
+            'last_name': fila.get('last_name', ''),
+            'email': email,
+            'id_unidad_id': unidades.get(unidad.lower()),
+            'id_rol_id': roles.get(rol.lower()),
+            'es_jefe_unidad': fila.get('es_jefe_unidad', '').lower() in VALORES_SI,
+        }
+        if datos['password']:
+            try:
+                validate_password(datos['password'], user=Funcionarios(
+                    username=username, first_name=datos['first_name'],
+                    last_name=datos['last_name'], email=email,
+                ))
+            except ValidationError as error:
+                problemas.append('contraseña: ' + ' '.join(error.messages))
+
+        if problemas:
+            errores.append((numero, '; '.join(problemas)))
+        else:
+            validas.append(datos)
+
+    if errores:
+        raise ImportacionInvalida(errores)
+    return validas
+
+
+def hashear_contrasenas(contrasenas):
+    """Hashea las contraseñas en paralelo, en el mismo orden recibido."""
+    procesos = min(getattr(settings, 'IMPORTACION_PROCESOS', None) or os.cpu_count() or 1, len(contrasenas))
+    if procesos <= 1:
+        return [make_password(contrasena) for contrasena in contrasenas]
+    # make_password se importa en cada proceso desde Django (no desde este
+    # módulo), así funciona también con el método de inicio 'spawn'
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return list(pool.map(make_password, contrasenas, chunksize=max(1, len(contrasenas) // (procesos * 4))))
+
+
+def importar_funcionarios(archivo, actor):
+    """
+    Importa los funcionarios del archivo (todos o ninguno).
+
+    Returns:
+        list: funcionarios creados.
+
+    Raises:
+        ImportacionInvalida: si el archivo o alguna fila no es válida.
+    """
+    filas = validar_filas(leer_filas(archivo))
+    hashes = hashear_contrasenas([fila.pop('password') for fila in filas])
+
+    with transaction.atomic():
+        creados = Funcionarios.objects.bulk_create([
+            # Los jefes tienen is_staff, igual que en crear_usuario_view
+            Funcionarios(password=hash_, is_staff=fila['es_jefe_unidad'], **fila)
+            for fila, hash_ in zip(filas, hashes)
+        ], batch_size=TAMANO_LOTE_IMPORTACION)
+        # bulk_create no emite señales: las pendientes de las unidades que
+        # reciben jefe se rerutean aquí (ver signals.funcionario_guardado)
+        unidades_con_jefe = {funcionario.id_unidad_id for funcionario in creados if funcionario.es_jefe_unidad}
+        if unidades_con_jefe:
+            rerutear_unidades(unidades_con_jefe)
+        Dias_Administrativos.objects.bulk_create(
+            [Dias_Administrativos(id_funcionario=funcionario) for funcionario in creados],
+            batch_size=TAMANO_LOTE_IMPORTACION,
+        )
+        registrar_auditoria(
+            actor,
+            'Importación de Usuarios',
+            f"Se importaron {len(creados)} usuarios desde {archivo.name}",
+            codigo='usuario.importados',
+            datos={'archivo': archivo.name, 'cantidad': len(creados),
+                   'usuarios': [funcionario.username for funcionario in creados]},
+        )
+    return creados
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from intranet.archivo_auditoria import meses_archivados
+from intranet.models import MarcaResumen, ResumenMensual
+from intranet.resumenes import FUENTES_RESUMEN, actualizar_fuente
+
+
+class Command(BaseCommand):
+    """
+    Actualiza los resúmenes mensuales (ResumenMensual) de forma incremental.
+
+    - Solo lee los registros modificados desde la última ejecución de cada fuente
+      y recalcula los meses que tocan (incluye ediciones tardías).
+    - Recalcula también los meses con registros eliminados.
+    - --reconstruir borra los resúmenes y marcas y procesa todo el historial.
+      Los resúmenes de logs de los meses archivados se conservan: su detalle
+      ya no está en Logs_Auditoria y el resumen es su único conteo.
+
+    Uso: python manage.py actualizar_resumenes [--fuente logs] [--reconstruir]
+    (pensado para cron, por ejemplo cada hora).
+    """
+    help = 'Actualiza los resúmenes mensuales de solicitudes, licencias y logs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fuente', action='append', choices=sorted(FUENTES_RESUMEN),
+                            help='Fuente a procesar (se puede repetir). Por defecto, todas.')
+        parser.add_argument('--reconstruir', action='store_true',
+                            help='Borra los resúmenes de las fuentes y los recalcula desde cero.')
+
+    def handle(self, *args, **options):
+        fuentes = options['fuente'] or sorted(FUENTES_RESUMEN)
+
+        if options['reconstruir']:
+            ResumenMensual.objects.filter(fuente__in=fuentes).exclude(
+                fuente='logs', mes__in=meses_archivados()
+            ).delete()
+            MarcaResumen.objects.filter(fuente__in=fuentes).delete()
+
+        for fuente in fuentes:
+            meses = actualizar_fuente(fuente)
+            mensaje = f'{fuente}: {len(meses)} mes(es) recalculado(s)'
+            if 0 < len(meses) <= 12:
+                mensaje += ' (' + ', '.join(f'{mes:%Y-%m}' for mes in meses) + ')'
+            self.stdout.write(self.style.SUCCESS(mensaje + '.'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from intranet.archivo_auditoria import (
+    ArchivoInconsistente, archivar_anteriores, limite_retencion, meses_por_archivar, ruta_mes,
+)
+
+
+class Command(BaseCommand):
+    """
+    Mueve a archivos comprimidos los registros de auditoría anteriores a la retención.
+
+    - Archiva por mes completo en AUDITORIA_ARCHIVO_DIR (logs_AAAA-MM.jsonl.gz).
+    - Solo elimina de la base los registros de un mes después de verificar que
+      el archivo contiene la misma cantidad de registros.
+    - Se puede volver a ejecutar: los ids ya archivados no se repiten.
+
+    Uso: python manage.py archivar_auditoria [--dias 365] [--simular]
+    (pensado para cron, por ejemplo una vez al mes).
+    """
+    help = 'Archiva en archivos comprimidos los logs de auditoría más antiguos que la retención.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int,
+                            help='Días de retención en la base. Por defecto, AUDITORIA_RETENCION_DIAS.')
+        parser.add_argument('--simular', action='store_true',
+                            help='Solo muestra los meses que se archivarían.')
+
+    def handle(self, *args, **options):
+        if options['simular']:
+            meses = meses_por_archivar(limite_retencion(options['dias']))
+            for mes in meses:
+                self.stdout.write(f'{mes:%Y-%m} -> {ruta_mes(mes)}')
+            self.stdout.write(self.style.SUCCESS(f'{len(meses)} mes(es) por archivar.'))
+            return
+
+        try:
+            archivados = archivar_anteriores(options['dias'])
+        except ArchivoInconsistente as error:
+            raise CommandError(f'Archivo inconsistente, no se eliminaron registros de ese mes: {error}')
+
+        for mes, cantidad in archivados:
+            self.stdout.write(f'{mes:%Y-%m}: {cantidad} registro(s) archivado(s).')
+        total = sum(cantidad for _, cantidad in archivados)
+        self.stdout.write(self.style.SUCCESS(f'{total} registro(s) archivado(s) en {len(archivados)} mes(es).'))
@@ -0,0 +1,47 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from intranet.archivo_auditoria import ArchivoInconsistente, buscar_en_archivo
+
+
+class Command(BaseCommand):
+    """
+    Busca en los archivos de auditoría sin restaurarlos en la base.
+
+    Lee solo los archivos de los meses del rango y escribe una línea JSON por
+    registro encontrado.
+
+    Uso: python manage.py buscar_auditoria --desde 2024-01-01 --hasta 2024-03-31
+         [--accion 'Solicitud Aprobada'] [--codigo solicitud.aprobada] [--actor usuario] [--texto palabra]
+    """
+    help = 'Busca registros de auditoría archivados por fecha, acción, actor o texto.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', required=True, help='Fecha inicial (AAAA-MM-DD).')
+        parser.add_argument('--hasta', required=True, help='Fecha final, inclusive (AAAA-MM-DD).')
+        parser.add_argument('--accion', help='Acción exacta.')
+        parser.add_argument('--codigo', help="Código estructurado (ej. 'solicitud.aprobada').")
+        parser.add_argument('--actor', help='Nombre de usuario del actor.')
+        parser.add_argument('--texto', help='Texto a buscar en el detalle.')
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde'])
+            hasta = date.fromisoformat(options['hasta'])
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato AAAA-MM-DD.')
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta.')
+
+        encontrados = 0
+        try:
+            for registro in buscar_en_archivo(desde, hasta, accion=options['accion'],
+                                              actor=options['actor'], texto=options['texto'],
+                                              codigo=options['codigo']):
+                self.stdout.write(json.dumps(registro, ensure_ascii=False))
+                encontrados += 1
+        except ArchivoInconsistente as error:
+            raise CommandError(str(error))
+        self.stderr.write(f'{encontrados} registro(s) encontrado(s).')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from intranet.models import Funcionarios
+from intranet.solapamientos import ESTADOS_ACTIVOS, detectar_todos_los_solapamientos
+
+
+class Command(BaseCommand):
+    """
+    Lista todos los permisos y licencias que se solapan entre sí.
+    Uso: python manage.py detectar_solapamientos [--solo-aprobadas]
+    """
+    help = 'Detecta solicitudes de permiso y licencias solapadas para un mismo funcionario.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo-aprobadas', action='store_true',
+            help='Considera solo solicitudes Aprobadas (ignora Pendientes y Pre-Aprobadas).'
+        )
+
+    def handle(self, *args, **options):
+        estados = ('Aprobado',) if options['solo_aprobadas'] else ESTADOS_ACTIVOS
+        pares = list(detectar_todos_los_solapamientos(estados=estados))
+
+        # Un solo query para los nombres de los funcionarios involucrados
+        nombres = dict(Funcionarios.objects.filter(
+            pk__in={a[0] for a, b in pares}
+        ).values_list('pk', 'username'))
+
+        for a, b in pares:
+            self.stdout.write(
+                f"{nombres.get(a[0], a[0])}: {a[3]} #{a[4]} ({a[1]} a {a[2]}) "
+                f"se solapa con {b[3]} #{b[4]} ({b[1]} a {b[2]})"
+            )
+
+        if pares:
+            self.stdout.write(self.style.WARNING(f"Se encontraron {len(pares)} solapamiento(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No se encontraron solapamientos."))
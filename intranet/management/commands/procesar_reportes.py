@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from intranet.trabajos import INTERVALO_LATIDO, generar_reporte, purgar_expirados, recuperar_interrumpidos, tomar_siguiente_trabajo
+
+
+class Command(BaseCommand):
+    """
+    Worker de reportes en segundo plano.
+
+    - Toma los TrabajoReporte pendientes por orden de llegada y genera su archivo.
+    - Elimina los archivos expirados.
+    - Devuelve a la cola los trabajos 'En Proceso' cuyo latido se detuvo (worker caído);
+      los que siguen generándose renuevan su latido y no se retoman.
+
+    Uso: python manage.py procesar_reportes [--una-vez] [--espera 5]
+    (sin --una-vez queda escuchando la cola; pensado para systemd/supervisor o cron).
+    """
+    help = 'Genera los reportes encolados y elimina los archivos expirados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los trabajos pendientes y termina.')
+        parser.add_argument('--espera', type=int, default=5,
+                            help='Segundos entre revisiones de la cola cuando está vacía.')
+        parser.add_argument('--interrumpidos', type=int, default=10,
+                            help='Minutos sin latido tras los cuales un trabajo en proceso se vuelve a encolar.')
+
+    def handle(self, *args, **options):
+        if options['espera'] < 1:
+            raise CommandError('--espera debe ser mayor que cero.')
+        if options['interrumpidos'] * 60 <= INTERVALO_LATIDO:
+            raise CommandError(f'--interrumpidos debe superar el intervalo de latido ({INTERVALO_LATIDO} s).')
+
+        while True:
+            recuperados = recuperar_interrumpidos(options['interrumpidos'])
+            if recuperados:
+                self.stdout.write(self.style.WARNING(f'{recuperados} trabajo(s) interrumpido(s) vuelven a la cola.'))
+
+            expirados = purgar_expirados()
+            if expirados:
+                self.stdout.write(f'{expirados} archivo(s) expirado(s) eliminado(s).')
+
+            procesados = 0
+            while True:
+                trabajo = tomar_siguiente_trabajo()
+                if trabajo is None:
+                    break
+                procesados += 1
+                if generar_reporte(trabajo) is None:
+                    self.stdout.write(self.style.WARNING(
+                        f'Reporte #{trabajo.pk} ({trabajo.tipo}) lo retomó otro worker; se descarta este resultado.'
+                    ))
+                elif trabajo.estado == 'Terminado':
+                    self.stdout.write(self.style.SUCCESS(f'Reporte #{trabajo.pk} ({trabajo.tipo}) generado.'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'Reporte #{trabajo.pk} ({trabajo.tipo}) falló: {trabajo.error}'))
+
+            if options['una_vez']:
+                self.stdout.write(f'{procesados} reporte(s) procesado(s).')
+                return
+            time.sleep(options['espera'])
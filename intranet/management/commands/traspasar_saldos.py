@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from intranet.auditoria import registrar_auditoria
+from intranet.models import Funcionarios, Dias_Administrativos, anio_actual
+
+REGLAS_POR_DEFECTO = {
+    'VACACIONES_BASE': 15,
+    'VACACIONES_ARRASTRE_MAX': 15,
+    'ADMIN_BASE': 6,
+    'ADMIN_ARRASTRE_MAX': 0,
+    'HORAS_COMPENSACION_ARRASTRE_MAX': None,
+}
+
+
+def _arrastre(restante, maximo):
+    """Días que pasan al año siguiente según el tope configurado."""
+    restante = max(restante, 0)
+    return restante if maximo is None else min(restante, maximo)
+
+
+class Command(BaseCommand):
+    """
+    Traspasa los saldos de todos los funcionarios al año indicado.
+
+    - Procesa por lotes con bulk_update (una transacción por lote).
+    - Es idempotente: solo toca saldos con anio_saldo menor al año destino,
+      por lo que volver a ejecutarlo tras una interrupción continúa donde quedó.
+    - Registra un único log de auditoría con el resumen.
+
+    Uso: python manage.py traspasar_saldos [--anio 2026] [--lote 500] [--simular]
+    """
+    help = 'Reinicia los saldos anuales aplicando las reglas de arrastre de SALDOS_ANUALES.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anio', type=int, default=None, help='Año destino (por defecto, el año en curso).')
+        parser.add_argument('--lote', type=int, default=500, help='Registros por lote.')
+        parser.add_argument('--arrastre-vacaciones', type=int, default=None,
+                            help='Sobrescribe VACACIONES_ARRASTRE_MAX.')
+        parser.add_argument('--arrastre-admin', type=int, default=None,
+                            help='Sobrescribe ADMIN_ARRASTRE_MAX.')
+        parser.add_argument('--simular', action='store_true', help='Muestra cuántos saldos se traspasarían sin guardar.')
+
+    def handle(self, *args, **options):
+        anio = options['anio'] or anio_actual()
+        lote = options['lote']
+        if lote < 1:
+            raise CommandError('--lote debe ser mayor que cero.')
+
+        reglas = {**REGLAS_POR_DEFECTO, **getattr(settings, 'SALDOS_ANUALES', {})}
+        if options['arrastre_vacaciones'] is not None:
+            reglas['VACACIONES_ARRASTRE_MAX'] = options['arrastre_vacaciones']
+        if options['arrastre_admin'] is not None:
+            reglas['ADMIN_ARRASTRE_MAX'] = options['arrastre_admin']
+
+        pendientes = Dias_Administrativos.objects.filter(anio_saldo__lt=anio)
+        sin_saldo = Funcionarios.objects.filter(dias_administrativos__isnull=True)
+
+        if options['simular']:
+            self.stdout.write(
+                f"Año {anio}: {pendientes.count()} saldo(s) por traspasar, "
+                f"{sin_saldo.count()} funcionario(s) sin saldo por crear."
+            )
+            return
+
+        # 1. Funcionarios sin registro de saldo: se crean con los valores base del año
+        creados = 0
+        while True:
+            ids = list(sin_saldo.order_by('pk').values_list('pk', flat=True)[:lote])
+            if not ids:
+                break
+            Dias_Administrativos.objects.bulk_create([
+                Dias_Administrativos(
+                    id_funcionario_id=pk,
+                    vacaciones_restantes=reglas['VACACIONES_BASE'],
+                    admin_restantes=reglas['ADMIN_BASE'],
+                    horas_compensacion=0,
+                    anio_saldo=anio,
+                )
+                for pk in ids
+            ], ignore_conflicts=True)
+            creados += len(ids)
+
+        # 2. Traspaso por lotes, avanzando por clave primaria
+        traspasados = 0
+        ultimo_pk = None
+        campos = ['vacaciones_restantes', 'admin_restantes', 'horas_compensacion', 'anio_saldo']
+        while True:
+            with transaction.atomic():
+                consulta = pendientes.select_for_update().order_by('pk')
+                if ultimo_pk is not None:
+                    consulta = consulta.filter(pk__gt=ultimo_pk)
+                saldos = list(consulta[:lote])
+                if not saldos:
+                    break
+
+                for saldo in saldos:
+                    saldo.vacaciones_restantes = reglas['VACACIONES_BASE'] + _arrastre(
+                        saldo.vacaciones_restantes, reglas['VACACIONES_ARRASTRE_MAX'])
+                    saldo.admin_restantes = reglas['ADMIN_BASE'] + _arrastre(
+                        saldo.admin_restantes, reglas['ADMIN_ARRASTRE_MAX'])
+                    saldo.horas_compensacion = _arrastre(
+                        saldo.horas_compensacion, reglas['HORAS_COMPENSACION_ARRASTRE_MAX'])
+                    saldo.anio_saldo = anio
+
+                Dias_Administrativos.objects.bulk_update(saldos, campos)
+
+            traspasados += len(saldos)
+            ultimo_pk = saldos[-1].pk
+            self.stdout.write(f"  Lote procesado: {traspasados} saldo(s) traspasados...")
+
+        if not (traspasados or creados):
+            self.stdout.write(self.style.SUCCESS(f"Los saldos ya están al día para el año {anio}."))
+            return
+
+        # 3. Un único registro de auditoría con el resumen
+        registrar_auditoria(
+            None,
+            'Traspaso Anual de Saldos',
+            (
+                f"Año {anio}: {traspasados} saldo(s) traspasados, {creados} creado(s). "
+                f"Reglas: vacaciones base {reglas['VACACIONES_BASE']} (arrastre máx. {reglas['VACACIONES_ARRASTRE_MAX']}), "
+                f"administrativos base {reglas['ADMIN_BASE']} (arrastre máx. {reglas['ADMIN_ARRASTRE_MAX']}), "
+                f"horas compensación arrastre máx. {reglas['HORAS_COMPENSACION_ARRASTRE_MAX']}"
+            ),
+            codigo='saldos.traspasados',
+            datos={'anio': anio, 'traspasados': traspasados, 'creados': creados, 'reglas': reglas},
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Traspaso al año {anio} completado: {traspasados} traspasado(s), {creados} creado(s)."
+        ))
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0013_documentos_visibilidad_jerarquica'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='solicitudespermiso',
+            name='tipo_permiso',
+            field=models.CharField(choices=[('administrativo', 'Día Administrativo'), ('vacaciones', 'Feriado Legal (Vacaciones)'), ('sin_goce', 'Permiso sin Goce de Sueldo'), ('hora_medica', 'Hora Médica'), ('duelo', 'Permiso por Duelo Familiar'), ('compensacion', 'Compensación de Horas')], max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='licencias',
+            index=models.Index(fields=['id_funcionario', 'fecha_inicio', 'fecha_fin'], name='lic_func_rango_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudespermiso',
+            index=models.Index(fields=['id_funcionario_solicitante', 'fecha_inicio', 'fecha_fin'], name='sol_func_rango_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:26
+
+import intranet.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0014_indices_solapamiento'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dias_administrativos',
+            name='anio_saldo',
+            field=models.IntegerField(default=intranet.models.anio_actual, verbose_name='Año del saldo'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:40
+
+from django.db import migrations, models
+
+
+def asignar_aprobador_actual(apps, schema_editor):
+    """Calcula la bandeja de las solicitudes abiertas con las reglas de ruteo vigentes."""
+    Funcionarios = apps.get_model('intranet', 'Funcionarios')
+    SolicitudesPermiso = apps.get_model('intranet', 'SolicitudesPermiso')
+
+    SolicitudesPermiso.objects.filter(estado='Pre-Aprobado').update(aprobador_actual='subdireccion')
+
+    unidades_con_jefe = set(
+        Funcionarios.objects.filter(es_jefe_unidad=True, is_active=True).values_list('id_unidad_id', flat=True)
+    )
+    pendientes = SolicitudesPermiso.objects.filter(estado='Pendiente').select_related(
+        'id_funcionario_solicitante__id_rol'
+    )
+    for solicitud in pendientes.iterator():
+        solicitante = solicitud.id_funcionario_solicitante
+        rol = solicitante.id_rol
+        if solicitante.is_superuser or (rol and rol.nivel_jerarquico <= 2):
+            bandeja = 'director'
+        elif solicitante.es_jefe_unidad or solicitante.id_unidad_id not in unidades_con_jefe:
+            bandeja = 'subdireccion'
+        else:
+            bandeja = f'jefe:{solicitante.id_unidad_id}'
+        SolicitudesPermiso.objects.filter(pk=solicitud.pk).update(aprobador_actual=bandeja)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0015_anio_saldo_actual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solicitudespermiso',
+            name='aprobador_actual',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=50),
+        ),
+        migrations.RunPython(asignar_aprobador_actual, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def poblar_bandeja(apps, schema_editor):
+    """Crea la entrada de bandeja de cada solicitud abierta."""
+    SolicitudesPermiso = apps.get_model('intranet', 'SolicitudesPermiso')
+    BandejaAprobacion = apps.get_model('intranet', 'BandejaAprobacion')
+    abiertas = SolicitudesPermiso.objects.exclude(aprobador_actual='').values_list(
+        'pk', 'aprobador_actual', 'fecha_solicitud'
+    )
+    BandejaAprobacion.objects.bulk_create([
+        BandejaAprobacion(solicitud_id=pk, bandeja=bandeja, fecha_ruteo=fecha)
+        for pk, bandeja, fecha in abiertas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0016_solicitudespermiso_aprobador_actual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BandejaAprobacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bandeja', models.CharField(max_length=50)),
+                ('fecha_ruteo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('solicitud', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='entrada_bandeja', to='intranet.solicitudespermiso')),
+            ],
+            options={
+                'verbose_name_plural': 'Bandeja de Aprobación',
+                'indexes': [models.Index(fields=['bandeja', 'fecha_ruteo'], name='bandeja_ruteo_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_bandeja, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0017_bandejaaprobacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comunicados',
+            index=models.Index(fields=['fecha_publicacion'], name='com_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comunicados',
+            index=models.Index(fields=['unidad_destino', 'fecha_publicacion'], name='com_unidad_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentos',
+            index=models.Index(fields=['fecha_carga'], name='doc_fecha_carga_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentos',
+            index=models.Index(fields=['categoria', 'fecha_carga'], name='doc_categoria_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='licencias',
+            index=models.Index(fields=['fecha_inicio', 'fecha_fin'], name='lic_rango_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='licencias',
+            index=models.Index(fields=['fecha_registro'], name='lic_fecha_registro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logs_auditoria',
+            index=models.Index(fields=['fecha_hora'], name='log_fecha_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudespermiso',
+            index=models.Index(fields=['estado', 'fecha_solicitud'], name='sol_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudespermiso',
+            index=models.Index(fields=['id_funcionario_solicitante', 'fecha_solicitud'], name='sol_func_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudespermiso',
+            index=models.Index(fields=['fecha_solicitud'], name='sol_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0019_trabajoreporte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenAusenciasMes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(unique=True)),
+                ('datos', models.JSONField(default=list)),
+                ('fecha_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'Resúmenes de Ausencias',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='solicitudespermiso',
+            index=models.Index(fields=['estado', 'fecha_inicio'], name='sol_estado_inicio_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0020_resumen_ausencias_mes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fuente', models.CharField(max_length=20, unique=True)),
+                ('marca', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='licencias',
+            name='fecha_modificacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='solicitudespermiso',
+            name='fecha_modificacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='ResumenMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fuente', models.CharField(choices=[('solicitudes', 'Solicitudes de Permiso'), ('licencias', 'Licencias Médicas'), ('logs', 'Logs de Auditoría')], max_length=20)),
+                ('mes', models.DateField()),
+                ('tipo', models.CharField(blank=True, default='', max_length=255)),
+                ('estado', models.CharField(blank=True, default='', max_length=50)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('dias', models.IntegerField(default=0)),
+                ('recalcular', models.BooleanField(default=False)),
+                ('id_unidad', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='intranet.unidades')),
+            ],
+            options={
+                'verbose_name_plural': 'Resúmenes Mensuales',
+                'indexes': [models.Index(fields=['fuente', 'mes'], name='resumen_fuente_mes_idx')],
+            },
+        ),
+    ]
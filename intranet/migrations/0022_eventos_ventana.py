@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0021_resumenes_mensuales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventos_calendario',
+            index=models.Index(fields=['fecha_fin', 'fecha_inicio'], name='evento_ventana_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventos_calendario',
+            index=models.Index(fields=['fecha_inicio'], name='evento_inicio_idx'),
+        ),
+    ]
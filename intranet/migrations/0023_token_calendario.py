@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0022_eventos_ventana'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='funcionarios',
+            name='token_calendario',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0023_token_calendario'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='eventos_calendario',
+            name='evento_inicio_idx',
+        ),
+        migrations.AddField(
+            model_name='eventos_calendario',
+            name='excepciones',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='eventos_calendario',
+            name='frecuencia',
+            field=models.CharField(blank=True, choices=[('', 'No se repite'), ('semanal', 'Semanal'), ('mensual', 'Mensual')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='eventos_calendario',
+            name='intervalo',
+            field=models.PositiveSmallIntegerField(default=1, verbose_name='Cada cuántas semanas/meses'),
+        ),
+        migrations.AddField(
+            model_name='eventos_calendario',
+            name='repetir_hasta',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='eventos_calendario',
+            index=models.Index(fields=['frecuencia', 'fecha_inicio'], name='evento_recurrente_idx'),
+        ),
+    ]
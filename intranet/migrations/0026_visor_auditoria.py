@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0025_fecha_hora_auditoria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logs_auditoria',
+            index=models.Index(fields=['id_usuario_actor', 'fecha_hora', 'id'], name='log_actor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logs_auditoria',
+            index=models.Index(fields=['accion', 'fecha_hora', 'id'], name='log_accion_fecha_idx'),
+        ),
+    ]
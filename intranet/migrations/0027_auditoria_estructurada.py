@@ -0,0 +1,86 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:02
+
+import django.core.serializers.json
+import django.db.models.deletion
+import re
+
+from django.db import migrations, models
+
+# Acciones históricas y su código estructurado
+CODIGOS_POR_ACCION = {
+    'Solicitud Auto-Aprobada (Director)': 'solicitud.auto_aprobada',
+    'Solicitud Pre-Aprobada': 'solicitud.pre_aprobada',
+    'Solicitud Aprobada': 'solicitud.aprobada',
+    'Solicitud Rechazada': 'solicitud.rechazada',
+    'Modificación de Días': 'dias.modificados',
+    'Creación de Usuario': 'usuario.creado',
+    'Edición de Usuario': 'usuario.editado',
+    'Cambio de Rol': 'usuario.rol_cambiado',
+    'Usuario Activado': 'usuario.activado',
+    'Usuario Desactivado': 'usuario.desactivado',
+    'Creación de Comunicado': 'comunicado.creado',
+    'Edición de Comunicado': 'comunicado.editado',
+    'Eliminación de Comunicado': 'comunicado.eliminado',
+}
+# Registros cuyo detalle incluye el id del objeto: (acciones, modelo, patrón)
+OBJETOS_EN_DETALLE = (
+    (('Solicitud Pre-Aprobada', 'Solicitud Aprobada', 'Solicitud Rechazada'), 'solicitudespermiso', r'Solicitud #(\d+)'),
+    (('Edición de Comunicado',), 'comunicados', r'comunicado ID (\d+)'),
+)
+
+
+def completar_registros_existentes(apps, schema_editor):
+    """Asigna código (y objeto, si el detalle lo nombra) a los registros anteriores."""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Logs_Auditoria = apps.get_model('intranet', 'Logs_Auditoria')
+
+    for accion, codigo in CODIGOS_POR_ACCION.items():
+        Logs_Auditoria.objects.filter(accion=accion).update(codigo=codigo)
+
+    for acciones, modelo, patron in OBJETOS_EN_DETALLE:
+        tipo, _ = ContentType.objects.get_or_create(app_label='intranet', model=modelo)
+        registros = Logs_Auditoria.objects.filter(accion__in=acciones).values_list('pk', 'detalle')
+        for pk, detalle in registros.iterator():
+            encontrado = re.search(patron, detalle or '')
+            if encontrado:
+                Logs_Auditoria.objects.filter(pk=pk).update(tipo_objeto=tipo, id_objeto=int(encontrado.group(1)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('intranet', '0026_visor_auditoria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logs_auditoria',
+            name='codigo',
+            field=models.CharField(blank=True, choices=[('solicitud.auto_aprobada', 'Solicitud auto-aprobada'), ('solicitud.pre_aprobada', 'Solicitud pre-aprobada'), ('solicitud.aprobada', 'Solicitud aprobada'), ('solicitud.rechazada', 'Solicitud rechazada'), ('dias.modificados', 'Días modificados'), ('usuario.creado', 'Usuario creado'), ('usuario.editado', 'Usuario editado'), ('usuario.rol_cambiado', 'Rol cambiado'), ('usuario.activado', 'Usuario activado'), ('usuario.desactivado', 'Usuario desactivado'), ('comunicado.creado', 'Comunicado creado'), ('comunicado.editado', 'Comunicado editado'), ('comunicado.eliminado', 'Comunicado eliminado')], default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='logs_auditoria',
+            name='datos',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.AddField(
+            model_name='logs_auditoria',
+            name='id_objeto',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='logs_auditoria',
+            name='tipo_objeto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='contenttypes.contenttype'),
+        ),
+        migrations.AddIndex(
+            model_name='logs_auditoria',
+            index=models.Index(fields=['codigo', 'fecha_hora', 'id'], name='log_codigo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logs_auditoria',
+            index=models.Index(fields=['tipo_objeto', 'id_objeto', 'fecha_hora', 'id'], name='log_objeto_fecha_idx'),
+        ),
+        migrations.RunPython(completar_registros_existentes, migrations.RunPython.noop),
+    ]
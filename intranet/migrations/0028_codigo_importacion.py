@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0027_auditoria_estructurada'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logs_auditoria',
+            name='codigo',
+            field=models.CharField(blank=True, choices=[('solicitud.auto_aprobada', 'Solicitud auto-aprobada'), ('solicitud.pre_aprobada', 'Solicitud pre-aprobada'), ('solicitud.aprobada', 'Solicitud aprobada'), ('solicitud.rechazada', 'Solicitud rechazada'), ('dias.modificados', 'Días modificados'), ('usuario.creado', 'Usuario creado'), ('usuario.importados', 'Usuarios importados'), ('usuario.editado', 'Usuario editado'), ('usuario.rol_cambiado', 'Rol cambiado'), ('usuario.activado', 'Usuario activado'), ('usuario.desactivado', 'Usuario desactivado'), ('comunicado.creado', 'Comunicado creado'), ('comunicado.editado', 'Comunicado editado'), ('comunicado.eliminado', 'Comunicado eliminado')], default='', max_length=50),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def descartar_pivotes(apps, schema_editor):
+    """Los meses guardados asignaban cada permiso completo a su mes de inicio; se recalculan al leerse."""
+    apps.get_model('intranet', 'ResumenAusenciasMes').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0030_codigo_traspaso_saldos'),
+    ]
+
+    operations = [
+        migrations.RunPython(descartar_pivotes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def reconstruir_solicitudes(apps, schema_editor):
+    """Los resúmenes guardados asignaban los días de cada solicitud a su mes de inicio; el próximo ciclo los rehace."""
+    apps.get_model('intranet', 'ResumenMensual').objects.filter(fuente='solicitudes').delete()
+    apps.get_model('intranet', 'MarcaResumen').objects.filter(fuente='solicitudes').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0031_recalcular_pivote_ausencias'),
+    ]
+
+    operations = [
+        migrations.RunPython(reconstruir_solicitudes, migrations.RunPython.noop),
+    ]
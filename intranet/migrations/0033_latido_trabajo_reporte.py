@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intranet', '0032_recalcular_resumen_solicitudes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
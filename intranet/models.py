@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 import os
 
@@ -52,6 +54,12 @@ class Funcionarios(AbstractUser):
     id_unidad = models.ForeignKey(Unidades, on_delete=models.SET_NULL, null=True, blank=True)
     # Indica si es jefe de su unidad (puede pre-aprobar solicitudes de su equipo)
     es_jefe_unidad = models.BooleanField(default=False, verbose_name="Es Jefe de Unidad")
+    # Token secreto de la suscripción .ics (sin sesión); se regenera para revocar el enlace
+    token_calendario = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+def anio_actual():
+    """Año en curso, usado como valor por defecto del saldo."""
+    return timezone.now().year
 
 # 3. Tabla: Dias_Administrativos (Saldos de permisos)
 class Dias_Administrativos(models.Model):
@@ -68,8 +76,8 @@ class Dias_Administrativos(models.Model):
     admin_restantes = models.IntegerField(default=6, verbose_name="Días administrativos")
     # Horas de compensación acumuladas (para trabajar horas extra)
     horas_compensacion = models.IntegerField(default=0, verbose_name="Horas compensación")
-    # Año del saldo (para resetear anualmente si se desea)
-    anio_saldo = models.IntegerField(default=2025, verbose_name="Año del saldo")
+    # Año del saldo (lo avanza el comando traspasar_saldos al cambiar de año)
+    anio_saldo = models.IntegerField(default=anio_actual, verbose_name="Año del saldo")
 
 # 4. Tabla: Documentos
 class Documentos(models.Model):
@@ -103,6 +111,13 @@ class Documentos(models.Model):
     # Campo legacy para compatibilidad (se puede eliminar después)
     roles_permitidos = models.ManyToManyField(Roles, blank=True, related_name='documentos_visibles')
 
+    class Meta:
+        indexes = [
+            # Repositorio: listado por fecha y filtro por categoría
+            models.Index(fields=['fecha_carga'], name='doc_fecha_carga_idx'),
+            models.Index(fields=['categoria', 'fecha_carga'], name='doc_categoria_idx'),
+        ]
+
     def get_extension(self):
         """Retorna la extensión del archivo (ej: .pdf, .docx)"""
         name, extension = os.path.splitext(self.ruta_archivo.name)
@@ -150,6 +165,13 @@ class Comunicados(models.Model):
         verbose_name="Unidad destino (vacío = todos)"
     )
     
+    class Meta:
+        indexes = [
+            # Dashboard: últimos comunicados (todos o por unidad destino)
+            models.Index(fields=['fecha_publicacion'], name='com_fecha_idx'),
+            models.Index(fields=['unidad_destino', 'fecha_publicacion'], name='com_unidad_fecha_idx'),
+        ]
+
     def es_global(self):
         """Retorna True si el comunicado es para toda la comunidad"""
         return self.unidad_destino is None
@@ -169,6 +191,17 @@ class Eventos_Calendario(models.Model):
     fecha_inicio = models.DateField() 
     fecha_fin = models.DateField(null=True, blank=True)
     tipo_evento = models.CharField(max_length=50, blank=True, null=True)
+    # Recurrencia: una sola fila por serie; las ocurrencias se expanden al consultar (ver calendario.py)
+    FRECUENCIAS = [
+        ('', 'No se repite'),
+        ('semanal', 'Semanal'),
+        ('mensual', 'Mensual'),
+    ]
+    frecuencia = models.CharField(max_length=10, choices=FRECUENCIAS, default='', blank=True)
+    intervalo = models.PositiveSmallIntegerField(default=1, verbose_name="Cada cuántas semanas/meses")
+    repetir_hasta = models.DateField(null=True, blank=True)
+    # Fechas (YYYY-MM-DD) de ocurrencias canceladas
+    excepciones = models.JSONField(default=list, blank=True)
 
     def __str__(self):
         return f"{self.titulo} ({self.fecha_inicio})"
@@ -177,6 +210,12 @@ class Eventos_Calendario(models.Model):
         # Esto es necesario porque tu tabla ya existe con guiones bajos en el nombre
         db_table = 'intranet_eventos_calendario' 
         verbose_name_plural = "Eventos del Calendario"
+        indexes = [
+            # Ventana de FullCalendar: fecha_fin >= inicio (o nula) y fecha_inicio < fin
+            models.Index(fields=['fecha_fin', 'fecha_inicio'], name='evento_ventana_idx'),
+            # Series recurrentes que ya comenzaron antes del fin de la ventana
+            models.Index(fields=['frecuencia', 'fecha_inicio'], name='evento_recurrente_idx'),
+        ]
 
 # [cite_start]7. Tabla: Logs_Auditoria (Soporta RF18) [cite: 237]
 # Almacena los cambios de roles y accesos
@@ -184,10 +223,47 @@ class Logs_Auditoria(models.Model):
     """
     Registro de auditoría para acciones críticas (ej: cambios de rol, eliminación de comunicados).
     """
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    # Por defecto (y no auto_now_add) para conservar la hora de la acción cuando
+    # el registro se inserta después, en lote (ver auditoria.py)
+    fecha_hora = models.DateTimeField(default=timezone.now)
     id_usuario_actor = models.ForeignKey(Funcionarios, on_delete=models.SET_NULL, null=True, blank=True)
+    CODIGOS = (
+        ('solicitud.auto_aprobada', 'Solicitud auto-aprobada'),
+        ('solicitud.pre_aprobada', 'Solicitud pre-aprobada'),
+        ('solicitud.aprobada', 'Solicitud aprobada'),
+        ('solicitud.rechazada', 'Solicitud rechazada'),
+        ('dias.modificados', 'Días modificados'),
+        ('saldos.traspasados', 'Saldos traspasados'),
+        ('usuario.creado', 'Usuario creado'),
+        ('usuario.importados', 'Usuarios importados'),
+        ('usuario.editado', 'Usuario editado'),
+        ('usuario.rol_cambiado', 'Rol cambiado'),
+        ('usuario.activado', 'Usuario activado'),
+        ('usuario.desactivado', 'Usuario desactivado'),
+        ('comunicado.creado', 'Comunicado creado'),
+        ('comunicado.editado', 'Comunicado editado'),
+        ('comunicado.eliminado', 'Comunicado eliminado'),
+    )
+
     accion = models.CharField(max_length=255)
     detalle = models.TextField(blank=True, null=True)
+    # Datos estructurados: código de la acción, objeto afectado y valores relevantes
+    codigo = models.CharField(max_length=50, choices=CODIGOS, blank=True, default='')
+    tipo_objeto = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True, blank=True)
+    id_objeto = models.PositiveBigIntegerField(null=True, blank=True)
+    datos = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            # Visor de auditoría ordenado por fecha
+            models.Index(fields=['fecha_hora'], name='log_fecha_hora_idx'),
+            # Visor filtrado por actor o acción, paginado por cursor (fecha_hora, id)
+            models.Index(fields=['id_usuario_actor', 'fecha_hora', 'id'], name='log_actor_fecha_idx'),
+            models.Index(fields=['accion', 'fecha_hora', 'id'], name='log_accion_fecha_idx'),
+            models.Index(fields=['codigo', 'fecha_hora', 'id'], name='log_codigo_fecha_idx'),
+            # Historial de un objeto (auditoria.historial_de)
+            models.Index(fields=['tipo_objeto', 'id_objeto', 'fecha_hora', 'id'], name='log_objeto_fecha_idx'),
+        ]
 
 # --- MODELO BASADO EN EL "DOCUMENTO MAESTRO" (Requisito Extra) ---
 
@@ -205,6 +281,17 @@ class Licencias(models.Model):
     fecha_fin = models.DateField()
     ruta_foto_licencia = models.FileField(upload_to='licencias/')
     fecha_registro = models.DateTimeField(auto_now_add=True)
+    # Marca de agua de los resúmenes mensuales (ver resumenes.py)
+    fecha_modificacion = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Búsqueda de solapamientos por funcionario y rango de fechas
+            models.Index(fields=['id_funcionario', 'fecha_inicio', 'fecha_fin'], name='lic_func_rango_idx'),
+            # Licencias activas en una fecha y reporte por fecha de registro
+            models.Index(fields=['fecha_inicio', 'fecha_fin'], name='lic_rango_idx'),
+            models.Index(fields=['fecha_registro'], name='lic_fecha_registro_idx'),
+        ]
 
 class SolicitudesPermiso(models.Model):
     """
@@ -257,9 +344,160 @@ class SolicitudesPermiso(models.Model):
     )
     fecha_aprobacion = models.DateTimeField(null=True, blank=True)
     comentario_rechazo = models.TextField(blank=True, null=True)
+    # Bandeja que debe actuar ahora: 'jefe:<id_unidad>', 'subdireccion', 'director'
+    # o vacío si la solicitud ya fue resuelta (ver flujo_solicitudes.py)
+    aprobador_actual = models.CharField(max_length=50, blank=True, default='', db_index=True)
+    # Marca de agua de los resúmenes mensuales (ver resumenes.py)
+    fecha_modificacion = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"Solicitud de {self.id_funcionario_solicitante.username} ({self.estado})"
 
     class Meta:
-        verbose_name_plural = "Solicitudes de Permiso"
\ No newline at end of file
+        verbose_name_plural = "Solicitudes de Permiso"
+        indexes = [
+            # Búsqueda de solapamientos por funcionario y rango de fechas
+            models.Index(fields=['id_funcionario_solicitante', 'fecha_inicio', 'fecha_fin'], name='sol_func_rango_idx'),
+            # Listados por estado y por solicitante, ordenados por fecha de solicitud
+            models.Index(fields=['estado', 'fecha_solicitud'], name='sol_estado_fecha_idx'),
+            models.Index(fields=['id_funcionario_solicitante', 'fecha_solicitud'], name='sol_func_fecha_idx'),
+            models.Index(fields=['fecha_solicitud'], name='sol_fecha_idx'),
+            # Analítica de ausencias: aprobadas por mes de inicio
+            models.Index(fields=['estado', 'fecha_inicio'], name='sol_estado_inicio_idx'),
+        ]
+
+
+class BandejaAprobacion(models.Model):
+    """
+    Bandeja de aprobación: una fila por cada solicitud abierta con la bandeja
+    que debe actuar sobre ella. Se mantiene sincronizada con
+    SolicitudesPermiso.aprobador_actual (ver signals.py), así las bandejas,
+    contadores y avisos de pendientes leen una tabla pequeña por índice.
+    """
+    bandeja = models.CharField(max_length=50)
+    solicitud = models.OneToOneField(SolicitudesPermiso, on_delete=models.CASCADE, related_name='entrada_bandeja')
+    fecha_ruteo = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.bandeja}: solicitud #{self.solicitud_id}"
+
+    class Meta:
+        verbose_name_plural = "Bandeja de Aprobación"
+        indexes = [
+            models.Index(fields=['bandeja', 'fecha_ruteo'], name='bandeja_ruteo_idx'),
+        ]
+
+
+class TrabajoReporte(models.Model):
+    """
+    Reporte o exportación generado en segundo plano.
+    La vista solo encola el trabajo; el comando procesar_reportes genera el
+    archivo, lo guarda con fecha de expiración y el usuario lo descarga
+    desde 'Mis Reportes'. La huella (tipo + parámetros) permite reutilizar
+    un archivo vigente en vez de volver a generarlo.
+    """
+    ESTADOS = [
+        ('Pendiente', 'Pendiente'),
+        ('En Proceso', 'En Proceso'),
+        ('Terminado', 'Terminado'),
+        ('Error', 'Error'),
+        ('Expirado', 'Expirado'),
+    ]
+    usuario = models.ForeignKey(Funcionarios, on_delete=models.CASCADE, related_name='trabajos_reporte')
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    huella = models.CharField(max_length=64)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='Pendiente')
+    archivo = models.FileField(upload_to='reportes/', blank=True)
+    error = models.TextField(blank=True, default='')
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    # Lo renueva el worker mientras genera el archivo (ver trabajos.INTERVALO_LATIDO)
+    latido = models.DateTimeField(null=True, blank=True)
+    fecha_termino = models.DateTimeField(null=True, blank=True)
+    expira = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.tipo} ({self.estado}) - {self.usuario}"
+
+    class Meta:
+        verbose_name_plural = "Trabajos de Reporte"
+        indexes = [
+            # Cola del worker: pendientes por orden de llegada
+            models.Index(fields=['estado', 'fecha_creacion'], name='trabajo_cola_idx'),
+            # Reutilización de reportes idénticos del mismo usuario
+            models.Index(fields=['usuario', 'huella'], name='trabajo_huella_idx'),
+        ]
+
+
+class ResumenAusenciasMes(models.Model):
+    """
+    Pivote de ausencias aprobadas (unidad x tipo) de un mes ya cerrado.
+    Se calcula una sola vez y se reutiliza; si llega una ausencia retroactiva
+    que toca el mes, la fila se elimina y se recalcula en la próxima consulta
+    (ver estadisticas.py y signals.py).
+    """
+    mes = models.DateField(unique=True)  # Primer día del mes
+    datos = models.JSONField(default=list)
+    fecha_calculo = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Resumen de ausencias {self.mes:%Y-%m}"
+
+    class Meta:
+        verbose_name_plural = "Resúmenes de Ausencias"
+
+
+class ResumenMensual(models.Model):
+    """
+    Resumen mensual de volúmenes históricos: cantidad de registros y días por
+    fuente (solicitudes, licencias, logs), mes, unidad, tipo y estado.
+    Lo llena de forma incremental el comando actualizar_resumenes; los reportes
+    históricos y comparaciones interanuales leen esta tabla en vez del historial.
+    """
+    FUENTES = [
+        ('solicitudes', 'Solicitudes de Permiso'),
+        ('licencias', 'Licencias Médicas'),
+        ('logs', 'Logs de Auditoría'),
+    ]
+    fuente = models.CharField(max_length=20, choices=FUENTES)
+    mes = models.DateField()  # Primer día del mes
+    id_unidad = models.ForeignKey(Unidades, on_delete=models.SET_NULL, null=True, blank=True)
+    tipo = models.CharField(max_length=255, blank=True, default='')
+    estado = models.CharField(max_length=50, blank=True, default='')
+    cantidad = models.IntegerField(default=0)
+    dias = models.IntegerField(default=0)
+    # Un registro del mes fue eliminado: el comando recalcula el mes completo
+    recalcular = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.fuente} {self.mes:%Y-%m} {self.tipo} {self.estado}: {self.cantidad}"
+
+    class Meta:
+        verbose_name_plural = "Resúmenes Mensuales"
+        indexes = [
+            models.Index(fields=['fuente', 'mes'], name='resumen_fuente_mes_idx'),
+        ]
+
+
+class MarcaResumen(models.Model):
+    """Última ejecución de actualizar_resumenes por fuente (marca de agua incremental)."""
+    fuente = models.CharField(max_length=20, unique=True)
+    marca = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.fuente}: {self.marca}"
+
+
+class VersionDatos(models.Model):
+    """
+    Versión de un conjunto de datos con cachés derivadas (calendario, ausencias,
+    feriados, permisos publicados de un funcionario). Vive en la base y no en la
+    caché para que todos los procesos del servidor vean el mismo valor.
+    """
+    clave = models.CharField(max_length=100, primary_key=True)
+    # Nanosegundos del último cambio (nunca retrocede, ver versiones.renovar_version)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.clave}: {self.version}"
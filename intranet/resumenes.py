@@ -0,0 +1,214 @@
+"""
+Resúmenes mensuales para reportes históricos.
+
+El comando 'actualizar_resumenes' llena ResumenMensual de forma incremental:
+1. Por cada fuente lee solo los registros modificados desde su última marca
+   de agua (MarcaResumen), con un margen de solape para transacciones largas.
+2. Obtiene los meses que esos registros tocan y los recalcula completos con
+   una consulta agrupada por mes; recalcular es idempotente, por lo que el
+   solape solo cuesta tiempo.
+3. Los meses marcados con 'recalcular' (un registro fue eliminado) también
+   se recalculan.
+
+Dimensiones por fuente:
+- solicitudes: cada mes que abarca la solicitud, unidad, tipo de permiso y
+  estado. 'cantidad' cuenta las solicitudes en su mes de inicio; 'dias' son los
+  días hábiles dentro de cada mes, como en el pivote de ausencias (las
+  solicitudes de licencia no suman días: se cuentan en la fuente licencias).
+  Un feriado nuevo o modificado marca sus meses para recalcular.
+- licencias: cada mes que abarca la licencia, unidad; días corridos dentro del mes.
+- logs: mes del registro, unidad del actor y acción.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .dias_habiles import obtener_feriados
+from .estadisticas import TIPO_LICENCIA, dias_duracion, dias_habiles_recortados, expresion_dias, limites_mes, meses_entre
+from .models import Licencias, Logs_Auditoria, MarcaResumen, ResumenMensual, SolicitudesPermiso
+
+# Margen para no perder registros de transacciones que confirman después de la marca
+SOLAPE = timedelta(minutes=10)
+
+
+def _desde(registros, campo, desde):
+    # Sin marca previa se procesa todo el historial
+    return registros if desde is None else registros.filter(**{f'{campo}__gt': desde})
+
+
+def _meses_por_inicio(registros, campo):
+    return set(
+        registros.annotate(mes_resumen=TruncMonth(campo)).order_by()
+        .values_list('mes_resumen', flat=True).distinct()
+    )
+
+
+def _como_mes(valor):
+    # TruncMonth sobre DateTimeField entrega datetime
+    return valor.date() if hasattr(valor, 'date') else valor
+
+
+def _meses_abarcados(registros):
+    meses = set()
+    for inicio, fin in registros.values_list('fecha_inicio', 'fecha_fin'):
+        meses.update(meses_entre(inicio, fin))
+    return meses
+
+
+def _meses_solicitudes(desde):
+    return _meses_abarcados(_desde(SolicitudesPermiso.objects.all(), 'fecha_modificacion', desde))
+
+
+def _meses_licencias(desde):
+    return _meses_abarcados(_desde(Licencias.objects.all(), 'fecha_modificacion', desde))
+
+
+def _meses_logs(desde):
+    registros = _desde(Logs_Auditoria.objects.all(), 'fecha_hora', desde)
+    return {_como_mes(mes) for mes in _meses_por_inicio(registros, 'fecha_hora')}
+
+
+def _filas_solicitudes(mes):
+    # Los días hábiles dependen de los feriados: se recortan y cuentan por solicitud
+    inicio, fin = limites_mes(mes)
+    feriados = obtener_feriados()
+    filas = {}
+    for unidad, tipo, estado, desde, hasta in (
+        SolicitudesPermiso.objects.filter(fecha_inicio__lte=fin, fecha_fin__gte=inicio)
+        .values_list('id_funcionario_solicitante__id_unidad', 'tipo_permiso', 'estado', 'fecha_inicio', 'fecha_fin')
+    ):
+        fila = filas.setdefault((unidad, tipo, estado), [0, 0])
+        if desde >= inicio:
+            fila[0] += 1
+        if tipo != TIPO_LICENCIA:
+            fila[1] += dias_habiles_recortados(desde, hasta, inicio, fin, feriados)
+    for (unidad, tipo, estado), (cantidad, dias) in filas.items():
+        yield unidad, tipo, estado, cantidad, dias
+
+
+def _filas_licencias(mes):
+    inicio, fin = limites_mes(mes)
+    for fila in (
+        Licencias.objects.filter(fecha_inicio__lte=fin, fecha_fin__gte=inicio)
+        .values(unidad=F('id_funcionario__id_unidad'))
+        .annotate(total=Count('pk'), duracion=Sum(expresion_dias(desde=inicio, hasta=fin)))
+        .order_by()
+    ):
+        yield fila['unidad'], '', '', fila['total'], dias_duracion(fila['duracion'])
+
+
+def _filas_logs(mes):
+    # Rango de fecha-hora local para aprovechar el índice de fecha_hora
+    inicio = timezone.make_aware(datetime.combine(mes, time.min))
+    fin = timezone.make_aware(datetime.combine(limites_mes(mes)[1] + timedelta(days=1), time.min))
+    for fila in (
+        Logs_Auditoria.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin)
+        .values(unidad=F('id_usuario_actor__id_unidad'), tipo=F('accion'))
+        .annotate(total=Count('pk'))
+        .order_by()
+    ):
+        yield fila['unidad'], fila['tipo'][:255], '', fila['total'], 0
+
+
+# fuente: (meses tocados desde una marca, filas agregadas de un mes)
+FUENTES_RESUMEN = {
+    'solicitudes': (_meses_solicitudes, _filas_solicitudes),
+    'licencias': (_meses_licencias, _filas_licencias),
+    'logs': (_meses_logs, _filas_logs),
+}
+
+
+@transaction.atomic
+def recalcular_mes(fuente, mes):
+    """Reemplaza el resumen de un mes de la fuente por su recálculo completo."""
+    _, filas = FUENTES_RESUMEN[fuente]
+    ResumenMensual.objects.filter(fuente=fuente, mes=mes).delete()
+    ResumenMensual.objects.bulk_create([
+        ResumenMensual(fuente=fuente, mes=mes, id_unidad_id=unidad, tipo=tipo or '', estado=estado or '',
+                       cantidad=cantidad, dias=dias)
+        for unidad, tipo, estado, cantidad, dias in filas(mes)
+    ])
+
+
+def actualizar_fuente(fuente):
+    """
+    Procesa los cambios de la fuente desde su última marca.
+
+    Returns:
+        list: meses recalculados (ordenados).
+    """
+    meses_tocados, _ = FUENTES_RESUMEN[fuente]
+    ahora = timezone.now()
+    marca = MarcaResumen.objects.filter(fuente=fuente).first()
+
+    meses = meses_tocados(None if marca is None else marca.marca - SOLAPE)
+    meses |= set(
+        ResumenMensual.objects.filter(fuente=fuente, recalcular=True).values_list('mes', flat=True).distinct()
+    )
+
+    for mes in sorted(meses):
+        recalcular_mes(fuente, mes)
+    MarcaResumen.objects.update_or_create(fuente=fuente, defaults={'marca': ahora})
+    return sorted(meses)
+
+
+def marcar_para_recalcular(fuente, fecha_inicio, fecha_fin):
+    """Marca los meses de un registro eliminado para que el próximo ciclo los recalcule."""
+    ResumenMensual.objects.filter(
+        fuente=fuente, mes__range=(fecha_inicio.replace(day=1), fecha_fin)
+    ).update(recalcular=True)
+
+
+def historial_mensual(fuente, anio, **filtros):
+    """
+    Cantidad y días por mes de un año leídos desde los resúmenes.
+
+    Args:
+        filtros: condiciones adicionales sobre ResumenMensual (ej. estado='Aprobado').
+
+    Returns:
+        list: 12 dicts {'cantidad', 'dias'} (enero a diciembre).
+    """
+    meses = [{'cantidad': 0, 'dias': 0} for _ in range(12)]
+    for mes, cantidad, dias in (
+        ResumenMensual.objects.filter(fuente=fuente, mes__year=anio, **filtros)
+        .values('mes').annotate(total=Sum('cantidad'), suma_dias=Sum('dias'))
+        .values_list('mes', 'total', 'suma_dias')
+    ):
+        meses[mes.month - 1] = {'cantidad': cantidad, 'dias': dias}
+    return meses
+
+
+def comparacion_interanual(anio):
+    """
+    Volúmenes mensuales del año contra el anterior, leídos solo desde los resúmenes.
+
+    Returns:
+        dict: 'meses' (12 filas con cada métrica para el año y el anterior),
+        'totales' y 'actualizado' (última marca de agua, o None si nunca se ejecutó).
+    """
+    metricas = {
+        'solicitudes_aprobadas': ('solicitudes', 'cantidad', {'estado': 'Aprobado'}),
+        'dias_permiso': ('solicitudes', 'dias', {'estado': 'Aprobado'}),
+        'dias_licencia': ('licencias', 'dias', {}),
+        'registros_auditoria': ('logs', 'cantidad', {}),
+    }
+    series = {}
+    for nombre, (fuente, campo, filtros) in metricas.items():
+        for clave, valor_anio in (('actual', anio), ('anterior', anio - 1)):
+            series[(nombre, clave)] = [mes[campo] for mes in historial_mensual(fuente, valor_anio, **filtros)]
+
+    meses = [
+        {nombre: {'actual': series[(nombre, 'actual')][i], 'anterior': series[(nombre, 'anterior')][i]}
+         for nombre in metricas}
+        for i in range(12)
+    ]
+    totales = {
+        nombre: {'actual': sum(series[(nombre, 'actual')]), 'anterior': sum(series[(nombre, 'anterior')])}
+        for nombre in metricas
+    }
+    marcas = MarcaResumen.objects.order_by('marca').values_list('marca', flat=True)
+    return {'meses': meses, 'totales': totales, 'actualizado': marcas.first()}
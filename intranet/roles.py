@@ -0,0 +1,34 @@
+"""
+Funciones de ayuda para verificar roles (se usan para proteger vistas y
+para decidir el flujo de aprobación de solicitudes).
+"""
+
+def es_director(user):
+    """Verifica si el usuario es Director General (máximo nivel)."""
+    return user.is_superuser or (user.id_rol and user.id_rol.nombre_rol == 'Director General')
+
+def es_subdireccion(user):
+    """Verifica si el usuario es Subdirección o superior (nivel <= 2)."""
+    if user.is_superuser:
+        return True
+    if user.id_rol:
+        return user.id_rol.nivel_jerarquico <= 2  # Director o Subdirección
+    return False
+
+def es_jefe_unidad(user):
+    """Verifica si el usuario es Jefe de Unidad."""
+    return user.es_jefe_unidad
+
+def es_admin(user):
+    """Verifica si el usuario es superusuario (Director General)."""
+    return user.is_superuser
+
+def puede_gestionar(user):
+    """Verifica si el usuario puede gestionar solicitudes (Jefe, Subdirección o Director)."""
+    if user.is_superuser:
+        return True
+    if user.is_staff:
+        return True
+    if user.id_rol:
+        return user.id_rol.nivel_jerarquico <= 3 or user.es_jefe_unidad
+    return user.es_jefe_unidad
@@ -0,0 +1,91 @@
+"""
+Edición en bloque de los saldos de días (grilla de gestion_dias_view).
+
+La grilla se arma con una sola consulta que une cada funcionario con su
+saldo, unidad y rol (antes eran tres consultas por fila). Cada fila usa un
+DiasAdministrativosForm con el id del funcionario como prefijo; el navegador
+envía solo las filas modificadas y:
+
+1. Se validan todas las filas enviadas; si alguna tiene errores no se guarda nada.
+2. Los saldos cambiados se guardan con bulk_update (y bulk_create para los
+   funcionarios que aún no tenían saldo) en una sola transacción.
+3. Se escribe un único registro de auditoría con los cambios del lote.
+"""
+from django.db import transaction
+
+from .auditoria import registrar_auditoria
+from .forms import DiasAdministrativosForm
+from .models import Dias_Administrativos
+
+CAMPOS_SALDO = ('admin_restantes', 'vacaciones_restantes')
+TAMANO_LOTE_SALDOS = 500
+
+
+def funcionarios_con_saldo(funcionarios):
+    """Funcionarios con su saldo, unidad y rol cargados en la misma consulta."""
+    return funcionarios.select_related('dias_administrativos', 'id_unidad', 'id_rol').only(
+        'username', 'first_name', 'last_name', 'id_unidad__nombre_unidad', 'id_rol__nombre_rol',
+        *(f'dias_administrativos__{campo}' for campo in CAMPOS_SALDO),
+    ).order_by('username')
+
+
+def saldo_de(funcionario):
+    """Saldo del funcionario; si aún no tiene, uno nuevo (sin guardar) con los valores por defecto."""
+    try:
+        return funcionario.dias_administrativos
+    except Dias_Administrativos.DoesNotExist:
+        return Dias_Administrativos(id_funcionario=funcionario)
+
+
+def filas_saldos(funcionarios, data=None):
+    """
+    Filas (funcionario, formulario) de la grilla.
+
+    Solo se ligan a data los formularios de las filas enviadas; el resto queda
+    sin ligar y se ignora al guardar.
+    """
+    filas = []
+    for funcionario in funcionarios:
+        prefijo = str(funcionario.pk)
+        enviada = data is not None and f'{prefijo}-{CAMPOS_SALDO[0]}' in data
+        filas.append((funcionario, DiasAdministrativosForm(
+            data if enviada else None, instance=saldo_de(funcionario), prefix=prefijo,
+        )))
+    return filas
+
+
+def guardar_saldos(actor, filas):
+    """
+    Aplica los cambios de las filas enviadas (todas deben ser válidas).
+
+    Returns:
+        list: funcionarios cuyo saldo cambió.
+    """
+    cambiados = [
+        (funcionario, formulario, formulario.save(commit=False))
+        for funcionario, formulario in filas
+        if formulario.is_bound and formulario.has_changed()
+    ]
+    if not cambiados:
+        return []
+
+    # Se separan antes de insertar: bulk_create marca los nuevos como guardados
+    nuevos = [saldo for _, _, saldo in cambiados if saldo._state.adding]
+    existentes = [saldo for _, _, saldo in cambiados if not saldo._state.adding]
+    with transaction.atomic():
+        Dias_Administrativos.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE_SALDOS)
+        Dias_Administrativos.objects.bulk_update(existentes, CAMPOS_SALDO, batch_size=TAMANO_LOTE_SALDOS)
+        nombres = [funcionario.username for funcionario, _, _ in cambiados]
+        registrar_auditoria(
+            actor,
+            'Modificación de Días',
+            f"Se modificaron los días de {len(cambiados)} funcionario(s): {', '.join(nombres)}",
+            codigo='dias.modificados',
+            # Con un solo funcionario el registro aparece también en su historial
+            objeto=cambiados[0][0] if len(cambiados) == 1 else None,
+            datos={'cambios': {
+                funcionario.username: {campo: formulario.cleaned_data[campo] for campo in formulario.changed_data}
+                for funcionario, formulario, _ in cambiados
+            }},
+        )
+    return [funcionario for funcionario, _, _ in cambiados]
@@ -0,0 +1,140 @@
+"""
+Señales de la aplicación intranet.
+Mantienen sincronizadas las cachés derivadas de los modelos.
+"""
+from django.db.models import DateField
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Eventos_Calendario, Funcionarios, SolicitudesPermiso, Licencias
+from .calendario import invalidar_ausencias, invalidar_calendario
+from .dias_habiles import TIPO_FERIADO, invalidar_feriados
+from .ical import invalidar_permisos_usuario
+from .estadisticas import invalidar_pivote
+from .resumenes import marcar_para_recalcular
+from .flujo_solicitudes import rerutear_unidades, sincronizar_bandeja
+
+# Campos de Funcionarios que deciden a qué bandeja va una solicitud
+CAMPOS_JEFATURA = ('es_jefe_unidad', 'id_unidad_id', 'is_active')
+
+
+def _dias_habiles_modificados(fecha_inicio, fecha_fin):
+    """Descarta los pivotes y marca los resúmenes de solicitudes de los meses de un feriado."""
+    # Las vistas pueden guardar las fechas tal como llegan del formulario
+    fecha_inicio = DateField().to_python(fecha_inicio)
+    fecha_fin = DateField().to_python(fecha_fin) or fecha_inicio
+    invalidar_pivote(fecha_inicio, fecha_fin)
+    marcar_para_recalcular('solicitudes', fecha_inicio, fecha_fin)
+
+
+@receiver(pre_save, sender=Eventos_Calendario)
+def evento_calendario_por_modificar(sender, instance, raw=False, **kwargs):
+    """Un feriado que cambia de fecha o deja de serlo también cambia los días hábiles de su periodo anterior."""
+    if raw or instance.pk is None:
+        return
+    anterior = sender.objects.filter(pk=instance.pk, tipo_evento=TIPO_FERIADO).values('fecha_inicio', 'fecha_fin').first()
+    if anterior is not None:
+        _dias_habiles_modificados(anterior['fecha_inicio'], anterior['fecha_fin'])
+
+
+@receiver(post_save, sender=Eventos_Calendario)
+@receiver(post_delete, sender=Eventos_Calendario)
+def evento_calendario_modificado(sender, instance, **kwargs):
+    """
+    Cualquier cambio en el calendario puede agregar o quitar feriados y cambia el feed.
+    Los pivotes y resúmenes de solicitudes cuentan días hábiles: se
+    recalculan los meses del feriado.
+    """
+    invalidar_feriados()
+    invalidar_calendario()
+    if instance.tipo_evento == TIPO_FERIADO:
+        _dias_habiles_modificados(instance.fecha_inicio, instance.fecha_fin)
+
+
+@receiver(pre_save, sender=SolicitudesPermiso)
+@receiver(pre_save, sender=Licencias)
+def ausencia_por_modificar(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Los receptores de post_save solo ven el periodo nuevo: si cambian las
+    fechas (o una solicitud deja de estar aprobada) también se descartan los
+    pivotes y se marcan los resúmenes de los meses del periodo anterior.
+    """
+    campos = {'fecha_inicio', 'fecha_fin', 'estado'}
+    if raw or instance.pk is None or (update_fields is not None and not campos & set(update_fields)):
+        return
+    es_solicitud = sender is SolicitudesPermiso
+    anterior = sender.objects.filter(pk=instance.pk).values(
+        'fecha_inicio', 'fecha_fin', *(['estado'] if es_solicitud else [])
+    ).first()
+    if anterior is None:
+        return
+    fechas_cambiaron = (
+        anterior['fecha_inicio'] != DateField().to_python(instance.fecha_inicio)
+        or anterior['fecha_fin'] != DateField().to_python(instance.fecha_fin)
+    )
+    if fechas_cambiaron:
+        marcar_para_recalcular(
+            'solicitudes' if es_solicitud else 'licencias', anterior['fecha_inicio'], anterior['fecha_fin']
+        )
+    # El pivote solo cuenta solicitudes aprobadas
+    contaba = not es_solicitud or anterior['estado'] == 'Aprobado'
+    if contaba and (fechas_cambiaron or (es_solicitud and instance.estado != 'Aprobado')):
+        invalidar_pivote(anterior['fecha_inicio'], anterior['fecha_fin'])
+
+
+@receiver(post_save, sender=SolicitudesPermiso)
+def solicitud_guardada(sender, instance, **kwargs):
+    """Mantiene la bandeja de aprobación al día con cada cambio de estado."""
+    sincronizar_bandeja(instance)
+    # Una solicitud puede entrar o salir de la capa de ausencias del calendario
+    invalidar_ausencias()
+    invalidar_permisos_usuario(instance.id_funcionario_solicitante_id)
+    if instance.estado == 'Aprobado':
+        invalidar_pivote(instance.fecha_inicio, instance.fecha_fin)
+
+
+@receiver(post_delete, sender=SolicitudesPermiso)
+@receiver(post_save, sender=Licencias)
+@receiver(post_delete, sender=Licencias)
+def ausencia_modificada(sender, instance, **kwargs):
+    """Una ausencia retroactiva cambia el pivote de los meses que toca y el calendario."""
+    invalidar_pivote(instance.fecha_inicio, instance.fecha_fin)
+    invalidar_ausencias()
+    if sender is SolicitudesPermiso:
+        invalidar_permisos_usuario(instance.id_funcionario_solicitante_id)
+
+
+@receiver(post_delete, sender=SolicitudesPermiso)
+@receiver(post_delete, sender=Licencias)
+def ausencia_eliminada(sender, instance, **kwargs):
+    """La marca de agua no ve eliminaciones: se marca el mes para recalcularlo."""
+    fuente = 'licencias' if sender is Licencias else 'solicitudes'
+    marcar_para_recalcular(fuente, instance.fecha_inicio, instance.fecha_fin)
+
+
+@receiver(pre_save, sender=Funcionarios)
+def funcionario_por_modificar(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Guarda la jefatura anterior para que post_save sepa si hay que rerutear."""
+    instance._jefatura_anterior = None
+    campos = {'es_jefe_unidad', 'id_unidad', 'is_active'}
+    if raw or instance.pk is None or (update_fields is not None and not campos & set(update_fields)):
+        return
+    instance._jefatura_anterior = sender.objects.filter(pk=instance.pk).values(*CAMPOS_JEFATURA).first()
+
+
+@receiver(post_save, sender=Funcionarios)
+def funcionario_guardado(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Si cambia la jefatura de una unidad, las solicitudes pendientes de la
+    unidad anterior y de la actual vuelven a calcular su bandeja (una unidad
+    que se queda sin jefe manda sus pendientes a Subdirección).
+    """
+    anterior = getattr(instance, '_jefatura_anterior', None)
+    if raw or created or anterior is None:
+        return
+    actual = {campo: getattr(instance, campo) for campo in CAMPOS_JEFATURA}
+    if actual == anterior:
+        return
+    # Solo la jefatura de una unidad cambia el ruteo de sus demás funcionarios
+    unidades = {datos['id_unidad_id'] for datos in (anterior, actual) if datos['es_jefe_unidad']}
+    rerutear_unidades(unidades, funcionario_id=instance.pk)
@@ -0,0 +1,104 @@
+"""
+Detección de solapamiento de permisos y licencias.
+
+Dos intervalos [a_inicio, a_fin] y [b_inicio, b_fin] se solapan si
+a_inicio <= b_fin y b_inicio <= a_fin. Las consultas por funcionario se
+apoyan en los índices compuestos (funcionario, fecha_inicio, fecha_fin)
+de SolicitudesPermiso y Licencias, por lo que no recorren el historial
+completo de la persona.
+
+Una solicitud de licencia aprobada se copia a Licencias con las mismas fechas
+(ver flujo_solicitudes.aplicar_transicion), así que del lado de las
+solicitudes se omite para no reportarla solapada con su propia licencia.
+"""
+import heapq
+
+from .estadisticas import TIPO_LICENCIA
+from .models import SolicitudesPermiso, Licencias
+
+# Estados que ocupan días en el calendario del funcionario
+ESTADOS_ACTIVOS = ('Pendiente', 'Pre-Aprobado', 'Aprobado')
+
+
+def buscar_solapamientos(funcionario, fecha_inicio, fecha_fin, excluir_solicitud=None, estados=ESTADOS_ACTIVOS):
+    """
+    Retorna los registros del funcionario que se solapan con el rango dado.
+
+    Args:
+        funcionario: Funcionario (o su pk) dueño del rango.
+        fecha_inicio, fecha_fin (date): Rango a verificar (inclusive).
+        excluir_solicitud: Solicitud que no debe compararse consigo misma.
+        estados: Estados de solicitud que se consideran ocupados.
+
+    Returns:
+        tuple: (solicitudes, licencias) que se solapan con el rango.
+    """
+    solicitudes = SolicitudesPermiso.objects.filter(
+        id_funcionario_solicitante=funcionario,
+        fecha_inicio__lte=fecha_fin,
+        fecha_fin__gte=fecha_inicio,
+        estado__in=estados,
+    ).exclude(estado='Aprobado', tipo_permiso=TIPO_LICENCIA)
+    if excluir_solicitud is not None:
+        solicitudes = solicitudes.exclude(pk=excluir_solicitud.pk)
+
+    licencias = Licencias.objects.filter(
+        id_funcionario=funcionario,
+        fecha_inicio__lte=fecha_fin,
+        fecha_fin__gte=fecha_inicio,
+    )
+    return list(solicitudes.order_by('fecha_inicio')), list(licencias.order_by('fecha_inicio'))
+
+
+def describir_solapamientos(solicitudes, licencias):
+    """Arma un mensaje legible con los registros que generan conflicto."""
+    partes = [
+        f"{sol.get_tipo_permiso_display()} ({sol.estado}) del {sol.fecha_inicio:%d/%m/%Y} al {sol.fecha_fin:%d/%m/%Y}"
+        for sol in solicitudes
+    ]
+    partes += [
+        f"Licencia médica del {lic.fecha_inicio:%d/%m/%Y} al {lic.fecha_fin:%d/%m/%Y}"
+        for lic in licencias
+    ]
+    return '; '.join(partes)
+
+
+def detectar_todos_los_solapamientos(estados=ESTADOS_ACTIVOS):
+    """
+    Encuentra todos los pares solapados del sistema en una sola pasada.
+
+    Ambas fuentes se leen ordenadas por (funcionario, fecha_inicio), se
+    mezclan con heapq.merge y se barren manteniendo solo los intervalos
+    aún abiertos del funcionario actual.
+
+    Yields:
+        tuple: (intervalo_a, intervalo_b), cada uno como
+        (funcionario_id, fecha_inicio, fecha_fin, origen, pk).
+    """
+    solicitudes = SolicitudesPermiso.objects.filter(estado__in=estados).exclude(
+        estado='Aprobado', tipo_permiso=TIPO_LICENCIA
+    ).order_by(
+        'id_funcionario_solicitante', 'fecha_inicio', 'pk'
+    ).values_list('id_funcionario_solicitante', 'fecha_inicio', 'fecha_fin', 'pk')
+    licencias = Licencias.objects.order_by(
+        'id_funcionario', 'fecha_inicio', 'pk'
+    ).values_list('id_funcionario', 'fecha_inicio', 'fecha_fin', 'pk')
+
+    intervalos = heapq.merge(
+        ((f, ini, fin, 'solicitud', pk) for f, ini, fin, pk in solicitudes.iterator()),
+        ((f, ini, fin, 'licencia', pk) for f, ini, fin, pk in licencias.iterator()),
+        key=lambda intervalo: (intervalo[0], intervalo[1]),
+    )
+
+    funcionario_actual = None
+    abiertos = []
+    for intervalo in intervalos:
+        funcionario_id, inicio = intervalo[0], intervalo[1]
+        if funcionario_id != funcionario_actual:
+            funcionario_actual = funcionario_id
+            abiertos = []
+        # Descartar los que terminaron antes de que empiece el actual
+        abiertos = [abierto for abierto in abiertos if abierto[2] >= inicio]
+        for abierto in abiertos:
+            yield abierto, intervalo
+        abiertos.append(intervalo)
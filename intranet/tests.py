@@ -15,13 +15,14 @@ Autor: Sistema de Pruebas Automatizado
 ===================================================================================
 """
 
-from django.test import TestCase, Client, override_settings
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from django.core.cache import cache
 from datetime import datetime, date, timedelta
 import re
 import json
@@ -1423,6 +1424,1647 @@ class PruebasSeguridadTestCase(TestCase):
         print("  - Auditoria completa funcionando")
 
 
+# ===================================================================================
+# IV. PRUEBAS DE REGLAS DE NEGOCIO (N-XXX)
+# ===================================================================================
+
+class DiasHabilesTestCase(TestCase):
+    """
+    Pruebas del cálculo de días hábiles (fines de semana y feriados).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = User.objects.create_user(username='func_habiles', password='Func123!@#')
+        Dias_Administrativos.objects.create(id_funcionario=cls.funcionario, vacaciones_restantes=15)
+        # Miércoles 2025-09-17 (Fiestas Patrias cae jueves 18 y viernes 19)
+        Eventos_Calendario.objects.create(
+            titulo='Fiestas Patrias', tipo_evento='Feriado',
+            fecha_inicio=date(2025, 9, 18), fecha_fin=date(2025, 9, 19)
+        )
+
+    def setUp(self):
+        # La caché sobrevive al rollback entre pruebas
+        cache.clear()
+
+    def test_N001_descuenta_fines_de_semana_y_feriados(self):
+        """N-001: Lunes 15 a domingo 21 de septiembre son 3 días hábiles."""
+        from .dias_habiles import calcular_dias_habiles
+        self.assertEqual(calcular_dias_habiles(date(2025, 9, 15), date(2025, 9, 21)), 3)
+        self.assertEqual(calcular_dias_habiles(date(2025, 9, 20), date(2025, 9, 21)), 0)
+        # Cuatro semanas completas sin feriados: 20 días
+        self.assertEqual(calcular_dias_habiles(date(2025, 10, 6), date(2025, 11, 2)), 20)
+
+    def test_N002_cache_se_invalida_al_modificar_calendario(self):
+        """N-002: Un feriado nuevo se refleja sin reiniciar el servidor."""
+        from .dias_habiles import calcular_dias_habiles
+        self.assertEqual(calcular_dias_habiles(date(2025, 10, 13), date(2025, 10, 13)), 1)
+        evento = Eventos_Calendario.objects.create(
+            titulo='Encuentro de Dos Mundos', tipo_evento='Feriado', fecha_inicio=date(2025, 10, 13)
+        )
+        self.assertEqual(calcular_dias_habiles(date(2025, 10, 13), date(2025, 10, 13)), 0)
+        evento.delete()
+        self.assertEqual(calcular_dias_habiles(date(2025, 10, 13), date(2025, 10, 13)), 1)
+
+    def test_N044_feriados_al_dia_en_todos_los_procesos(self):
+        """N-044: La versión de los feriados vive en la base; otro proceso con su caché antigua ve el cambio."""
+        from .dias_habiles import CACHE_KEY_FERIADOS, VERSION_FERIADOS, calcular_dias_habiles
+        from .versiones import version_datos
+        self.assertEqual(calcular_dias_habiles(date(2025, 10, 13), date(2025, 10, 13)), 1)
+        anterior = version_datos(VERSION_FERIADOS)
+        clave_anterior = CACHE_KEY_FERIADOS.format(version=anterior)
+        conjunto_anterior = cache.get(clave_anterior)
+
+        Eventos_Calendario.objects.create(
+            titulo='Encuentro de Dos Mundos', tipo_evento='Feriado', fecha_inicio=date(2025, 10, 13)
+        )
+        # Simula la caché de otro proceso, que no recibió la señal
+        cache.set(clave_anterior, conjunto_anterior)
+        self.assertNotEqual(version_datos(VERSION_FERIADOS), anterior)
+        self.assertEqual(calcular_dias_habiles(date(2025, 10, 13), date(2025, 10, 13)), 0)
+
+    def test_N003_solicitud_guarda_dias_habiles(self):
+        """N-003: La solicitud de vacaciones registra solo días hábiles."""
+        self.client.login(username='func_habiles', password='Func123!@#')
+        self.client.post(reverse('gestion_solicitudes'), {
+            'tipo_permiso': 'vacaciones',
+            'fecha_inicio': '2025-09-15',
+            'fecha_fin': '2025-09-21',
+        })
+        solicitud = SolicitudesPermiso.objects.get(id_funcionario_solicitante=self.funcionario)
+        self.assertEqual(solicitud.dias_solicitados, 3)
+
+
+class SolapamientosTestCase(TestCase):
+    """
+    Pruebas de detección de permisos y licencias solapados.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = User.objects.create_user(username='func_solape', password='Func123!@#')
+        Dias_Administrativos.objects.create(id_funcionario=cls.funcionario, vacaciones_restantes=15)
+        cls.licencia = Licencias.objects.create(
+            id_funcionario=cls.funcionario,
+            fecha_inicio=date(2025, 10, 6), fecha_fin=date(2025, 10, 10),
+            ruta_foto_licencia='licencias/licencia.pdf'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_N004_rechaza_solicitud_que_cruza_licencia(self):
+        """N-004: No se puede pedir vacaciones durante una licencia médica."""
+        self.client.login(username='func_solape', password='Func123!@#')
+        response = self.client.post(reverse('gestion_solicitudes'), {
+            'tipo_permiso': 'vacaciones',
+            'fecha_inicio': '2025-10-09',
+            'fecha_fin': '2025-10-14',
+        })
+        self.assertContains(response, 'se cruzan')
+        self.assertFalse(SolicitudesPermiso.objects.filter(id_funcionario_solicitante=self.funcionario).exists())
+
+    def test_N005_barrido_detecta_pares_solapados(self):
+        """N-005: El barrido reporta cada par solapado una sola vez."""
+        from .solapamientos import detectar_todos_los_solapamientos
+        for inicio, fin in [(date(2025, 10, 1), date(2025, 10, 7)), (date(2025, 10, 20), date(2025, 10, 21))]:
+            SolicitudesPermiso.objects.create(
+                id_funcionario_solicitante=self.funcionario, tipo_permiso='sin_goce',
+                fecha_inicio=inicio, fecha_fin=fin, dias_solicitados=1
+            )
+        pares = list(detectar_todos_los_solapamientos())
+        self.assertEqual(len(pares), 1)
+        self.assertEqual({pares[0][0][3], pares[0][1][3]}, {'solicitud', 'licencia'})
+
+
+    def test_N052_licencia_aprobada_no_se_solapa_consigo_misma(self):
+        """N-052: Una solicitud de licencia aprobada no se reporta solapada con la Licencia que genera."""
+        from .flujo_solicitudes import aplicar_transicion
+        from .solapamientos import buscar_solapamientos, detectar_todos_los_solapamientos
+        subdir = User.objects.create_user(
+            username='subdir_solape', password='Subdir123!@#',
+            id_rol=Roles.objects.create(nombre_rol='Subdirección', nivel_jerarquico=2),
+        )
+        solicitud = SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=self.funcionario, tipo_permiso='licencia', aprobador_actual='subdireccion',
+            fecha_inicio=date(2025, 11, 3), fecha_fin=date(2025, 11, 7), dias_solicitados=5,
+            justificativo_archivo='justificativos/licencia.pdf',
+        )
+        aplicar_transicion(solicitud, 'aprobar', subdir)
+        self.assertEqual(Licencias.objects.filter(fecha_inicio=date(2025, 11, 3)).count(), 1)
+
+        self.assertEqual(list(detectar_todos_los_solapamientos()), [])
+        solicitudes, licencias = buscar_solapamientos(self.funcionario, date(2025, 11, 3), date(2025, 11, 7))
+        self.assertEqual((solicitudes, len(licencias)), ([], 1))
+
+class TraspasoSaldosTestCase(TestCase):
+    """
+    Pruebas del comando de traspaso anual de saldos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, (vacaciones, admin) in enumerate([(20, 2), (3, 6), (0, 0)]):
+            funcionario = User.objects.create_user(username=f'func_traspaso_{i}', password='Func123!@#')
+            Dias_Administrativos.objects.create(
+                id_funcionario=funcionario, vacaciones_restantes=vacaciones,
+                admin_restantes=admin, horas_compensacion=10, anio_saldo=2025
+            )
+        User.objects.create_user(username='func_sin_saldo', password='Func123!@#')
+
+    def test_N006_traspaso_por_lotes_idempotente(self):
+        """N-006: Aplica las reglas de arrastre, crea saldos faltantes y no repite el traspaso."""
+        from django.core.management import call_command
+        from io import StringIO
+
+        call_command('traspasar_saldos', anio=2026, lote=2, stdout=StringIO())
+
+        saldos = {
+            s.id_funcionario.username: s
+            for s in Dias_Administrativos.objects.select_related('id_funcionario')
+        }
+        self.assertEqual(saldos['func_traspaso_0'].vacaciones_restantes, 30)  # 15 + tope 15
+        self.assertEqual(saldos['func_traspaso_0'].admin_restantes, 6)        # sin arrastre
+        self.assertEqual(saldos['func_traspaso_1'].vacaciones_restantes, 18)
+        self.assertEqual(saldos['func_traspaso_2'].horas_compensacion, 10)
+        self.assertEqual(saldos['func_sin_saldo'].anio_saldo, 2026)
+        self.assertTrue(all(s.anio_saldo == 2026 for s in saldos.values()))
+        registro = Logs_Auditoria.objects.get(accion='Traspaso Anual de Saldos')
+        self.assertEqual((registro.codigo, registro.datos['anio']), ('saldos.traspasados', 2026))
+
+        # Segunda ejecución: no cambia nada ni duplica la auditoría
+        call_command('traspasar_saldos', anio=2026, stdout=StringIO())
+        self.assertEqual(Dias_Administrativos.objects.get(id_funcionario__username='func_traspaso_0').vacaciones_restantes, 30)
+        self.assertEqual(Logs_Auditoria.objects.filter(accion='Traspaso Anual de Saldos').count(), 1)
+
+
+class FlujoSolicitudesTestCase(TestCase):
+    """
+    Pruebas del flujo de aprobación declarativo (flujo_solicitudes.py).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        cls.rol_subdir = Roles.objects.create(nombre_rol='Subdirección', nivel_jerarquico=2)
+        cls.rol_base = Roles.objects.create(nombre_rol='Funcionario Base', nivel_jerarquico=5)
+        cls.unidad = Unidades.objects.create(nombre_unidad='Odontología')
+        cls.unidad_sin_jefe = Unidades.objects.create(nombre_unidad='SOME')
+        cls.jefe = User.objects.create_user(
+            username='jefe_flujo', password='Jefe123!@#', id_rol=cls.rol_base,
+            id_unidad=cls.unidad, es_jefe_unidad=True
+        )
+        cls.subdir = User.objects.create_user(
+            username='subdir_flujo', password='Subdir123!@#', id_rol=cls.rol_subdir, is_staff=True
+        )
+        cls.funcionario = User.objects.create_user(
+            username='func_flujo', password='Func123!@#', id_rol=cls.rol_base, id_unidad=cls.unidad
+        )
+        cls.funcionario_sin_jefe = User.objects.create_user(
+            username='func_sin_jefe', password='Func123!@#', id_rol=cls.rol_base, id_unidad=cls.unidad_sin_jefe
+        )
+        Dias_Administrativos.objects.create(id_funcionario=cls.funcionario, vacaciones_restantes=15)
+
+    def setUp(self):
+        cache.clear()
+
+    def _crear_solicitud(self, solicitante, dias=2):
+        from .flujo_solicitudes import bandeja_inicial
+        return SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=solicitante, tipo_permiso='vacaciones',
+            fecha_inicio=date(2025, 11, 3), fecha_fin=date(2025, 11, 4),
+            dias_solicitados=dias, aprobador_actual=bandeja_inicial(solicitante)
+        )
+
+    def test_N007_ruteo_inicial(self):
+        """N-007: Cada solicitud nace en la bandeja que corresponde."""
+        self.assertEqual(self._crear_solicitud(self.funcionario).aprobador_actual, f'jefe:{self.unidad.pk}')
+        self.assertEqual(self._crear_solicitud(self.funcionario_sin_jefe).aprobador_actual, 'subdireccion')
+        self.assertEqual(self._crear_solicitud(self.jefe).aprobador_actual, 'subdireccion')
+        self.assertEqual(self._crear_solicitud(self.subdir).aprobador_actual, 'director')
+
+    def test_N008_flujo_completo_y_descuento(self):
+        """N-008: Jefe pre-aprueba, Subdirección aprueba y se descuenta el saldo una vez."""
+        solicitud = self._crear_solicitud(self.funcionario)
+
+        self.client.login(username='subdir_flujo', password='Subdir123!@#')
+        self.assertNotIn(solicitud, self.client.get(reverse('reporte_solicitudes')).context['solicitudes'])
+
+        self.client.login(username='jefe_flujo', password='Jefe123!@#')
+        self.assertIn(solicitud, self.client.get(reverse('reporte_solicitudes')).context['solicitudes'])
+        self.client.post(reverse('aprobar_solicitud', args=[solicitud.pk]), {'accion': 'pre_aprobar'})
+        solicitud.refresh_from_db()
+        self.assertEqual((solicitud.estado, solicitud.aprobador_actual), ('Pre-Aprobado', 'subdireccion'))
+
+        # El jefe no puede dar la aprobación final
+        self.client.post(reverse('aprobar_solicitud', args=[solicitud.pk]), {'accion': 'aprobar'})
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado, 'Pre-Aprobado')
+
+        self.client.login(username='subdir_flujo', password='Subdir123!@#')
+        self.client.post(reverse('aprobar_solicitud', args=[solicitud.pk]), {'accion': 'aprobar'})
+        solicitud.refresh_from_db()
+        self.assertEqual((solicitud.estado, solicitud.aprobador_actual), ('Aprobado', ''))
+        self.assertEqual(Dias_Administrativos.objects.get(id_funcionario=self.funcionario).vacaciones_restantes, 13)
+
+    def test_N009_transicion_invalida(self):
+        """N-009: Un funcionario sin rol de aprobador no puede rechazar solicitudes ajenas."""
+        from .flujo_solicitudes import aplicar_transicion, TransicionInvalida
+        solicitud = self._crear_solicitud(self.funcionario)
+        with self.assertRaises(TransicionInvalida):
+            aplicar_transicion(solicitud, 'rechazar', self.funcionario_sin_jefe)
+
+    def test_N010_bandeja_sigue_cada_transicion(self):
+        """N-010: La entrada de bandeja cambia con cada transición y desaparece al resolver."""
+        from .models import BandejaAprobacion
+        from .flujo_solicitudes import aplicar_transicion, contar_pendientes
+        solicitud = self._crear_solicitud(self.funcionario)
+        self.assertEqual(BandejaAprobacion.objects.get(solicitud=solicitud).bandeja, f'jefe:{self.unidad.pk}')
+        self.assertEqual(contar_pendientes(self.jefe), 1)
+        self.assertEqual(contar_pendientes(self.subdir), 0)
+
+        aplicar_transicion(solicitud, 'pre_aprobar', self.jefe)
+        self.assertEqual(BandejaAprobacion.objects.get(solicitud=solicitud).bandeja, 'subdireccion')
+        self.assertEqual(contar_pendientes(self.jefe), 0)
+        self.assertEqual(contar_pendientes(self.subdir), 1)
+
+        aplicar_transicion(solicitud, 'rechazar', self.subdir, comentario='Sin reemplazo')
+        self.assertFalse(BandejaAprobacion.objects.filter(solicitud=solicitud).exists())
+
+    def test_N011_aviso_de_pendientes_en_menu(self):
+        """N-011: El menú lateral muestra la cantidad de pendientes de la bandeja."""
+        self._crear_solicitud(self.funcionario)
+        self.client.login(username='jefe_flujo', password='Jefe123!@#')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['pendientes_bandeja'], 1)
+
+    def test_N049_degradar_jefe_reruta_a_subdireccion(self):
+        """N-049: Si la unidad se queda sin jefe, sus pendientes pasan a la bandeja de Subdirección."""
+        from .flujo_solicitudes import contar_pendientes, solicitudes_en_bandejas
+        solicitud = self._crear_solicitud(self.funcionario)
+        self.assertEqual(contar_pendientes(self.subdir), 0)
+
+        self.client.login(username='subdir_flujo', password='Subdir123!@#')
+        self.client.post(reverse('editar_usuario', args=[self.jefe.pk]), {
+            'first_name': 'Jefe', 'id_rol': self.rol_base.pk, 'id_unidad': self.unidad.pk,
+        })
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.aprobador_actual, 'subdireccion')
+        self.assertEqual(contar_pendientes(self.subdir), 1)
+        self.assertIn(solicitud, solicitudes_en_bandejas(['subdireccion']))
+
+        # Al nombrar de nuevo al jefe, la solicitud vuelve a su bandeja
+        self.jefe.refresh_from_db()
+        self.jefe.es_jefe_unidad = True
+        self.jefe.save()
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.aprobador_actual, f'jefe:{self.unidad.pk}')
+        self.assertEqual(contar_pendientes(self.subdir), 0)
+
+    def test_N045_aprobacion_simultanea_se_aplica_una_vez(self):
+        """N-045: Si dos aprobadores actúan sobre la misma solicitud, solo uno la resuelve."""
+        from .flujo_solicitudes import aplicar_transicion, TransicionInvalida
+        solicitud = self._crear_solicitud(self.funcionario_sin_jefe)
+        Dias_Administrativos.objects.create(id_funcionario=self.funcionario_sin_jefe, vacaciones_restantes=15)
+        # Segunda copia leída antes de la primera aprobación (otra pestaña u otro aprobador)
+        copia = SolicitudesPermiso.objects.get(pk=solicitud.pk)
+
+        aplicar_transicion(solicitud, 'aprobar', self.subdir)
+        with self.assertRaises(TransicionInvalida):
+            aplicar_transicion(copia, 'rechazar', self.subdir)
+        with self.assertRaises(TransicionInvalida):
+            aplicar_transicion(SolicitudesPermiso.objects.get(pk=solicitud.pk), 'aprobar', self.subdir)
+
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado, 'Aprobado')
+        self.assertEqual(copia.estado, 'Aprobado')
+        self.assertEqual(
+            Dias_Administrativos.objects.get(id_funcionario=self.funcionario_sin_jefe).vacaciones_restantes, 13
+        )
+
+
+class PlanesConsultaTestCase(TestCase):
+    """
+    Verifica con EXPLAIN QUERY PLAN que las consultas que ejecutan las vistas
+    de listados usan índices. Se capturan las consultas reales de cada vista y
+    se falla si alguna, sobre una de las tablas vigiladas:
+    - recorre la tabla completa sin índice ('SCAN tabla');
+    - la recorre por índice sin LIMIT ('SCAN tabla USING INDEX' sin paginar);
+    - ordena o agrupa en un árbol temporal ('USE TEMP B-TREE') después de
+      recorrerla, porque entonces el LIMIT llega tarde.
+    Ordenar en un árbol temporal lo que ya se acotó con SEARCH sí se acepta.
+    Además, cada vista debe usar los índices esperados, para que borrar o
+    cambiar un índice haga fallar la prueba aunque SQLite encuentre otro plan.
+    """
+
+    TABLAS_VIGILADAS = (
+        'intranet_solicitudespermiso', 'intranet_licencias', 'intranet_logs_auditoria',
+        'intranet_documentos', 'intranet_comunicados', 'intranet_eventos_calendario',
+    )
+    # Recorridos acotados por diseño: el total del paginador (SQLite siempre
+    # cuenta recorriendo un índice) y la lista de acciones del filtro de
+    # logs, que acciones_registradas guarda en caché
+    RECORRIDOS_PERMITIDOS = (
+        'SELECT COUNT(*) AS "__count" FROM ',
+        'SELECT DISTINCT "intranet_logs_auditoria"."accion" AS "accion" FROM ',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        cls.unidad = Unidades.objects.create(nombre_unidad='Kinesiología')
+        cls.admin = User.objects.create_superuser('admin_planes', 'admin@cesfam.cl', 'Admin123!@#')
+        cls.jefe = User.objects.create_user(
+            username='jefe_planes', password='Jefe123!@#', id_unidad=cls.unidad, es_jefe_unidad=True
+        )
+        # Una fila por tabla para que los listados paginados ejecuten su consulta
+        cls.funcionario = User.objects.create_user(
+            username='func_planes', password='Func123!@#', id_unidad=cls.unidad
+        )
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.funcionario, tipo_permiso='vacaciones',
+            fecha_inicio=date(2025, 11, 3), fecha_fin=date(2025, 11, 4), dias_solicitados=2,
+            aprobador_actual=f'jefe:{cls.unidad.pk}',
+        )
+        Licencias.objects.create(
+            id_funcionario=cls.funcionario, id_subdireccion_carga=cls.admin,
+            fecha_inicio=date(2025, 10, 1), fecha_fin=date(2025, 10, 5), ruta_foto_licencia='licencias/planes.jpg',
+        )
+        Documentos.objects.create(
+            titulo='Protocolo', categoria='Salud', ruta_archivo='documentos/planes.pdf',
+            id_autor_carga=cls.admin, publico=True,
+        )
+        Logs_Auditoria.objects.create(id_usuario_actor=cls.admin, accion='Cambio de Rol', detalle='planes')
+
+    def setUp(self):
+        cache.clear()
+
+    def _revisar_planes(self, usuario, vistas):
+        """
+        Ejecuta cada vista y revisa el plan de sus consultas.
+
+        Args:
+            vistas: tuplas (nombre de url, parámetros GET, índices esperados).
+
+        Returns:
+            list: problemas encontrados (vista, motivo, paso o índice, sql).
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.force_login(usuario)
+        problemas = []
+        for nombre, parametros, esperados in vistas:
+            with CaptureQueriesContext(connection) as consultas:
+                self.client.get(reverse(nombre), parametros)
+            usados = set()
+            for consulta in consultas.captured_queries:
+                sql = consulta['sql']
+                if not sql.startswith('SELECT') or not any(f'"{tabla}"' in sql for tabla in self.TABLAS_VIGILADAS):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plan = [fila[-1] for fila in cursor.fetchall()]
+                usados.update(re.findall(r'USING (?:COVERING )?INDEX (\w+)', ' '.join(plan)))
+                if sql.startswith(self.RECORRIDOS_PERMITIDOS):
+                    continue
+
+                recorridos = [
+                    paso for paso in plan
+                    if paso.startswith('SCAN ') and paso.split()[1] in self.TABLAS_VIGILADAS
+                ]
+                for paso in recorridos:
+                    if 'INDEX' not in paso:
+                        problemas.append((nombre, 'recorrido completo', paso, sql))
+                    elif ' LIMIT ' not in sql:
+                        problemas.append((nombre, 'recorrido sin límite', paso, sql))
+                if recorridos:
+                    for paso in plan:
+                        if paso.startswith('USE TEMP B-TREE'):
+                            problemas.append((nombre, 'orden temporal tras un recorrido', paso, sql))
+            for indice in esperados:
+                if indice not in usados:
+                    problemas.append((nombre, 'índice no usado', indice, parametros))
+        return problemas
+
+    def test_N012_listados_de_subdireccion_usan_indices(self):
+        """N-012: Dashboard, reportes, logs, historial y exportación de Subdirección."""
+        vistas = [
+            ('dashboard', {}, ('evento_ventana_idx', 'lic_rango_idx', 'sol_estado_inicio_idx', 'com_fecha_idx')),
+            ('documentos', {}, ('doc_fecha_carga_idx',)),
+            ('documentos', {'cat': 'Salud'}, ('doc_categoria_idx',)),
+            ('reporte_licencias', {}, ('lic_func_rango_idx', 'lic_fecha_registro_idx')),
+            ('reporte_solicitudes', {}, ('sol_fecha_idx',)),
+            ('logs_auditoria', {}, ('log_fecha_hora_idx',)),
+            ('historial_personal', {}, ('sol_func_fecha_idx', 'lic_func_rango_idx')),
+            ('exportar_solicitudes_excel', {}, ('sol_estado_fecha_idx',)),
+            ('eventos_json', {'start': '2024-02-25T00:00:00-03:00', 'end': '2024-04-07T00:00:00-04:00'},
+             ('evento_ventana_idx', 'evento_recurrente_idx')),
+            ('logs_auditoria', {'actor': self.jefe.pk, 'antes': '1700000000000000.5'}, ('log_actor_fecha_idx',)),
+            ('logs_auditoria', {'accion': 'Cambio de Rol', 'desde': '2024-01-01', 'hasta': '2024-06-30'},
+             ('log_accion_fecha_idx',)),
+            ('logs_auditoria', {'codigo': 'usuario.editado'}, ('log_codigo_fecha_idx',)),
+            ('logs_auditoria', {'tipo_objeto': 1, 'id_objeto': self.jefe.pk}, ('log_objeto_fecha_idx',)),
+        ]
+        self.assertEqual(self._revisar_planes(self.admin, vistas), [])
+
+    def test_N013_listados_de_jefatura_usan_indices(self):
+        """N-013: Dashboard, bandeja y reportes filtrados por la unidad del Jefe."""
+        vistas = [
+            ('dashboard', {}, ('bandeja_ruteo_idx', 'lic_func_rango_idx', 'sol_estado_inicio_idx', 'com_unidad_fecha_idx')),
+            ('documentos', {}, ('doc_fecha_carga_idx',)),
+            ('reporte_licencias', {}, ('lic_func_rango_idx',)),
+            ('reporte_solicitudes', {}, ('bandeja_ruteo_idx',)),
+            ('historial_personal', {}, ('sol_func_fecha_idx',)),
+            ('gestion_dias', {}, ()),
+        ]
+        self.assertEqual(self._revisar_planes(self.jefe, vistas), [])
+
+
+class IdempotenciaTestCase(TestCase):
+    """
+    Pruebas del envío idempotente de solicitudes (doble clic / reintentos).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rol_director = Roles.objects.create(nombre_rol='Director General', nivel_jerarquico=1)
+        cls.director = User.objects.create_user(
+            username='director_idem', password='Director123!@#', id_rol=cls.rol_director, is_staff=True
+        )
+        Dias_Administrativos.objects.create(id_funcionario=cls.director, vacaciones_restantes=15)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_N014_reintento_no_duplica_ni_descuenta_dos_veces(self):
+        """N-014: Dos POST con la misma clave crean una sola solicitud auto-aprobada."""
+        self.client.login(username='director_idem', password='Director123!@#')
+        datos = {
+            'tipo_permiso': 'vacaciones',
+            'fecha_inicio': '2025-11-03',
+            'fecha_fin': '2025-11-05',
+            'idempotency_key': 'clave-prueba-1',
+        }
+        primera = self.client.post(reverse('gestion_solicitudes'), datos)
+        segunda = self.client.post(reverse('gestion_solicitudes'), datos)
+
+        self.assertEqual(primera.status_code, 302)
+        self.assertEqual(segunda['Location'], primera['Location'])
+        self.assertEqual(SolicitudesPermiso.objects.filter(id_funcionario_solicitante=self.director).count(), 1)
+        self.assertEqual(Dias_Administrativos.objects.get(id_funcionario=self.director).vacaciones_restantes, 12)
+
+    def test_N015_formulario_incluye_clave(self):
+        """N-015: El formulario de solicitud trae una clave de idempotencia nueva en cada carga."""
+        self.client.login(username='director_idem', password='Director123!@#')
+        primera = self.client.get(reverse('gestion_solicitudes')).context['idempotency_key']
+        segunda = self.client.get(reverse('gestion_solicitudes')).context['idempotency_key']
+        self.assertNotEqual(primera, segunda)
+
+
+class CoberturaTestCase(TestCase):
+    """
+    Pruebas del cálculo de cobertura de dotación por unidad (cobertura.py).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        cls.rol_subdir = Roles.objects.create(nombre_rol='Subdirección', nivel_jerarquico=2)
+        cls.rol_base = Roles.objects.create(nombre_rol='Funcionario Base', nivel_jerarquico=5)
+        cls.unidad = Unidades.objects.create(nombre_unidad='Farmacia')
+        cls.otra_unidad = Unidades.objects.create(nombre_unidad='Laboratorio')
+        cls.jefe = User.objects.create_user(
+            username='jefe_cob', password='Jefe123!@#', id_rol=cls.rol_base,
+            id_unidad=cls.unidad, es_jefe_unidad=True
+        )
+        cls.func_a = User.objects.create_user(
+            username='func_cob_a', password='Func123!@#', id_rol=cls.rol_base, id_unidad=cls.unidad
+        )
+        cls.func_b = User.objects.create_user(
+            username='func_cob_b', password='Func123!@#', id_rol=cls.rol_base, id_unidad=cls.unidad
+        )
+        # func_a: permiso y licencia que se cruzan (cuenta una sola vez por día)
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.func_a, tipo_permiso='vacaciones', estado='Aprobado',
+            fecha_inicio=date(2025, 9, 29), fecha_fin=date(2025, 10, 3), dias_solicitados=5
+        )
+        Licencias.objects.create(
+            id_funcionario=cls.func_a, fecha_inicio=date(2025, 10, 2), fecha_fin=date(2025, 10, 6),
+            ruta_foto_licencia='licencias/licencia.pdf'
+        )
+        # func_b: ausente el 6 de octubre; su solicitud pendiente no cuenta como ausencia
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.func_b, tipo_permiso='administrativo', estado='Aprobado',
+            fecha_inicio=date(2025, 10, 6), fecha_fin=date(2025, 10, 6), dias_solicitados=1
+        )
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.func_b, tipo_permiso='vacaciones', estado='Pendiente',
+            fecha_inicio=date(2025, 10, 20), fecha_fin=date(2025, 10, 24), dias_solicitados=5
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_N016_cobertura_mensual_fusiona_ausencias(self):
+        """N-016: Los ausentes por día fusionan las ausencias de cada persona y recortan al mes."""
+        from .cobertura import cobertura_mes
+        cobertura = cobertura_mes(self.unidad.pk, 2025, 10)
+        ausentes = cobertura['ausentes']
+        self.assertEqual(cobertura['dotacion'], 3)
+        self.assertEqual(len(ausentes), 31)
+        self.assertEqual(ausentes[:6], [1, 1, 1, 1, 1, 2])
+        self.assertEqual(ausentes[6:], [0] * 25)
+
+    def test_N017_api_cobertura_restringida_a_la_unidad_del_jefe(self):
+        """N-017: El Jefe consulta la cobertura de su unidad, pero no la de otras."""
+        self.client.login(username='jefe_cob', password='Jefe123!@#')
+        response = self.client.get(reverse('cobertura_json'), {'mes': '2025-10'})
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos['dias'][5], {'fecha': '2025-10-06', 'ausentes': 2, 'disponibles': 1})
+
+        response = self.client.get(reverse('cobertura_json'), {'unidad': self.otra_unidad.pk, 'mes': '2025-10'})
+        self.assertEqual(response.status_code, 403)
+
+
+class ExportacionSolicitudesTestCase(TestCase):
+    """
+    Pruebas de la exportación de solicitudes a Excel (exportacion.py).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        rol_subdir = Roles.objects.create(nombre_rol='Subdirección', nivel_jerarquico=2)
+        cls.unidad = Unidades.objects.create(nombre_unidad='Kinesiología')
+        otra_unidad = Unidades.objects.create(nombre_unidad='Vacunatorio')
+        User.objects.create_user(
+            username='subdir_export', password='Subdir123!@#', id_rol=rol_subdir, is_staff=True
+        )
+        for i, (unidad, estado, mes) in enumerate([
+            (cls.unidad, 'Aprobado', 3), (cls.unidad, 'Aprobado', 8),
+            (cls.unidad, 'Pendiente', 3), (otra_unidad, 'Aprobado', 3),
+        ]):
+            funcionario = User.objects.create_user(
+                username=f'func_export_{i}', password='Func123!@#', id_unidad=unidad,
+                first_name='Func', last_name=str(i)
+            )
+            SolicitudesPermiso.objects.create(
+                id_funcionario_solicitante=funcionario, tipo_permiso='vacaciones', estado=estado,
+                fecha_inicio=date(2024, mes, 4), fecha_fin=date(2024, mes, 5), dias_solicitados=2
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_N018_exportacion_filtrada_en_una_consulta(self):
+        """N-018: El Excel respeta rango, unidad y estado, y las filas se leen en una sola consulta."""
+        import io
+        import openpyxl
+        from .exportacion import filas_solicitudes, filtrar_solicitudes
+
+        filtros = {'desde': '2024-03-01', 'hasta': '2024-03-31', 'unidad': str(self.unidad.pk), 'estado': 'Aprobado'}
+        with self.assertNumQueries(1):
+            filas = list(filas_solicitudes(filtrar_solicitudes(filtros)))
+        self.assertEqual(len(filas), 1)
+        self.assertEqual(filas[0][:2], ['Func 0', 'Kinesiología'])
+
+        self.client.login(username='subdir_export', password='Subdir123!@#')
+        response = self.client.get(reverse('exportar_solicitudes_excel'), {'estado': 'todos'})
+        self.assertEqual(response.status_code, 200)
+        libro = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        self.assertEqual(len(list(libro.active.iter_rows())), 5)  # encabezado + 4 solicitudes
+
+        response = self.client.get(reverse('exportar_solicitudes_excel'), {'desde': '2024-13-01'})
+        self.assertRedirects(response, reverse('reporte_solicitudes'), fetch_redirect_response=False)
+
+
+class ExportacionCSVTestCase(TestCase):
+    """
+    Pruebas de la exportación CSV compartida por los reportes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        rol_base = Roles.objects.create(nombre_rol='Funcionario Base', nivel_jerarquico=5)
+        unidad = Unidades.objects.create(nombre_unidad='Sala IRA')
+        otra_unidad = Unidades.objects.create(nombre_unidad='Sala ERA')
+        User.objects.create_user(
+            username='jefe_csv', password='Jefe123!@#', id_rol=rol_base, id_unidad=unidad, es_jefe_unidad=True
+        )
+        cls.funcionario = User.objects.create_user(
+            username='func_csv', password='Func123!@#', id_rol=rol_base, id_unidad=unidad,
+            first_name='Ana', last_name='Pérez'
+        )
+        ajeno = User.objects.create_user(username='func_csv_ajeno', password='Func123!@#', id_unidad=otra_unidad)
+        for funcionario in (cls.funcionario, ajeno):
+            Licencias.objects.create(
+                id_funcionario=funcionario, fecha_inicio=date(2025, 5, 5), fecha_fin=date(2025, 5, 9),
+                ruta_foto_licencia='licencias/licencia.pdf'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def _leer_csv(self, response):
+        import csv
+        import io
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(contenido)))
+
+    def test_N019_csv_licencias_respeta_alcance_del_jefe(self):
+        """N-019: El CSV de licencias del Jefe solo incluye su unidad."""
+        self.client.login(username='jefe_csv', password='Jefe123!@#')
+        filas = self._leer_csv(self.client.get(reverse('reporte_licencias'), {'exportar': 'csv'}))
+        self.assertEqual(filas[0][0], 'Funcionario')
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][:5], ['Ana Pérez', 'Sala IRA', '2025-05-05', '2025-05-09', '5'])
+
+    def test_N020_csv_historial_incluye_solicitudes_y_licencias(self):
+        """N-020: El historial exportado combina solicitudes y licencias del propio funcionario."""
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=self.funcionario, tipo_permiso='administrativo',
+            fecha_inicio=date(2025, 6, 2), fecha_fin=date(2025, 6, 2), dias_solicitados=1
+        )
+        self.client.login(username='func_csv', password='Func123!@#')
+        filas = self._leer_csv(self.client.get(reverse('historial_personal'), {'exportar': 'csv'}))
+        self.assertEqual([fila[0] for fila in filas[1:]], ['Solicitud', 'Licencia'])
+
+    def test_N047_textos_con_formula_se_exportan_como_texto(self):
+        """N-047: Un texto libre que empieza con =, +, - o @ no llega como fórmula a la planilla."""
+        import io
+        import openpyxl
+        from .exportacion import escribir_excel, respuesta_csv
+        filas = [['=HYPERLINK("http://x","y")', '+1', '-2', '@SUMA(A1)', 'normal', -3]]
+
+        csv_filas = self._leer_csv(respuesta_csv('x.csv', ['A', 'B', 'C', 'D', 'E', 'F'], filas))
+        self.assertEqual(csv_filas[1], ["'=HYPERLINK(\"http://x\",\"y\")", "'+1", "'-2", "'@SUMA(A1)", 'normal', '-3'])
+
+        archivo = io.BytesIO()
+        escribir_excel(archivo, 'Hoja', ['A', 'B', 'C', 'D', 'E', 'F'], filas)
+        archivo.seek(0)
+        celda = openpyxl.load_workbook(archivo).active['A2']
+        self.assertEqual((celda.value, celda.data_type), ('=HYPERLINK("http://x","y")', 's'))
+
+
+class TrabajosReporteTestCase(TestCase):
+    """
+    Pruebas de los reportes en segundo plano (trabajos.py y comando procesar_reportes).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rol_subdir = Roles.objects.create(nombre_rol='Subdirección', nivel_jerarquico=2)
+        cls.subdir = User.objects.create_user(
+            username='subdir_reportes', password='Subdir123!@#', id_rol=rol_subdir, is_staff=True
+        )
+        User.objects.create_user(username='func_reportes', password='Func123!@#')
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.subdir, tipo_permiso='vacaciones', estado='Aprobado',
+            fecha_inicio=date(2023, 2, 6), fecha_fin=date(2023, 2, 10), dias_solicitados=5
+        )
+
+    def setUp(self):
+        import tempfile
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=self.media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_N021_reporte_encolado_se_genera_y_se_reutiliza(self):
+        """N-021: El reporte se encola, el worker lo genera y un pedido idéntico reutiliza el archivo."""
+        import io
+        from django.core.management import call_command
+        from .models import TrabajoReporte
+        filtros = {'tipo': 'solicitudes_csv', 'desde': '2023-01-01', 'hasta': '2023-12-31', 'estado': 'todos'}
+        self.client.login(username='subdir_reportes', password='Subdir123!@#')
+        self.client.post(reverse('encolar_reporte'), filtros)
+        self.client.post(reverse('encolar_reporte'), filtros)
+        self.assertEqual(TrabajoReporte.objects.count(), 1)
+
+        call_command('procesar_reportes', '--una-vez', stdout=io.StringIO())
+        trabajo = TrabajoReporte.objects.get()
+        self.assertEqual(trabajo.estado, 'Terminado')
+        self.assertIsNotNone(trabajo.expira)
+
+        self.client.post(reverse('encolar_reporte'), filtros)
+        self.assertEqual(TrabajoReporte.objects.count(), 1)
+        response = self.client.get(reverse('descargar_reporte', args=[trabajo.pk]))
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertIn('2023-02-06', contenido)
+
+    def test_N022_reportes_protegidos_y_expirados(self):
+        """N-022: Un funcionario no puede pedir reportes de gestión ni descargar los de otro; los vencidos se purgan."""
+        from .models import TrabajoReporte
+        from .trabajos import encolar_reporte, generar_reporte, purgar_expirados, tomar_siguiente_trabajo
+        trabajo, _ = encolar_reporte(self.subdir, 'solicitudes_excel', {})
+        generar_reporte(tomar_siguiente_trabajo())
+
+        self.client.login(username='func_reportes', password='Func123!@#')
+        self.client.post(reverse('encolar_reporte'), {'tipo': 'solicitudes_excel'})
+        self.assertEqual(TrabajoReporte.objects.count(), 1)
+        self.assertEqual(self.client.get(reverse('descargar_reporte', args=[trabajo.pk])).status_code, 404)
+
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(expira=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(purgar_expirados(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.archivo.name), ('Expirado', ''))
+
+
+    def test_N057_solo_se_retoman_trabajos_sin_latido(self):
+        """N-057: Un trabajo largo con latido no vuelve a la cola; si se retomó, solo una ejecución guarda el resultado."""
+        from .models import TrabajoReporte
+        from .trabajos import encolar_reporte, generar_reporte, recuperar_interrumpidos, tomar_siguiente_trabajo
+        encolar_reporte(self.subdir, 'solicitudes_csv', {})
+        primero = tomar_siguiente_trabajo()
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        TrabajoReporte.objects.filter(pk=primero.pk).update(fecha_inicio=hace_una_hora)
+        primero.refresh_from_db()
+        self.assertEqual(recuperar_interrumpidos(10), 0)
+
+        # El latido se detiene: vuelve a la cola y otra ejecución lo toma
+        TrabajoReporte.objects.filter(pk=primero.pk).update(latido=hace_una_hora)
+        self.assertEqual(recuperar_interrumpidos(10), 1)
+        segundo = tomar_siguiente_trabajo()
+        self.assertIsNone(generar_reporte(primero))
+        self.assertEqual(TrabajoReporte.objects.get(pk=primero.pk).estado, 'En Proceso')
+        self.assertEqual(generar_reporte(segundo).estado, 'Terminado')
+
+class ReporteLicenciasTestCase(TestCase):
+    """
+    Pruebas del reporte de licencias con totales calculados en la base de datos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        rol_subdir = Roles.objects.create(nombre_rol='Subdirección', nivel_jerarquico=2)
+        rol_base = Roles.objects.create(nombre_rol='Funcionario Base', nivel_jerarquico=5)
+        cls.unidad = Unidades.objects.create(nombre_unidad='Podología')
+        otra_unidad = Unidades.objects.create(nombre_unidad='Nutrición')
+        User.objects.create_user(
+            username='subdir_lic', password='Subdir123!@#', id_rol=rol_subdir, is_staff=True
+        )
+        User.objects.create_user(
+            username='jefe_lic', password='Jefe123!@#', id_rol=rol_base, id_unidad=cls.unidad, es_jefe_unidad=True
+        )
+        cls.func_a = User.objects.create_user(username='func_lic_a', password='Func123!@#', id_unidad=cls.unidad)
+        func_b = User.objects.create_user(username='func_lic_b', password='Func123!@#', id_unidad=otra_unidad)
+        for funcionario, inicio, fin in [
+            (cls.func_a, date(2025, 3, 28), date(2025, 4, 4)),  # 8 días, 4 dentro de abril
+            (cls.func_a, date(2025, 4, 10), date(2025, 4, 12)),  # 3 días
+            (func_b, date(2025, 4, 1), date(2025, 4, 5)),  # 5 días
+        ]:
+            Licencias.objects.create(
+                id_funcionario=funcionario, fecha_inicio=inicio, fecha_fin=fin,
+                ruta_foto_licencia='licencias/licencia.pdf'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_N023_totales_por_unidad_y_funcionario(self):
+        """N-023: Los días se suman en SQL, se recortan al periodo y respetan el alcance del Jefe."""
+        self.client.login(username='subdir_lic', password='Subdir123!@#')
+        response = self.client.get(reverse('reporte_licencias'))
+        self.assertEqual(response.context['dias_totales'], 16)
+        self.assertEqual(response.context['licencias'][0].duracion.days, 5)
+
+        response = self.client.get(reverse('reporte_licencias'), {'desde': '2025-04-01', 'hasta': '2025-04-30'})
+        self.assertEqual(response.context['dias_totales'], 12)
+        unidades = {fila['id_funcionario__id_unidad__nombre_unidad']: fila['dias'] for fila in response.context['totales_unidad']}
+        self.assertEqual(unidades, {'Podología': 7, 'Nutrición': 5})
+
+        self.client.login(username='jefe_lic', password='Jefe123!@#')
+        response = self.client.get(reverse('reporte_licencias'))
+        self.assertEqual(response.context['total_licencias'], 2)
+        self.assertEqual(response.context['totales_funcionario'][0]['dias'], 11)
+
+        # El ranking por funcionario se corta en la consulta, no en Python
+        from .estadisticas import totales_licencias
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as consultas:
+            totales = totales_licencias(Licencias.objects.all(), limite_funcionarios=1)
+        self.assertEqual([fila['dias'] for fila in totales['por_funcionario']], [11])
+        self.assertEqual(totales['total_dias'], 16)
+        self.assertIn('LIMIT 1', consultas.captured_queries[-1]['sql'])
+
+
+class AnaliticaAusenciasTestCase(TestCase):
+    """
+    Pruebas del pivote de ausencias por unidad, tipo y mes (estadisticas.py).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        rol_subdir = Roles.objects.create(nombre_rol='Subdirección', nivel_jerarquico=2)
+        unidad = Unidades.objects.create(nombre_unidad='Urgencia')
+        User.objects.create_user(
+            username='subdir_pivote', password='Subdir123!@#', id_rol=rol_subdir, is_staff=True
+        )
+        cls.funcionario = User.objects.create_user(username='func_pivote', password='Func123!@#', id_unidad=unidad)
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.funcionario, tipo_permiso='vacaciones', estado='Aprobado',
+            fecha_inicio=date(2024, 1, 8), fecha_fin=date(2024, 1, 12), dias_solicitados=5
+        )
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.funcionario, tipo_permiso='administrativo', estado='Rechazado',
+            fecha_inicio=date(2024, 1, 15), fecha_fin=date(2024, 1, 15), dias_solicitados=1
+        )
+        # Licencia que cruza de enero a febrero: 3 días en cada mes
+        Licencias.objects.create(
+            id_funcionario=cls.funcionario, fecha_inicio=date(2024, 1, 29), fecha_fin=date(2024, 2, 3),
+            ruta_foto_licencia='licencias/licencia.pdf'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_N024_pivote_por_unidad_tipo_y_mes(self):
+        """N-024: El pivote reparte permisos (días hábiles) y licencias (días corridos) entre los meses que abarcan."""
+        # Permiso que cruza de enero a febrero: 3 días hábiles en enero y 2 en febrero
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=self.funcionario, tipo_permiso='administrativo', estado='Aprobado',
+            fecha_inicio=date(2024, 1, 29), fecha_fin=date(2024, 2, 2), dias_solicitados=5
+        )
+        self.client.login(username='subdir_pivote', password='Subdir123!@#')
+        response = self.client.get(reverse('ausencias_pivote_json'), {'desde': '2024-01', 'hasta': '2024-02'})
+        datos = response.json()
+        self.assertEqual(datos['meses'], ['2024-01', '2024-02'])
+        filas = {fila['tipo']: fila['dias'] for fila in datos['filas']}
+        self.assertEqual(filas, {'licencia': [3, 3], 'vacaciones': [5, 0], 'administrativo': [3, 2]})
+        self.assertEqual(datos['total'], 16)
+        unidades = {fila['tipo']: fila['unidad_dias'] for fila in datos['filas']}
+        self.assertEqual(unidades['licencia'], 'corridos')
+        self.assertEqual(unidades['vacaciones'], 'hábiles')
+        response = self.client.get(reverse('analitica_ausencias'), {'desde': '2024-01', 'hasta': '2024-02'})
+        self.assertContains(response, 'Urgencia')
+
+        response = self.client.get(reverse('ausencias_pivote_json'), {'desde': '2020-01', 'hasta': '2024-02'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_N025_meses_cerrados_se_guardan_y_se_invalidan(self):
+        """N-025: Un mes cerrado se calcula una vez; una licencia retroactiva lo recalcula."""
+        from .models import ResumenAusenciasMes
+        from .estadisticas import pivote_mes
+        pivote_mes(date(2024, 2, 1))
+        self.assertTrue(ResumenAusenciasMes.objects.filter(mes=date(2024, 2, 1)).exists())
+        with self.assertNumQueries(1):
+            pivote_mes(date(2024, 2, 1))
+
+        Licencias.objects.create(
+            id_funcionario=self.funcionario, fecha_inicio='2024-02-19', fecha_fin='2024-02-20',
+            ruta_foto_licencia='licencias/licencia.pdf'
+        )
+        self.assertFalse(ResumenAusenciasMes.objects.filter(mes=date(2024, 2, 1)).exists())
+        self.assertEqual(pivote_mes(date(2024, 2, 1))[0][4], 5)
+
+    def test_N053_feriado_nuevo_recalcula_mes_cerrado(self):
+        """N-053: Un feriado en un mes cerrado descuenta ese día de los permisos del pivote guardado."""
+        from .models import ResumenAusenciasMes
+        from .estadisticas import pivote_mes
+        self.assertEqual({fila[2]: fila[4] for fila in pivote_mes(date(2024, 1, 1))}, {'vacaciones': 5, 'licencia': 3})
+
+        feriado = Eventos_Calendario.objects.create(titulo='Feriado local', fecha_inicio=date(2024, 1, 10), tipo_evento='Feriado')
+        self.assertFalse(ResumenAusenciasMes.objects.filter(mes=date(2024, 1, 1)).exists())
+        self.assertEqual({fila[2]: fila[4] for fila in pivote_mes(date(2024, 1, 1))}, {'vacaciones': 4, 'licencia': 3})
+
+        # Moverlo fuera del permiso devuelve el día
+        feriado.fecha_inicio = date(2024, 1, 22)
+        feriado.save()
+        self.assertEqual({fila[2]: fila[4] for fila in pivote_mes(date(2024, 1, 1))}, {'vacaciones': 5, 'licencia': 3})
+
+    def test_N048_mover_una_ausencia_recalcula_el_mes_anterior(self):
+        """N-048: Al cambiar las fechas de una ausencia, el mes que deja también se recalcula."""
+        from .estadisticas import pivote_mes
+        self.assertEqual({fila[2]: fila[4] for fila in pivote_mes(date(2024, 1, 1))}, {'vacaciones': 5, 'licencia': 3})
+
+        solicitud = SolicitudesPermiso.objects.get(estado='Aprobado')
+        solicitud.fecha_inicio, solicitud.fecha_fin = '2024-03-04', '2024-03-08'
+        solicitud.save()
+        licencia = Licencias.objects.get(id_funcionario=self.funcionario)
+        licencia.fecha_inicio, licencia.fecha_fin = date(2024, 3, 11), date(2024, 3, 12)
+        licencia.save()
+
+        self.assertEqual(pivote_mes(date(2024, 1, 1)), [])
+        self.assertEqual({fila[2]: fila[4] for fila in pivote_mes(date(2024, 3, 1))}, {'vacaciones': 5, 'licencia': 2})
+
+
+class ResumenesMensualesTestCase(TestCase):
+    """
+    Pruebas de los resúmenes mensuales incrementales (resumenes.py y comando actualizar_resumenes).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        unidad = Unidades.objects.create(nombre_unidad='Farmacia Popular')
+        cls.funcionario = User.objects.create_user(username='func_resumen', password='Func123!@#', id_unidad=unidad)
+        cls.solicitud = SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.funcionario, tipo_permiso='vacaciones', estado='Pendiente',
+            fecha_inicio=date(2024, 3, 4), fecha_fin=date(2024, 3, 8), dias_solicitados=5
+        )
+        Licencias.objects.create(
+            id_funcionario=cls.funcionario, fecha_inicio=date(2024, 3, 30), fecha_fin=date(2024, 4, 2),
+            ruta_foto_licencia='licencias/licencia.pdf'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _actualizar(self):
+        import io
+        from django.core.management import call_command
+        call_command('actualizar_resumenes', stdout=io.StringIO())
+
+    def _envejecer(self):
+        """Simula que la última modificación ocurrió hace horas (update() no toca auto_now)."""
+        from .models import MarcaResumen
+        hace_horas = timezone.now() - timedelta(hours=3)
+        SolicitudesPermiso.objects.update(fecha_modificacion=hace_horas)
+        Licencias.objects.update(fecha_modificacion=hace_horas)
+        Logs_Auditoria.objects.update(fecha_hora=hace_horas)
+        MarcaResumen.objects.update(marca=hace_horas + timedelta(hours=1))
+
+    def test_N026_resumen_inicial_e_incremental(self):
+        """N-026: La primera ejecución resume todo; las siguientes solo recalculan los meses editados."""
+        from .models import ResumenMensual
+        from .resumenes import actualizar_fuente, historial_mensual
+        self._actualizar()
+        marzo = historial_mensual('solicitudes', 2024, estado='Pendiente')[2]
+        self.assertEqual(marzo, {'cantidad': 1, 'dias': 5})
+        licencias = historial_mensual('licencias', 2024)
+        self.assertEqual((licencias[2]['dias'], licencias[3]['dias']), (2, 2))
+
+        self._envejecer()
+        self.assertEqual(actualizar_fuente('solicitudes'), [])
+
+        # Edición tardía: la solicitud se aprueba y solo se recalcula su mes
+        self.solicitud.estado = 'Aprobado'
+        self.solicitud.save()
+        self.assertEqual(actualizar_fuente('solicitudes'), [date(2024, 3, 1)])
+        self.assertEqual(historial_mensual('solicitudes', 2024, estado='Aprobado')[2]['cantidad'], 1)
+        self.assertFalse(ResumenMensual.objects.filter(fuente='solicitudes', estado='Pendiente').exists())
+
+    def test_N027_eliminacion_recalcula_el_mes(self):
+        """N-027: Eliminar un registro marca su mes y el siguiente ciclo lo deja en cero."""
+        from .resumenes import actualizar_fuente, historial_mensual
+        self._actualizar()
+        self._envejecer()
+        Licencias.objects.all().delete()
+        self.assertEqual(actualizar_fuente('licencias'), [date(2024, 3, 1), date(2024, 4, 1)])
+        self.assertEqual(sum(mes['dias'] for mes in historial_mensual('licencias', 2024)), 0)
+
+
+    def test_N054_dias_de_permiso_repartidos_por_mes(self):
+        """N-054: Los días de un permiso que cruza de mes se reparten en días hábiles, como en el pivote."""
+        from .resumenes import actualizar_fuente, historial_mensual
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=self.funcionario, tipo_permiso='vacaciones', estado='Aprobado',
+            fecha_inicio=date(2024, 4, 29), fecha_fin=date(2024, 5, 3), dias_solicitados=5
+        )
+        self._actualizar()
+        aprobadas = historial_mensual('solicitudes', 2024, estado='Aprobado')
+        self.assertEqual(aprobadas[3:5], [{'cantidad': 1, 'dias': 2}, {'cantidad': 0, 'dias': 3}])
+
+        # Un feriado dentro del permiso marca su mes y el siguiente ciclo lo descuenta
+        Eventos_Calendario.objects.create(titulo='Día del Trabajo', fecha_inicio=date(2024, 5, 1), tipo_evento='Feriado')
+        self.assertIn(date(2024, 5, 1), actualizar_fuente('solicitudes'))
+        self.assertEqual(historial_mensual('solicitudes', 2024, estado='Aprobado')[4]['dias'], 2)
+
+class CalendarioEventosTestCase(TestCase):
+    """
+    Pruebas del feed de eventos del calendario (calendario.py).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = User.objects.create_user(username='func_calendario', password='Func123!@#')
+        Eventos_Calendario.objects.create(titulo='Aniversario', fecha_inicio=date(2024, 3, 15), tipo_evento='Actividad')
+        Eventos_Calendario.objects.create(
+            titulo='Campaña invierno', fecha_inicio=date(2024, 2, 20), fecha_fin=date(2024, 3, 2), tipo_evento='Actividad'
+        )
+        Eventos_Calendario.objects.create(titulo='Año nuevo', fecha_inicio=date(2023, 1, 1), tipo_evento='Feriado')
+        Eventos_Calendario.objects.create(titulo='Sin fecha fin previa', fecha_inicio=date(2024, 2, 24), tipo_evento='Actividad')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.funcionario)
+
+    def test_N028_solo_eventos_de_la_ventana(self):
+        """N-028: El feed entrega los eventos que se solapan con start/end (fin exclusivo)."""
+        response = self.client.get(reverse('eventos_json'), {
+            'start': '2024-02-25T00:00:00-03:00', 'end': '2024-04-07T00:00:00-04:00'
+        })
+        self.assertEqual(response.status_code, 200)
+        titulos = sorted(evento['title'] for evento in response.json())
+        self.assertEqual(titulos, ['Actividad: Aniversario', 'Actividad: Campaña invierno'])
+
+        response = self.client.get(reverse('eventos_json'), {'start': '2024-04-07', 'end': '2024-02-25'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_N029_feed_sin_cambios_responde_304(self):
+        """N-029: Con el ETag vigente responde 304 sin consultar eventos; un cambio lo renueva."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        ventana = {'start': '2024-02-25', 'end': '2024-04-07'}
+        primera = self.client.get(reverse('eventos_json'), ventana)
+        self.assertEqual(primera.status_code, 200)
+        self.assertIn('Last-Modified', primera)
+
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.client.get(reverse('eventos_json'), ventana, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 304)
+        self.assertFalse([c for c in consultas.captured_queries if 'eventos_calendario' in c['sql']])
+
+        Eventos_Calendario.objects.create(titulo='Operativo', fecha_inicio=date(2024, 3, 20), tipo_evento='Actividad')
+        tercera = self.client.get(reverse('eventos_json'), ventana, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(tercera.status_code, 200)
+        self.assertNotEqual(tercera['ETag'], primera['ETag'])
+        self.assertIn('Actividad: Operativo', [evento['title'] for evento in tercera.json()])
+
+        # La versión vive en la base: no depende de la caché de este proceso
+        cache.clear()
+        cuarta = self.client.get(reverse('eventos_json'), ventana, HTTP_IF_NONE_MATCH=tercera['ETag'])
+        self.assertEqual(cuarta.status_code, 304)
+
+
+class CapaAusenciasCalendarioTestCase(TestCase):
+    """
+    Pruebas de la capa de ausencias del calendario para jefaturas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        cls.unidad = Unidades.objects.create(nombre_unidad='Sala IRA')
+        otra = Unidades.objects.create(nombre_unidad='Sala ERA')
+        cls.jefe = User.objects.create_user(
+            username='jefe_capa', password='Jefe123!@#', id_unidad=cls.unidad, es_jefe_unidad=True
+        )
+        cls.ana = User.objects.create_user(
+            username='ana_capa', password='Func123!@#', first_name='Ana', last_name='Rojas', id_unidad=cls.unidad
+        )
+        externo = User.objects.create_user(username='externo_capa', password='Func123!@#', id_unidad=otra)
+        # Permiso y licencia contiguos: deben verse como un solo rango
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.ana, tipo_permiso='vacaciones', estado='Aprobado',
+            fecha_inicio=date(2024, 3, 4), fecha_fin=date(2024, 3, 8), dias_solicitados=5
+        )
+        Licencias.objects.create(
+            id_funcionario=cls.ana, fecha_inicio=date(2024, 3, 9), fecha_fin=date(2024, 3, 12),
+            ruta_foto_licencia='licencias/licencia.pdf'
+        )
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.ana, tipo_permiso='administrativo', estado='Pendiente',
+            fecha_inicio=date(2024, 3, 20), fecha_fin=date(2024, 3, 20), dias_solicitados=1
+        )
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=externo, tipo_permiso='vacaciones', estado='Aprobado',
+            fecha_inicio=date(2024, 3, 4), fecha_fin=date(2024, 3, 5), dias_solicitados=2
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_N030_capa_ausencias_fusionada_y_acotada(self):
+        """N-030: El Jefe ve solo su unidad, con los días contiguos fusionados y en dos consultas."""
+        self.client.force_login(self.jefe)
+        ventana = {'start': '2024-02-25', 'end': '2024-04-07', 'capa': 'ausencias'}
+        self.client.get(reverse('calendario'))  # carga la sesión fuera de la medición
+        with self.assertNumQueries(5):  # sesión + usuario + versión + una consulta por fuente
+            response = self.client.get(reverse('eventos_json'), ventana)
+        self.assertEqual(response.json(), [{
+            'title': 'Ausente: Ana Rojas', 'start': '2024-03-04', 'end': '2024-03-13',
+            'color': '#8e44ad', 'allDay': True,
+        }])
+
+        # Aprobar otra solicitud renueva la capa
+        etag = response['ETag']
+        SolicitudesPermiso.objects.filter(estado='Pendiente').get().save()
+        self.assertNotEqual(self.client.get(reverse('eventos_json'), ventana)['ETag'], etag)
+
+
+    def test_N050_capa_ausencias_sigue_el_alcance_del_usuario(self):
+        """N-050: Un jefe trasladado deja de ver la capa de su unidad anterior aunque no cambien las ausencias."""
+        from .models import Unidades
+        self.client.force_login(self.jefe)
+        ventana = {'start': '2024-02-25', 'end': '2024-04-07', 'capa': 'ausencias'}
+        primera = self.client.get(reverse('eventos_json'), ventana)
+        self.assertEqual(len(primera.json()), 1)
+
+        self.jefe.id_unidad = Unidades.objects.create(nombre_unidad='Farmacia')
+        self.jefe.save()
+        segunda = self.client.get(reverse('eventos_json'), ventana, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(segunda.json(), [])
+
+class SuscripcionICSTestCase(TestCase):
+    """
+    Pruebas de la suscripción iCalendar por token (ical.py).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = User.objects.create_user(username='func_ics', password='Func123!@#')
+        hoy = timezone.localdate()
+        Eventos_Calendario.objects.create(
+            titulo='Reunión clínica, sala 2; piso 3', fecha_inicio=hoy + timedelta(days=3), tipo_evento='Actividad'
+        )
+        SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=cls.funcionario, tipo_permiso='vacaciones', estado='Aprobado',
+            fecha_inicio=hoy + timedelta(days=10), fecha_fin=hoy + timedelta(days=14), dias_solicitados=5
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_N031_suscripcion_ics_con_token(self):
+        """N-031: El .ics se sirve sin sesión, responde 304 leyendo solo token y versiones, y el token se puede revocar."""
+        self.client.force_login(self.funcionario)
+        self.client.post(reverse('suscripcion_calendario'))
+        self.client.logout()
+        self.funcionario.refresh_from_db()
+        url = reverse('calendario_ics', args=[self.funcionario.token_calendario])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        contenido = response.content.decode('utf-8')
+        self.assertIn(r'SUMMARY:Actividad: Reunión clínica\, sala 2\; piso 3', contenido.replace('\r\n ', ''))
+        self.assertIn('SUMMARY:Permiso: Feriado Legal (Vacaciones)', contenido)
+        self.assertEqual(contenido.count('BEGIN:VEVENT'), 2)
+
+        with self.assertNumQueries(3):  # token + versión del calendario + versión de los permisos
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # Regenerar el token revoca el enlace anterior
+        from .ical import generar_token
+        generar_token(self.funcionario)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class EventosRecurrentesTestCase(TestCase):
+    """
+    Pruebas de los eventos recurrentes del calendario (expansión por ventana).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subdirector = User.objects.create_superuser('subdir_recurrente', 'sub@cesfam.cl', 'Admin123!@#')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.subdirector)
+
+    def _fechas(self, start, end):
+        response = self.client.get(reverse('eventos_json'), {'start': start, 'end': end})
+        return [evento['start'] for evento in response.json()]
+
+    def test_N032_serie_semanal_con_excepcion(self):
+        """N-032: Una serie semanal se expande solo en la ventana y omite la ocurrencia cancelada."""
+        self.client.post(reverse('gestion_calendario'), {
+            'titulo': 'Reunión de equipo', 'tipo_evento': 'reunion', 'fecha_inicio': '2024-01-03',
+            'frecuencia': 'semanal', 'intervalo': '2', 'repetir_hasta': '2024-12-31',
+        })
+        serie = Eventos_Calendario.objects.get()
+        self.assertEqual(self._fechas('2024-03-01', '2024-04-01'), ['2024-03-13', '2024-03-27'])
+
+        response = self.client.post(reverse('cancelar_ocurrencia', args=[serie.pk]), {'fecha': '2024-03-13'})
+        self.assertRedirects(response, reverse('gestion_calendario'))
+        self.assertEqual(self._fechas('2024-03-01', '2024-04-01'), ['2024-03-27'])
+        # Una fecha que no es ocurrencia se rechaza
+        self.client.post(reverse('cancelar_ocurrencia', args=[serie.pk]), {'fecha': '2024-03-14'})
+        serie.refresh_from_db()
+        self.assertEqual(serie.excepciones, ['2024-03-13'])
+        # Después de 'repetir hasta' no hay ocurrencias
+        self.assertEqual(self._fechas('2025-01-01', '2025-02-01'), [])
+
+    def test_N033_serie_mensual_ajusta_fin_de_mes(self):
+        """N-033: Una serie mensual del día 31 cae el último día de los meses más cortos."""
+        Eventos_Calendario.objects.create(
+            titulo='Capacitación', tipo_evento='capacitacion', fecha_inicio=date(2024, 1, 31), frecuencia='mensual'
+        )
+        self.assertEqual(self._fechas('2024-02-01', '2024-05-01'), ['2024-02-29', '2024-03-31', '2024-04-30'])
+        # La serie sin término sigue apareciendo años después sin recorrer la historia
+        self.assertEqual(self._fechas('2030-06-01', '2030-07-01'), ['2030-06-30'])
+
+
+class EscritorAuditoriaTestCase(TransactionTestCase):
+    """
+    Pruebas del escritor asíncrono de auditoría (auditoria.py). Usa TransactionTestCase
+    porque el hilo escritor abre su propia conexión.
+    """
+
+    def test_N034_escritor_en_lote_no_pierde_registros(self):
+        """N-034: Los registros encolados se insertan en lote con su hora original y se vacían al cerrar."""
+        from django.db import DatabaseError, transaction
+        from .auditoria import EscritorAuditoria, escritor as escritor_global, registrar_auditoria
+        actor = User.objects.create_user(username='actor_auditoria', password='Actor123!@#')
+        escritor = EscritorAuditoria(tamano_lote=3, intervalo=60)
+        antes = timezone.now() - timedelta(hours=1)
+        for i in range(5):
+            escritor.encolar(Logs_Auditoria(id_usuario_actor=actor, accion='Prueba', detalle=str(i), fecha_hora=antes))
+        escritor.detener()
+        self.assertEqual(Logs_Auditoria.objects.filter(accion='Prueba').count(), 5)
+        self.assertFalse(Logs_Auditoria.objects.exclude(fecha_hora=antes).exists())
+
+        # Modo asíncrono: se encola al confirmar la transacción; revertida, no se registra
+        with override_settings(AUDITORIA_ASINCRONA=True):
+            registrar_auditoria(actor, 'Confirmada', 'ok')
+            try:
+                with transaction.atomic():
+                    registrar_auditoria(actor, 'Revertida', 'no')
+                    raise DatabaseError('fallo de la vista')
+            except DatabaseError:
+                pass
+            escritor_global.detener()
+        self.assertTrue(Logs_Auditoria.objects.filter(accion='Confirmada').exists())
+        self.assertFalse(Logs_Auditoria.objects.filter(accion='Revertida').exists())
+
+
+class VisorAuditoriaTestCase(TestCase):
+    """
+    Pruebas del visor de auditoría paginado por cursor.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin_visor', 'admin@cesfam.cl', 'Admin123!@#')
+        cls.otro = User.objects.create_user(username='otro_visor', password='Otro123!@#')
+        base = timezone.make_aware(datetime(2024, 5, 10, 9, 0))
+        # Dos registros comparten fecha_hora para probar el desempate por id
+        horas = [0, 1, 1, 2, 3, 4, 5]
+        for i, hora in enumerate(horas):
+            Logs_Auditoria.objects.create(
+                id_usuario_actor=cls.admin if i % 2 == 0 else cls.otro,
+                accion='Cambio de Rol' if i < 4 else 'Edición de Usuario',
+                detalle=f'registro {i}', fecha_hora=base + timedelta(hours=hora),
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_N035_paginacion_por_cursor_sin_saltos(self):
+        """N-035: Recorrer las páginas hacia atrás y adelante entrega cada registro una vez y en orden."""
+        from django.http import QueryDict
+        from .auditoria import pagina_logs
+        logs = Logs_Auditoria.objects.all()
+        vistos = []
+        params = QueryDict(mutable=True)
+        paginas = []
+        while True:
+            pagina = pagina_logs(logs, params, tamano=3)
+            paginas.append(pagina)
+            vistos += [log.detalle for log in pagina['registros']]
+            if not pagina['antes']:
+                break
+            params = QueryDict(mutable=True)
+            params['antes'] = pagina['antes']
+        self.assertEqual(vistos, [f'registro {i}' for i in (6, 5, 4, 3, 2, 1, 0)])
+        self.assertEqual([len(p['registros']) for p in paginas], [3, 3, 1])
+
+        # Volver una página desde la segunda entrega la primera
+        params = QueryDict(mutable=True)
+        params['despues'] = paginas[1]['despues']
+        anterior = pagina_logs(logs, params, tamano=3)
+        self.assertEqual([log.detalle for log in anterior['registros']], ['registro 6', 'registro 5', 'registro 4'])
+        self.assertIsNone(anterior['despues'])
+
+    def test_N036_visor_filtra_por_actor_accion_y_fecha(self):
+        """N-036: El visor aplica los filtros a la tabla y a la exportación CSV."""
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('logs_auditoria'), {
+            'actor': self.admin.pk, 'accion': 'Cambio de Rol', 'desde': '2024-05-10', 'hasta': '2024-05-10',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([log.detalle for log in response.context['logs']], ['registro 2', 'registro 0'])
+
+        response = self.client.get(reverse('logs_auditoria'), {'accion': 'Edición de Usuario', 'exportar': 'csv'})
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(len(contenido.strip().splitlines()), 1 + 3)
+
+        response = self.client.get(reverse('logs_auditoria'), {'antes': 'no-es-un-cursor'})
+        self.assertRedirects(response, reverse('logs_auditoria'))
+
+
+    def test_N056_filtro_de_actores_y_exportacion_sin_pagina(self):
+        """N-056: El filtro lista solo actores con registros y la exportación CSV no arma la página."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        User.objects.create_user(username='sin_registros', password='Sin123!@#')
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('logs_auditoria'))
+        self.assertEqual([actor['username'] for actor in response.context['actores']], ['admin_visor', 'otro_visor'])
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('logs_auditoria'), {'exportar': 'csv'})
+        self.assertEqual(len(consultas.captured_queries), 2)  # sesión + usuario
+        b''.join(response.streaming_content)
+
+class ArchivoAuditoriaTestCase(TestCase):
+    """
+    Pruebas del archivo comprimido de logs de auditoría.
+    """
+
+    def setUp(self):
+        import tempfile
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(AUDITORIA_ARCHIVO_DIR=directorio.name, AUDITORIA_RETENCION_DIAS=60)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        from .archivo_auditoria import limite_retencion
+        self.actor = User.objects.create_user(username='actor_archivo', password='Actor123!@#')
+        limite = timezone.make_aware(datetime.combine(limite_retencion(), datetime.min.time()))
+        self.antiguas = [limite - timedelta(days=40), limite - timedelta(days=10), limite - timedelta(days=9)]
+        for i, fecha in enumerate(self.antiguas):
+            Logs_Auditoria.objects.create(id_usuario_actor=self.actor, accion='Antigua',
+                                          detalle=f'registro antiguo {i}', fecha_hora=fecha)
+        Logs_Auditoria.objects.create(id_usuario_actor=self.actor, accion='Reciente', detalle='se conserva')
+
+    def test_N037_archivar_verificar_y_buscar(self):
+        """N-037: Se archivan los meses vencidos, se conservan los recientes y el archivo se puede consultar."""
+        import io
+        from django.core.management import call_command
+        from django.db.models import Sum
+        from .archivo_auditoria import buscar_en_archivo, ruta_mes
+        from .models import ResumenMensual
+
+        call_command('archivar_auditoria', stdout=io.StringIO())
+        self.assertEqual(list(Logs_Auditoria.objects.values_list('accion', flat=True)), ['Reciente'])
+        for fecha in self.antiguas:
+            self.assertTrue(ruta_mes(timezone.localdate(fecha)).exists())
+        # Los resúmenes mensuales conservan el conteo de lo archivado
+        self.assertEqual(
+            ResumenMensual.objects.filter(fuente='logs', tipo='Antigua').aggregate(total=Sum('cantidad'))['total'], 3
+        )
+
+        # Una segunda ejecución no repite registros
+        salida = io.StringIO()
+        call_command('archivar_auditoria', stdout=salida)
+        self.assertIn('0 registro(s) archivado(s)', salida.getvalue())
+
+        desde = timezone.localdate(self.antiguas[0])
+        hasta = timezone.localdate(self.antiguas[2])
+        encontrados = list(buscar_en_archivo(desde, hasta, actor='actor_archivo'))
+        self.assertEqual([r['detalle'] for r in encontrados], [f'registro antiguo {i}' for i in range(3)])
+        self.assertEqual(len(list(buscar_en_archivo(desde, hasta, texto='ANTIGUO 1'))), 1)
+        self.assertEqual(list(buscar_en_archivo(desde, hasta, accion='Reciente')), [])
+
+    def test_N051_reconstruir_resumenes_conserva_meses_archivados(self):
+        """N-051: Reconstruir los resúmenes no pierde los conteos de los meses ya archivados."""
+        import io
+        from django.core.management import call_command
+        from django.db.models import Sum
+        from .models import ResumenMensual
+
+        call_command('archivar_auditoria', stdout=io.StringIO())
+        call_command('actualizar_resumenes', reconstruir=True, stdout=io.StringIO())
+        conteos = ResumenMensual.objects.filter(fuente='logs').values('tipo').annotate(total=Sum('cantidad'))
+        self.assertEqual({fila['tipo']: fila['total'] for fila in conteos}, {'Antigua': 3, 'Reciente': 1})
+
+    def test_N038_conteo_inconsistente_no_borra(self):
+        """N-038: Si el archivo no coincide con la base no se elimina ningún registro."""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from . import archivo_auditoria
+
+        original = archivo_auditoria.leer_archivo
+        # Simula un archivo truncado: la relectura pierde la última línea
+        archivo_auditoria.leer_archivo = lambda ruta: list(original(ruta))[:-1]
+        self.addCleanup(setattr, archivo_auditoria, 'leer_archivo', original)
+        with self.assertRaises(CommandError):
+            call_command('archivar_auditoria')
+        self.assertEqual(Logs_Auditoria.objects.count(), 4)
+        self.assertEqual(list(archivo_auditoria.directorio_archivo().glob('*.tmp')), [])
+
+    def test_N046_rearchivar_reescribe_el_archivo_completo(self):
+        """N-046: Un mes ya archivado se reescribe completo con los nuevos; un archivo dañado no borra nada."""
+        from .archivo_auditoria import ArchivoInconsistente, archivar_mes, leer_archivo, ruta_mes
+        mes = timezone.localdate(self.antiguas[1]).replace(day=1)
+        self.assertEqual(archivar_mes(mes), 2)
+
+        # Registros del mes que quedaron en la base (ej. una ejecución interrumpida antes de borrar)
+        Logs_Auditoria.objects.create(id_usuario_actor=self.actor, accion='Antigua',
+                                      detalle='tardío', fecha_hora=self.antiguas[1])
+        self.assertEqual(archivar_mes(mes), 1)
+        self.assertEqual([r['detalle'] for r in leer_archivo(ruta_mes(mes))],
+                         ['registro antiguo 1', 'registro antiguo 2', 'tardío'])
+
+        Logs_Auditoria.objects.create(id_usuario_actor=self.actor, accion='Antigua',
+                                      detalle='otro tardío', fecha_hora=self.antiguas[1])
+        ruta = ruta_mes(mes)
+        ruta.write_bytes(ruta.read_bytes()[:-10])
+        with self.assertRaises(ArchivoInconsistente):
+            archivar_mes(mes)
+        self.assertTrue(Logs_Auditoria.objects.filter(detalle='otro tardío').exists())
+        self.assertEqual(list(ruta.parent.glob('*.tmp')), [])
+
+
+class AuditoriaEstructuradaTestCase(TestCase):
+    """
+    Pruebas de los campos estructurados de auditoría (código, objeto y datos).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin_estructura', 'admin@cesfam.cl', 'Admin123!@#')
+        cls.usuario = User.objects.create_user(username='objetivo', password='Objetivo123!@#')
+        cls.otro = User.objects.create_user(username='otro_objetivo', password='Otro123!@#')
+
+    def test_N039_historial_de_un_objeto(self):
+        """N-039: Las vistas registran código y objeto, y el historial de un usuario es un rango del índice."""
+        from django.db import connection
+        from .auditoria import historial_de
+
+        self.client.force_login(self.admin)
+        self.client.get(reverse('toggle_usuario', args=[self.usuario.pk]))
+        self.client.get(reverse('toggle_usuario', args=[self.usuario.pk]))
+        self.client.get(reverse('toggle_usuario', args=[self.otro.pk]))
+
+        historial = list(historial_de(self.usuario))
+        self.assertEqual([log.codigo for log in historial], ['usuario.activado', 'usuario.desactivado'])
+        self.assertEqual({log.id_usuario_actor_id for log in historial}, {self.admin.pk})
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + str(historial_de(self.usuario).query))
+            plan = ' '.join(fila[-1] for fila in cursor.fetchall())
+        self.assertIn('log_objeto_fecha_idx', plan)
+
+        # El visor filtra por el objeto y el historial se muestra al editar el usuario
+        response = self.client.get(reverse('logs_auditoria'), {
+            'tipo_objeto': historial[0].tipo_objeto_id, 'id_objeto': self.usuario.pk,
+        })
+        self.assertEqual(len(response.context['logs']), 2)
+        response = self.client.get(reverse('editar_usuario', args=[self.usuario.pk]))
+        self.assertEqual(len(response.context['historial']), 2)
+
+
+class ImportacionUsuariosTestCase(TestCase):
+    """
+    Pruebas de la importación masiva de funcionarios.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        cls.admin = User.objects.create_superuser('admin_importa', 'admin@cesfam.cl', 'Admin123!@#')
+        cls.unidad = Unidades.objects.create(nombre_unidad='Farmacia')
+        Roles.objects.create(nombre_rol='Funcionario Base')
+        User.objects.create_user(username='existente', password='Existe123!@#')
+
+    def _csv(self, filas):
+        contenido = 'Usuario;Contraseña;Nombres;Apellidos;Email;Unidad;Rol;Jefe de Unidad\n' + '\n'.join(filas)
+        return SimpleUploadedFile('funcionarios.csv', contenido.encode('utf-8'), content_type='text/csv')
+
+    @override_settings(IMPORTACION_PROCESOS=2)
+    def test_N040_importar_csv_y_excel(self):
+        """N-040: Se crean funcionarios, saldos y un solo registro de auditoría; las contraseñas quedan hasheadas."""
+        import io
+        import openpyxl
+
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('importar_usuarios'), {'archivo': self._csv([
+            'mrojas;Clave.Segura.41;María;Rojas;mrojas@cesfam.cl;farmacia;Funcionario Base;sí',
+            'psoto;Clave.Segura.42;Pedro;Soto;;;;',
+        ])})
+        self.assertRedirects(response, reverse('gestion_usuarios'))
+        maria = User.objects.get(username='mrojas')
+        self.assertTrue(maria.check_password('Clave.Segura.41'))
+        self.assertEqual((maria.id_unidad_id, maria.es_jefe_unidad, maria.is_staff), (self.unidad.pk, True, True))
+        self.assertTrue(Dias_Administrativos.objects.filter(id_funcionario__username='psoto').exists())
+        logs = Logs_Auditoria.objects.filter(codigo='usuario.importados')
+        self.assertEqual([log.datos['cantidad'] for log in logs], [2])
+
+        libro = openpyxl.Workbook()
+        libro.active.append(['Usuario', 'Contraseña', 'Nombres', 'Apellidos'])
+        libro.active.append(['lfuentes', 'Clave.Segura.43', 'Luis', 'Fuentes'])
+        contenido = io.BytesIO()
+        libro.save(contenido)
+        self.client.post(reverse('importar_usuarios'), {
+            'archivo': SimpleUploadedFile('funcionarios.xlsx', contenido.getvalue()),
+        })
+        self.assertTrue(User.objects.get(username='lfuentes').check_password('Clave.Segura.43'))
+
+    def test_N041_archivo_con_errores_no_crea_nada(self):
+        """N-041: Si alguna fila es inválida no se crea ningún funcionario y se informan todos los errores."""
+        self.client.force_login(self.admin)
+        total = User.objects.count()
+        response = self.client.post(reverse('importar_usuarios'), {'archivo': self._csv([
+            'valido;Clave.Segura.44;Ana;Díaz;;;;',
+            'existente;Clave.Segura.45;Otro;Nombre;;;;',
+            'valido;Clave.Segura.46;Ana;Repetida;;;;',
+            'nuevo;123;Juan;Pérez;no-es-email;Rayos X;;',
+        ])})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([fila for fila, _ in response.context['errores']], [3, 4, 5])
+        self.assertIn('Rayos X', response.context['errores'][2][1])
+        self.assertEqual(User.objects.count(), total)
+        self.assertFalse(Logs_Auditoria.objects.filter(codigo='usuario.importados').exists())
+
+
+    def test_N055_importar_jefe_reruta_pendientes_de_su_unidad(self):
+        """N-055: Un jefe importado para una unidad sin jefe recibe las solicitudes pendientes de la unidad."""
+        from .flujo_solicitudes import bandeja_inicial
+        funcionario = User.objects.create_user(username='func_farmacia', password='Func123!@#', id_unidad=self.unidad)
+        solicitud = SolicitudesPermiso.objects.create(
+            id_funcionario_solicitante=funcionario, tipo_permiso='vacaciones',
+            fecha_inicio=date(2025, 11, 3), fecha_fin=date(2025, 11, 4), dias_solicitados=2,
+            aprobador_actual=bandeja_inicial(funcionario),
+        )
+        self.assertEqual(solicitud.aprobador_actual, 'subdireccion')
+
+        self.client.force_login(self.admin)
+        self.client.post(reverse('importar_usuarios'), {'archivo': self._csv([
+            'jfarmacia;Clave.Segura.47;Julia;Vera;;farmacia;;sí',
+        ])})
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.aprobador_actual, f'jefe:{self.unidad.pk}')
+        self.assertEqual(solicitud.entrada_bandeja.bandeja, f'jefe:{self.unidad.pk}')
+
+class GrillaSaldosTestCase(TestCase):
+    """
+    Pruebas de la grilla editable de saldos de días.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Unidades
+        cls.unidad = Unidades.objects.create(nombre_unidad='Urgencia')
+        cls.otra_unidad = Unidades.objects.create(nombre_unidad='Dental')
+        rol = Roles.objects.create(nombre_rol='Técnico')
+        cls.jefe = User.objects.create_user(username='jefe_grilla', password='Jefe123!@#',
+                                            id_unidad=cls.unidad, es_jefe_unidad=True)
+        cls.equipo = []
+        for i in range(3):
+            funcionario = User.objects.create_user(username=f'grilla_{i}', password='Grilla123!@#',
+                                                   id_unidad=cls.unidad, id_rol=rol)
+            Dias_Administrativos.objects.create(id_funcionario=funcionario, admin_restantes=6, vacaciones_restantes=15)
+            cls.equipo.append(funcionario)
+        # Sin saldo todavía
+        cls.sin_saldo = User.objects.create_user(username='grilla_sin_saldo', password='Grilla123!@#',
+                                                 id_unidad=cls.unidad)
+        cls.ajeno = User.objects.create_user(username='grilla_ajeno', password='Grilla123!@#',
+                                             id_unidad=cls.otra_unidad)
+        Dias_Administrativos.objects.create(id_funcionario=cls.ajeno, admin_restantes=6, vacaciones_restantes=15)
+
+    def test_N042_grilla_con_consultas_constantes(self):
+        """N-042: La grilla usa las mismas consultas con 5 o 10 funcionarios."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.force_login(self.jefe)
+        with CaptureQueriesContext(connection) as antes:
+            response = self.client.get(reverse('gestion_dias'))
+        self.assertEqual(len(response.context['filas']), 5)
+        for i in range(5):
+            User.objects.create_user(username=f'grilla_extra_{i}', password='Grilla123!@#', id_unidad=self.unidad)
+        with CaptureQueriesContext(connection) as despues:
+            response = self.client.get(reverse('gestion_dias'))
+        self.assertEqual(len(response.context['filas']), 10)
+        self.assertEqual(len(despues), len(antes))
+
+    def test_N043_guardar_filas_modificadas_en_lote(self):
+        """N-043: Las filas enviadas se guardan juntas con un solo registro de auditoría; las ajenas se ignoran."""
+        self.client.force_login(self.jefe)
+        datos = {
+            f'{self.equipo[0].pk}-admin_restantes': 4, f'{self.equipo[0].pk}-vacaciones_restantes': 15,
+            f'{self.equipo[1].pk}-admin_restantes': 6, f'{self.equipo[1].pk}-vacaciones_restantes': 10,
+            # Enviada sin cambios: no cuenta como modificada
+            f'{self.equipo[2].pk}-admin_restantes': 6, f'{self.equipo[2].pk}-vacaciones_restantes': 15,
+            f'{self.sin_saldo.pk}-admin_restantes': 3, f'{self.sin_saldo.pk}-vacaciones_restantes': 15,
+            f'{self.ajeno.pk}-admin_restantes': 0, f'{self.ajeno.pk}-vacaciones_restantes': 0,
+        }
+        response = self.client.post(reverse('gestion_dias'), datos)
+        self.assertRedirects(response, reverse('gestion_dias'))
+
+        saldos = dict(Dias_Administrativos.objects.values_list('id_funcionario__username', 'admin_restantes'))
+        self.assertEqual(saldos['grilla_0'], 4)
+        self.assertEqual(saldos['grilla_sin_saldo'], 3)
+        self.assertEqual(saldos['grilla_ajeno'], 6)
+        self.assertEqual(Dias_Administrativos.objects.get(id_funcionario=self.equipo[1]).vacaciones_restantes, 10)
+        log = Logs_Auditoria.objects.get(codigo='dias.modificados')
+        self.assertEqual(sorted(log.datos['cambios']), ['grilla_0', 'grilla_1', 'grilla_sin_saldo'])
+
+        # Un valor inválido impide guardar todo el lote
+        response = self.client.post(reverse('gestion_dias'), {
+            f'{self.equipo[0].pk}-admin_restantes': 1, f'{self.equipo[0].pk}-vacaciones_restantes': 15,
+            f'{self.equipo[1].pk}-admin_restantes': -2, f'{self.equipo[1].pk}-vacaciones_restantes': 10,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Dias_Administrativos.objects.get(id_funcionario=self.equipo[0]).admin_restantes, 4)
+        self.assertEqual(Logs_Auditoria.objects.filter(codigo='dias.modificados').count(), 1)
+
+
 # ===================================================================================
 # RESUMEN DE PRUEBAS
 # ===================================================================================
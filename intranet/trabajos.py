@@ -0,0 +1,228 @@
+"""
+Reportes en segundo plano.
+
+Las exportaciones de varios años pueden tardar más que el timeout del proxy,
+por lo que la vista solo encola un TrabajoReporte y responde de inmediato.
+El comando 'procesar_reportes' toma los trabajos pendientes, genera el archivo
+con los mismos generadores de filas de exportacion.py y lo deja disponible
+hasta su fecha de expiración.
+
+Cada tipo de reporte se declara en TIPOS_REPORTE con su formato, quién puede
+pedirlo, los parámetros que acepta (y cómo validarlos) y la función que
+entrega (encabezados, filas) para el usuario.
+
+Mientras genera un archivo, el worker renueva el 'latido' del trabajo cada
+INTERVALO_LATIDO segundos. Solo se devuelven a la cola los trabajos cuyo
+latido se detuvo (el worker murió), no los que simplemente tardan. Además,
+el resultado se guarda condicionado a que el trabajo siga tomado por esa
+misma ejecución: si igual se retomó, solo una de las dos lo escribe.
+"""
+import hashlib
+import json
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from .exportacion import (
+    ENCABEZADOS_SOLICITUDES, ENCABEZADOS_LICENCIAS, ENCABEZADOS_LOGS, ENCABEZADOS_HISTORIAL,
+    filtrar_solicitudes, filtrar_licencias, filtrar_logs, filas_solicitudes, filas_licencias, filas_logs, filas_historial,
+    licencias_visibles, escribir_csv, escribir_excel,
+)
+from .models import TrabajoReporte, SolicitudesPermiso, Licencias
+from .roles import es_subdireccion, es_admin, puede_gestionar
+
+# Parámetros GET/POST que acepta cada filtro
+PARAMETROS_SOLICITUDES = ('desde', 'hasta', 'unidad', 'estado')
+PARAMETROS_LICENCIAS = ('desde', 'hasta', 'unidad', 'funcionario')
+PARAMETROS_LOGS = ('desde', 'hasta', 'actor', 'accion', 'codigo', 'tipo_objeto', 'id_objeto')
+# Segundos entre latidos de un trabajo en proceso
+INTERVALO_LATIDO = 60
+
+
+def _solicitudes(user, parametros):
+    return ENCABEZADOS_SOLICITUDES, filas_solicitudes(filtrar_solicitudes(parametros))
+
+
+def _licencias(user, parametros):
+    return ENCABEZADOS_LICENCIAS, filas_licencias(filtrar_licencias(parametros, licencias_visibles(user)))
+
+
+def _logs(user, parametros):
+    return ENCABEZADOS_LOGS, filas_logs(filtrar_logs(parametros))
+
+
+def _historial(user, parametros):
+    return ENCABEZADOS_HISTORIAL, filas_historial(
+        SolicitudesPermiso.objects.filter(id_funcionario_solicitante=user),
+        Licencias.objects.filter(id_funcionario=user),
+    )
+
+
+TIPOS_REPORTE = {
+    'solicitudes_excel': {
+        'nombre': 'Solicitudes de permiso (Excel)', 'formato': 'xlsx',
+        'permiso': es_subdireccion, 'filas': _solicitudes, 'parametros': PARAMETROS_SOLICITUDES,
+        'validar': filtrar_solicitudes,
+    },
+    'solicitudes_csv': {
+        'nombre': 'Solicitudes de permiso (CSV)', 'formato': 'csv',
+        'permiso': es_subdireccion, 'filas': _solicitudes, 'parametros': PARAMETROS_SOLICITUDES,
+        'validar': filtrar_solicitudes,
+    },
+    'licencias_csv': {
+        'nombre': 'Licencias médicas (CSV)', 'formato': 'csv',
+        'permiso': puede_gestionar, 'filas': _licencias, 'parametros': PARAMETROS_LICENCIAS,
+        'validar': filtrar_licencias,
+    },
+    'logs_csv': {
+        'nombre': 'Logs de auditoría (CSV)', 'formato': 'csv',
+        'permiso': es_admin, 'filas': _logs, 'parametros': PARAMETROS_LOGS,
+        'validar': filtrar_logs,
+    },
+    'historial_csv': {
+        'nombre': 'Mi historial (CSV)', 'formato': 'csv',
+        'permiso': lambda user: True, 'filas': _historial, 'parametros': (),
+    },
+}
+
+
+class ReporteNoPermitido(Exception):
+    """El tipo de reporte no existe o el usuario no puede solicitarlo."""
+
+
+def huella_reporte(tipo, parametros):
+    """Identifica un reporte por su tipo y parámetros (sin importar el orden)."""
+    contenido = json.dumps([tipo, parametros], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def encolar_reporte(user, tipo, datos):
+    """
+    Crea el trabajo del reporte o reutiliza uno idéntico del mismo usuario
+    que siga pendiente, en proceso o terminado sin expirar.
+
+    Args:
+        datos: QueryDict o dict con los parámetros enviados por el formulario.
+
+    Returns:
+        tuple: (TrabajoReporte, creado)
+
+    Raises:
+        ReporteNoPermitido: si el tipo no existe o el usuario no tiene permiso.
+        ValueError: si los parámetros no son válidos.
+    """
+    definicion = TIPOS_REPORTE.get(tipo)
+    if definicion is None or not definicion['permiso'](user):
+        raise ReporteNoPermitido(f'Reporte no disponible: {tipo}')
+
+    # Solo los parámetros conocidos y con valor forman parte de la huella
+    parametros = {clave: datos.get(clave) for clave in definicion['parametros'] if datos.get(clave)}
+    # Validar los filtros ahora y no recién en el worker
+    if 'validar' in definicion:
+        definicion['validar'](parametros)
+    huella = huella_reporte(tipo, parametros)
+
+    vigente = TrabajoReporte.objects.filter(usuario=user, huella=huella).filter(
+        Q(estado__in=('Pendiente', 'En Proceso')) | Q(estado='Terminado', expira__gt=timezone.now())
+    ).order_by('-fecha_creacion').first()
+    if vigente:
+        return vigente, False
+
+    trabajo = TrabajoReporte.objects.create(usuario=user, tipo=tipo, parametros=parametros, huella=huella)
+    return trabajo, True
+
+
+def tomar_siguiente_trabajo():
+    """
+    Marca como 'En Proceso' el trabajo pendiente más antiguo y lo retorna.
+    La actualización condicionada al estado evita que dos workers tomen el mismo.
+    """
+    while True:
+        trabajo = TrabajoReporte.objects.filter(estado='Pendiente').order_by('fecha_creacion', 'pk').first()
+        if trabajo is None:
+            return None
+        ahora = timezone.now()
+        tomado = TrabajoReporte.objects.filter(pk=trabajo.pk, estado='Pendiente').update(
+            estado='En Proceso', fecha_inicio=ahora, latido=ahora
+        )
+        if tomado:
+            trabajo.refresh_from_db()
+            return trabajo
+
+
+def recuperar_interrumpidos(minutos):
+    """Devuelve a la cola los trabajos 'En Proceso' cuyo latido se detuvo hace más de 'minutos'."""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return TrabajoReporte.objects.filter(estado='En Proceso').filter(
+        Q(latido__lt=limite) | Q(latido__isnull=True, fecha_inicio__lt=limite)
+    ).update(estado='Pendiente', fecha_inicio=None, latido=None)
+
+
+def _con_latido(trabajo, filas):
+    """Entrega las filas renovando el latido del trabajo cada INTERVALO_LATIDO segundos."""
+    ultimo = time.monotonic()
+    for fila in filas:
+        if time.monotonic() - ultimo >= INTERVALO_LATIDO:
+            TrabajoReporte.objects.filter(pk=trabajo.pk, fecha_inicio=trabajo.fecha_inicio).update(
+                latido=timezone.now()
+            )
+            ultimo = time.monotonic()
+        yield fila
+
+
+def generar_reporte(trabajo):
+    """
+    Genera el archivo del trabajo y lo deja 'Terminado' (o en 'Error' si falla).
+
+    Returns:
+        TrabajoReporte, o None si el trabajo se devolvió a la cola y otra
+        ejecución lo tomó mientras tanto (su archivo se descarta).
+    """
+    definicion = TIPOS_REPORTE[trabajo.tipo]
+    try:
+        encabezados, filas = definicion['filas'](trabajo.usuario, trabajo.parametros)
+        filas = _con_latido(trabajo, filas)
+        with tempfile.TemporaryFile() as temporal:
+            if definicion['formato'] == 'xlsx':
+                escribir_excel(temporal, definicion['nombre'][:31], encabezados, filas)
+            else:
+                escribir_csv(temporal, encabezados, filas)
+            temporal.seek(0)
+            nombre = f"{trabajo.tipo}_{trabajo.pk}.{definicion['formato']}"
+            trabajo.archivo.save(nombre, File(temporal), save=False)
+    except Exception as e:
+        trabajo.estado = 'Error'
+        trabajo.error = str(e)
+    else:
+        trabajo.estado = 'Terminado'
+        trabajo.expira = timezone.now() + timedelta(hours=getattr(settings, 'REPORTES_VIGENCIA_HORAS', 24))
+    trabajo.fecha_termino = timezone.now()
+    # Solo escribe el resultado la ejecución que sigue dueña del trabajo
+    guardado = TrabajoReporte.objects.filter(
+        pk=trabajo.pk, estado='En Proceso', fecha_inicio=trabajo.fecha_inicio
+    ).update(
+        estado=trabajo.estado, error=trabajo.error, archivo=trabajo.archivo.name,
+        expira=trabajo.expira, fecha_termino=trabajo.fecha_termino,
+    )
+    if not guardado:
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        return None
+    return trabajo
+
+
+def purgar_expirados():
+    """Elimina los archivos vencidos y marca sus trabajos como 'Expirado'."""
+    vencidos = TrabajoReporte.objects.filter(estado='Terminado', expira__lte=timezone.now())
+    cantidad = 0
+    for trabajo in vencidos.iterator():
+        trabajo.archivo.delete(save=False)
+        trabajo.estado = 'Expirado'
+        trabajo.save(update_fields=['archivo', 'estado'])
+        cantidad += 1
+    return cantidad
@@ -12,6 +12,8 @@ urlpatterns = [
     path('documentos/', views.documentos_view, name='documentos'),
     path('documentos/eliminar/<int:doc_id>/', views.eliminar_documento_view, name='eliminar_documento'),
     path('calendario/', views.calendario_view, name='calendario'),
+    path('calendario/suscripcion/', views.suscripcion_calendario_view, name='suscripcion_calendario'),
+    path('calendario/ics/<str:token>/', views.calendario_ics_view, name='calendario_ics'),
     path('manual/', views.manual_view, name='manual'),
     path('gestion/solicitudes/', views.gestion_solicitudes_view, name='gestion_solicitudes'),
 
@@ -31,12 +33,14 @@ urlpatterns = [
     # --- Gestión de Usuarios (RRHH) ---
     path('gestion/usuarios/', views.gestion_usuarios_view, name='gestion_usuarios'),
     path('gestion/usuarios/crear/', views.crear_usuario_view, name='crear_usuario'),
+    path('gestion/usuarios/importar/', views.importar_usuarios_view, name='importar_usuarios'),
     path('gestion/usuarios/editar/<int:usuario_id>/', views.editar_usuario_view, name='editar_usuario'),
     path('gestion/usuarios/toggle/<int:usuario_id>/', views.desactivar_usuario_view, name='toggle_usuario'),
 
     # --- Vistas de Subdirección (Gestión) ---
     # Rutas para usuarios con rol de Subdirección (is_staff)
     path('gestion/calendario/', views.gestion_calendario_view, name='gestion_calendario'),
+    path('gestion/calendario/<int:evento_id>/cancelar/', views.cancelar_ocurrencia_view, name='cancelar_ocurrencia'),
     path('gestion/dias/', views.gestion_dias_view, name='gestion_dias'),
     path('gestion/documentos/', views.gestion_documentos_view, name='gestion_documentos'),
     path('gestion/licencias/', views.gestion_licencias_view, name='gestion_licencias'),
@@ -50,8 +54,15 @@ urlpatterns = [
     path('reporte/licencias/', views.reporte_licencias_view, name='reporte_licencias'),
     path('reportes/solicitudes/', views.reporte_solicitudes_view, name='reporte_solicitudes'),
     path('reportes/solicitudes/exportar/', views.exportar_solicitudes_excel, name='exportar_solicitudes_excel'),
+    path('reportes/ausencias/', views.analitica_ausencias_view, name='analitica_ausencias'),
+    path('reportes/historial-mensual/', views.historial_mensual_view, name='historial_mensual'),
     path('gestion/solicitudes/aprobar/<int:solicitud_id>/', views.aprobar_solicitud_view, name='aprobar_solicitud'),
     
+    # Reportes en segundo plano (los genera el comando procesar_reportes)
+    path('reportes/mis-reportes/', views.mis_reportes_view, name='mis_reportes'),
+    path('reportes/encolar/', views.encolar_reporte_view, name='encolar_reporte'),
+    path('reportes/descargar/<int:trabajo_id>/', views.descargar_reporte_view, name='descargar_reporte'),
+    
     # --- Historial Personal ---
     # Vista para que el funcionario vea sus propios registros
     path('mi-historial/', views.historial_personal_view, name='historial_personal'),
@@ -63,5 +74,8 @@ urlpatterns = [
    # --- API Endpoints ---
    # Rutas que retornan JSON para consumo asíncrono (AJAX)
     path('api/eventos/', views.eventos_json_view, name='eventos_json'),
+    path('api/dias-habiles/', views.dias_habiles_json_view, name='dias_habiles_json'),
+    path('api/cobertura/', views.cobertura_json_view, name='cobertura_json'),
+    path('api/ausencias/pivote/', views.ausencias_pivote_json_view, name='ausencias_pivote_json'),
     
 ]
\ No newline at end of file
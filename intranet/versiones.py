@@ -0,0 +1,42 @@
+"""
+Versiones de datos derivados guardadas en la base.
+
+Los feeds del calendario, la suscripción .ics y los feriados se guardan en
+caché con la versión de sus datos en la clave. La versión vive en la tabla
+VersionDatos y no en la caché: sin CACHES compartida cada proceso del
+servidor tiene su propia LocMemCache, y una versión guardada ahí solo se
+renovaría en el proceso que hizo el cambio; los demás seguirían sirviendo
+datos antiguos (y respondiendo 304) indefinidamente.
+
+Leer una versión es una búsqueda por clave primaria. Si se pasa la petición,
+el valor se recuerda durante ella (el ETag, Last-Modified y el cuerpo de una
+misma respuesta usan una sola lectura).
+"""
+import time
+
+from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import VersionDatos
+
+
+def version_datos(clave, request=None):
+    """Versión actual de la clave (0 si nunca cambió)."""
+    memoria = request.__dict__.setdefault('_versiones_datos', {}) if request is not None else {}
+    if clave not in memoria:
+        memoria[clave] = VersionDatos.objects.filter(clave=clave).values_list('version', flat=True).first() or 0
+    return memoria[clave]
+
+
+def renovar_version(clave):
+    """Renueva la versión de la clave; las cachés construidas con la anterior dejan de usarse."""
+    ahora = time.time_ns()
+    # Nunca retrocede aunque el reloj de otro proceso vaya atrasado
+    nueva = Greatest(F('version') + 1, Value(ahora), output_field=models.PositiveBigIntegerField())
+    if VersionDatos.objects.filter(clave=clave).update(version=nueva):
+        return
+    _, creada = VersionDatos.objects.get_or_create(clave=clave, defaults={'version': ahora})
+    if not creada:
+        # Otro proceso la creó entre ambas consultas
+        VersionDatos.objects.filter(clave=clave).update(version=nueva)
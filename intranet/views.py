@@ -3,47 +3,45 @@ from django.contrib.auth import authenticate, login as auth_login, logout as aut
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.hashers import check_password
 from django.contrib import messages
-from .models import Funcionarios, Dias_Administrativos, Comunicados, Documentos, Logs_Auditoria, Licencias, Roles, Logs_Auditoria, Eventos_Calendario, SolicitudesPermiso, Licencias, Unidades
-from django.db.models import Sum, F, Q
+from django.core.paginator import Paginator
+from .models import Funcionarios, Dias_Administrativos, Comunicados, Documentos, Licencias, Roles, Eventos_Calendario, SolicitudesPermiso, Licencias, Unidades, TrabajoReporte
+from django.db import IntegrityError
+from django.db.models import Sum, Q
 from django.utils import timezone
-from datetime import datetime
-from .forms import DiasAdministrativosForm
-from django.http import JsonResponse, HttpResponse
-import openpyxl
+from datetime import datetime, timedelta
+from .roles import es_director, es_subdireccion, es_admin, puede_gestionar
+from .dias_habiles import calcular_dias_habiles
+from .solapamientos import buscar_solapamientos, describir_solapamientos
+from .idempotencia import idempotente
+from .cobertura import anotar_cobertura, cobertura_mes
+from .exportacion import (
+    ENCABEZADOS_SOLICITUDES, ENCABEZADOS_LICENCIAS, ENCABEZADOS_LOGS, ENCABEZADOS_FUNCIONARIOS, ENCABEZADOS_HISTORIAL,
+    fechas_periodo, filtrar_solicitudes, filtrar_licencias, filtrar_logs, filas_solicitudes, filas_licencias, filas_logs, filas_funcionarios, filas_historial,
+    licencias_visibles, pide_csv, respuesta_csv, respuesta_excel
+)
+from .trabajos import TIPOS_REPORTE, ReporteNoPermitido, encolar_reporte
+from .estadisticas import expresion_dias, totales_licencias, pivote_ausencias, rango_meses
+from .resumenes import comparacion_interanual, historial_mensual
+from .auditoria import acciones_registradas, actores_registrados, historial_de, pagina_logs, registrar_auditoria
+from .calendario import (
+    CACHE_VERSION_AUSENCIAS, ausencias_serializadas, es_capa_ausencias, es_ocurrencia, etag_eventos, feed_serializado, proximos_eventos,
+    ultima_modificacion_eventos, ventana_calendario, version_calendario,
+)
+from .ical import calendario_ics, etag_suscripcion, generar_token, usuario_de_token
+from .importacion import ImportacionInvalida, importar_funcionarios
+from .saldos import filas_saldos, funcionarios_con_saldo, guardar_saldos
+from .flujo_solicitudes import (
+    aplicar_transicion, bandeja_inicial, bandeja_jefe, bandejas_de_usuario, contar_pendientes,
+    solicitudes_en_bandejas, TransicionInvalida
+)
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
 from django.contrib.auth.forms import AuthenticationForm
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 # --- Funciones de Ayuda (para proteger vistas y verificar roles) ---
 
-def es_director(user):
-    """Verifica si el usuario es Director General (máximo nivel)."""
-    return user.is_superuser or (user.id_rol and user.id_rol.nombre_rol == 'Director General')
-
-def es_subdireccion(user):
-    """Verifica si el usuario es Subdirección o superior (nivel <= 2)."""
-    if user.is_superuser:
-        return True
-    if user.id_rol:
-        return user.id_rol.nivel_jerarquico <= 2  # Director o Subdirección
-    return False
-
-def es_jefe_unidad(user):
-    """Verifica si el usuario es Jefe de Unidad."""
-    return user.es_jefe_unidad
-
-def es_admin(user):
-    """Verifica si el usuario es superusuario (Director General)."""
-    return user.is_superuser
-
-def puede_gestionar(user):
-    """Verifica si el usuario puede gestionar solicitudes (Jefe, Subdirección o Director)."""
-    if user.is_superuser:
-        return True
-    if user.is_staff:
-        return True
-    if user.id_rol:
-        return user.id_rol.nivel_jerarquico <= 3 or user.es_jefe_unidad
-    return user.es_jefe_unidad
-
 def obtener_funcionarios_de_unidad(user):
     """
     Retorna los funcionarios que el usuario puede gestionar según su rol.
@@ -53,48 +51,29 @@ def obtener_funcionarios_de_unidad(user):
     """
     if es_subdireccion(user):
         return Funcionarios.objects.all()
-    elif user.es_jefe_unidad and user.id_unidad:
-        return Funcionarios.objects.filter(id_unidad=user.id_unidad)
+    elif user.es_jefe_unidad and user.id_unidad_id:
+        return Funcionarios.objects.filter(id_unidad_id=user.id_unidad_id)
     else:
         return Funcionarios.objects.filter(pk=user.pk)
 
 def obtener_solicitudes_para_usuario(user):
     """
     Retorna las solicitudes que el usuario puede ver/gestionar según su rol.
-    Implementa la lógica de flujo con casos especiales.
+    Las bandejas se leen desde BandejaAprobacion (solo solicitudes abiertas),
+    mantenida en cada cambio de estado (ver flujo_solicitudes.py).
     """
     if es_director(user):
-        # Director ve TODO + solicitudes de Subdirección pendientes para él
+        # Director ve TODO (incluye las solicitudes de Subdirección dirigidas a él)
         return SolicitudesPermiso.objects.all()
     
-    elif es_subdireccion(user) and not es_director(user):
-        # Subdirección ve:
-        # 1. Solicitudes Pre-Aprobadas (listas para aprobación final)
-        # 2. Solicitudes Pendientes de funcionarios sin jefe (saltan pre-aprobación)
-        # 3. Solicitudes Pendientes de Jefes de Unidad (van directo a Subdirección)
-        
-        # Solicitudes pre-aprobadas
-        pre_aprobadas = Q(estado='Pre-Aprobado')
-        
-        # Solicitudes pendientes de jefes de unidad (ellos no pueden auto-aprobarse)
-        de_jefes = Q(estado='Pendiente', id_funcionario_solicitante__es_jefe_unidad=True)
-        
-        # Solicitudes pendientes de unidades sin jefe
-        unidades_con_jefe = Funcionarios.objects.filter(es_jefe_unidad=True).values_list('id_unidad', flat=True)
-        sin_jefe = Q(estado='Pendiente') & ~Q(id_funcionario_solicitante__id_unidad__in=unidades_con_jefe)
-        
-        return SolicitudesPermiso.objects.filter(pre_aprobadas | de_jefes | sin_jefe)
-    
-    elif user.es_jefe_unidad and user.id_unidad:
-        # Jefe de Unidad ve solicitudes Pendientes de SU unidad (excepto las suyas)
-        return SolicitudesPermiso.objects.filter(
-            estado='Pendiente',
-            id_funcionario_solicitante__id_unidad=user.id_unidad
-        ).exclude(id_funcionario_solicitante=user)
+    bandejas = bandejas_de_usuario(user)
+    if bandejas:
+        # Subdirección: pre-aprobadas, pendientes de jefes y de unidades sin jefe
+        # Jefe de Unidad: pendientes de su unidad
+        return solicitudes_en_bandejas(bandejas)
     
-    else:
-        # Funcionario normal: solo ve sus propias solicitudes
-        return SolicitudesPermiso.objects.filter(id_funcionario_solicitante=user)
+    # Funcionario normal: solo ve sus propias solicitudes
+    return SolicitudesPermiso.objects.filter(id_funcionario_solicitante=user)
 
 # --- 1. Vistas de Autenticación (Login Robusto) ---
 
@@ -160,7 +139,6 @@ def dashboard_view(request):
     user = request.user
     from django.db.models import Q, Count
     from django.utils import timezone
-    from datetime import timedelta
     
     hoy = timezone.now().date()
     inicio_mes = hoy.replace(day=1)
@@ -191,10 +169,7 @@ def dashboard_view(request):
         ).order_by('-fecha_publicacion')[:5]
     
     # 4. Próximos eventos (7 días)
-    proximos_eventos = Eventos_Calendario.objects.filter(
-        fecha_inicio__gte=hoy,
-        fecha_inicio__lte=hoy + timedelta(days=7)
-    ).order_by('fecha_inicio')[:5]
+    proximos = proximos_eventos(hoy)
     
     # Contexto base para todos
     context = {
@@ -204,7 +179,7 @@ def dashboard_view(request):
         'horas_comp': saldos.horas_compensacion,
         'mis_solicitudes': mis_solicitudes,
         'comunicados': comunicados,
-        'proximos_eventos': proximos_eventos,
+        'proximos_eventos': proximos,
         'es_jefe': user.es_jefe_unidad,
         'es_subdir': es_subdireccion(user),
         'fecha_hoy': hoy,
@@ -218,10 +193,7 @@ def dashboard_view(request):
         ).count()
         
         # Solicitudes pendientes de pre-aprobar
-        solicitudes_pendientes = SolicitudesPermiso.objects.filter(
-            estado='Pendiente',
-            id_funcionario_solicitante__id_unidad=user.id_unidad
-        ).exclude(id_funcionario_solicitante=user).count()
+        solicitudes_pendientes = contar_pendientes(user)
         
         # Funcionarios con licencia activa hoy
         con_licencia_hoy = Licencias.objects.filter(
@@ -239,10 +211,9 @@ def dashboard_view(request):
         ).aggregate(total=Count('id'))['total'] or 0
         
         # Solicitudes pendientes detalle
-        solicitudes_pendientes_lista = SolicitudesPermiso.objects.filter(
-            estado='Pendiente',
-            id_funcionario_solicitante__id_unidad=user.id_unidad
-        ).exclude(id_funcionario_solicitante=user).order_by('-fecha_solicitud')[:5]
+        solicitudes_pendientes_lista = solicitudes_en_bandejas(
+            [bandeja_jefe(user.id_unidad_id)]
+        ).order_by('-fecha_solicitud')[:5]
         
         context.update({
             'unidad_nombre': user.id_unidad.nombre_unidad,
@@ -259,12 +230,7 @@ def dashboard_view(request):
         total_funcionarios = Funcionarios.objects.filter(is_active=True).count()
         
         # Solicitudes por aprobar (pre-aprobadas + pendientes de jefes/sin jefe)
-        unidades_con_jefe = Funcionarios.objects.filter(es_jefe_unidad=True).values_list('id_unidad', flat=True)
-        solicitudes_por_aprobar = SolicitudesPermiso.objects.filter(
-            Q(estado='Pre-Aprobado') |
-            Q(estado='Pendiente', id_funcionario_solicitante__es_jefe_unidad=True) |
-            (Q(estado='Pendiente') & ~Q(id_funcionario_solicitante__id_unidad__in=unidades_con_jefe))
-        ).count()
+        solicitudes_por_aprobar = contar_pendientes(user)
         
         # Funcionarios con licencia activa hoy (todo CESFAM)
         con_licencia_hoy_total = Licencias.objects.filter(
@@ -273,10 +239,8 @@ def dashboard_view(request):
         ).count()
         
         # Solicitudes por aprobar detalle
-        solicitudes_aprobar_lista = SolicitudesPermiso.objects.filter(
-            Q(estado='Pre-Aprobado') |
-            Q(estado='Pendiente', id_funcionario_solicitante__es_jefe_unidad=True) |
-            (Q(estado='Pendiente') & ~Q(id_funcionario_solicitante__id_unidad__in=unidades_con_jefe))
+        solicitudes_aprobar_lista = solicitudes_en_bandejas(
+            bandejas_de_usuario(user)
         ).order_by('-fecha_solicitud')[:5]
         
         # Ausencias por unidad este mes
@@ -302,6 +266,14 @@ def dashboard_view(request):
             is_active=True
         ).count()
         
+        # Comparación interanual desde los resúmenes mensuales (mismo periodo del año anterior)
+        aprobadas_anio = sum(
+            mes['cantidad'] for mes in historial_mensual('solicitudes', hoy.year, estado='Aprobado')[:hoy.month]
+        )
+        aprobadas_anio_anterior = sum(
+            mes['cantidad'] for mes in historial_mensual('solicitudes', hoy.year - 1, estado='Aprobado')[:hoy.month]
+        )
+        
         context.update({
             'total_funcionarios': total_funcionarios,
             'solicitudes_por_aprobar': solicitudes_por_aprobar,
@@ -309,6 +281,8 @@ def dashboard_view(request):
             'solicitudes_aprobar_lista': solicitudes_aprobar_lista,
             'ausencias_por_unidad': ausencias_por_unidad,
             'nuevos_mes': nuevos_mes,
+            'aprobadas_anio': aprobadas_anio,
+            'aprobadas_anio_anterior': aprobadas_anio_anterior,
         })
     
     return render(request, 'dashboard.html', context)
@@ -398,18 +372,26 @@ def documentos_view(request):
     query = request.GET.get('q')
     cat_filter = request.GET.get('cat')
     
-    docs = Documentos.objects.filter(filtro).distinct().order_by('-fecha_carga')
+    # Los filtros solo siguen llaves foráneas hacia adelante: no repiten filas y no hace falta DISTINCT
+    docs = Documentos.objects.filter(filtro).order_by('-fecha_carga')
     
     if query:
         docs = docs.filter(titulo__icontains=query)
     if cat_filter:
         docs = docs.filter(categoria=cat_filter)
     
+    # Listado paginado: la visibilidad combina varias reglas con OR y ningún
+    # índice la resuelve, así que se corta con LIMIT sobre doc_fecha_carga_idx
+    pagina = Paginator(docs, 50).get_page(request.GET.get('page'))
+    filtros = request.GET.copy()
+    filtros.pop('page', None)
+    
     # Obtener unidades para el formulario (solo para superiores)
     unidades = Unidades.objects.all() if es_superior else None
         
     return render(request, 'documentos.html', {
-        'documentos': docs,
+        'documentos': pagina,
+        'filtros_url': filtros.urlencode(),
         'unidades': unidades,
         'es_jefe': es_jefe,
         'es_superior': es_superior,
@@ -443,6 +425,7 @@ def calendario_view(request):
     """
     Vista para mostrar el calendario de eventos.
     Los eventos se cargan dinámicamente vía AJAX desde 'eventos_json_view'.
+    Jefaturas y Subdirección ven además la capa de ausencias de su equipo.
     
     Args:
         request (HttpRequest): La petición HTTP.
@@ -450,8 +433,56 @@ def calendario_view(request):
     Returns:
         HttpResponse: Renderiza 'calendario.html'.
     """
-    # Aquí se listarán los eventos del modelo Eventos_Calendario
-    return render(request, 'calendario.html')
+    token = request.user.token_calendario
+    context = {
+        'mostrar_ausencias': puede_gestionar(request.user),
+        'url_suscripcion': request.build_absolute_uri(reverse('calendario_ics', args=[token])) if token else None,
+    }
+    return render(request, 'calendario.html', context)
+
+@login_required(login_url='login')
+def suscripcion_calendario_view(request):
+    """
+    Genera (o regenera) el enlace secreto de suscripción .ics del usuario.
+    Regenerarlo revoca el enlace anterior.
+    
+    Args:
+        request (HttpRequest): La petición HTTP (POST).
+        
+    Returns:
+        HttpResponse: Redirige al calendario.
+    """
+    if request.method == 'POST':
+        nuevo = not request.user.token_calendario
+        generar_token(request.user)
+        if nuevo:
+            messages.success(request, 'Enlace de suscripción creado. Agréguelo en la aplicación de calendario de su teléfono.')
+        else:
+            messages.success(request, 'Enlace de suscripción regenerado. El enlace anterior ya no funciona.')
+    return redirect('calendario')
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_suscripcion)
+def calendario_ics_view(request, token):
+    """
+    Suscripción iCalendar del funcionario dueño del token: calendario institucional
+    y sus permisos aprobados. No requiere sesión (la consultan las aplicaciones de
+    calendario); si nada cambió responde 304 leyendo solo las versiones de sus datos.
+    
+    Args:
+        request (HttpRequest): La petición HTTP.
+        token (str): Token secreto de la suscripción.
+        
+    Returns:
+        HttpResponse: Archivo text/calendar, o 404 si el token no es válido.
+    """
+    usuario_id = usuario_de_token(token, request)
+    if usuario_id is None:
+        raise Http404("Suscripción no encontrada.")
+    
+    response = HttpResponse(calendario_ics(usuario_id, request=request), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="cesfam.ics"'
+    return response
 
 @login_required(login_url='login')
 def manual_view(request):
@@ -467,6 +498,7 @@ def manual_view(request):
     return render(request, 'manual.html')
 
 @login_required(login_url='login')
+@idempotente
 def gestion_solicitudes_view(request):
     """
     Vista para que el Funcionario envíe solicitudes de permisos.
@@ -500,7 +532,13 @@ def gestion_solicitudes_view(request):
                     'saldos': saldos
                 })
 
-            dias_solicitados = (fecha_fin - fecha_inicio).days + 1
+            # Solo cuentan días hábiles (sin fines de semana ni feriados)
+            dias_solicitados = calcular_dias_habiles(fecha_inicio, fecha_fin)
+            if dias_solicitados == 0:
+                return render(request, 'gestion_solicitudes.html', {
+                    'error': 'El rango seleccionado no contiene días hábiles (fin de semana o feriado).',
+                    'saldos': saldos
+                })
             
             # --- VALIDACIONES POR TIPO ---
             
@@ -553,6 +591,14 @@ def gestion_solicitudes_view(request):
                     'saldos': saldos
                 })
             
+            # No se permiten permisos que se crucen con otros o con licencias
+            solicitudes_cruce, licencias_cruce = buscar_solapamientos(user, fecha_inicio, fecha_fin)
+            if solicitudes_cruce or licencias_cruce:
+                return render(request, 'gestion_solicitudes.html', {
+                    'error': f'Las fechas se cruzan con: {describir_solapamientos(solicitudes_cruce, licencias_cruce)}',
+                    'saldos': saldos
+                })
+            
             # Crear la solicitud
             solicitud = SolicitudesPermiso.objects.create(
                 id_funcionario_solicitante=user,
@@ -563,31 +609,21 @@ def gestion_solicitudes_view(request):
                 horas_solicitadas=horas if tipo == 'hora_medica' else 0,
                 justificativo_archivo=archivo,
                 observaciones=observaciones,
-                estado='Pendiente'
+                estado='Pendiente',
+                aprobador_actual=bandeja_inicial(user)
             )
             
             # --- CASO ESPECIAL: Director solicita (Auto-aprobación) ---
             if es_director(user):
-                # Descontar según tipo
-                if tipo == 'vacaciones':
-                    saldos.vacaciones_restantes -= dias_solicitados
-                    saldos.save()
-                elif tipo == 'administrativo':
-                    saldos.admin_restantes -= dias_solicitados
-                    saldos.save()
-                elif tipo == 'compensacion':
-                    saldos.horas_compensacion -= (dias_solicitados * 8)
-                    saldos.save()
+                # Aprueba y descuenta el saldo según el tipo
+                aplicar_transicion(solicitud, 'auto_aprobar', user)
                 
-                solicitud.estado = 'Aprobado'
-                solicitud.aprobado_por = user
-                solicitud.fecha_aprobacion = timezone.now()
-                solicitud.save()
-                
-                Logs_Auditoria.objects.create(
-                    id_usuario_actor=user,
-                    accion='Solicitud Auto-Aprobada (Director)',
-                    detalle=f"Director {user.username} auto-aprobó solicitud de {tipo}. Días: {dias_solicitados}"
+                registrar_auditoria(
+                    user,
+                    'Solicitud Auto-Aprobada (Director)',
+                    f"Director {user.username} auto-aprobó solicitud de {tipo}. Días: {dias_solicitados}",
+                    codigo='solicitud.auto_aprobada', objeto=solicitud,
+                    datos={'tipo': tipo, 'dias': dias_solicitados},
                 )
             
             return redirect('historial_personal')
@@ -646,6 +682,8 @@ def gestion_documentos_view(request):
 def gestion_calendario_view(request):
     """
     Vista para que la Subdirección agregue eventos al calendario.
+    Un evento puede repetirse cada N semanas o meses (opcionalmente hasta una fecha);
+    la serie se guarda en una sola fila y sus ocurrencias se expanden al mostrarlas.
     
     Args:
         request (HttpRequest): La petición HTTP.
@@ -658,24 +696,76 @@ def gestion_calendario_view(request):
         titulo = request.POST.get('titulo')
         tipo_evento = request.POST.get('tipo_evento')
         fecha_inicio = request.POST.get('fecha_inicio')
+        frecuencia = request.POST.get('frecuencia', '')
+        repetir_hasta = request.POST.get('repetir_hasta') or None
         
         # 2. Validar y crear
-        if titulo and fecha_inicio:
+        try:
+            intervalo = int(request.POST.get('intervalo') or 1)
+        except ValueError:
+            intervalo = 0
+        if frecuencia not in dict(Eventos_Calendario.FRECUENCIAS) or intervalo < 1:
+            messages.error(request, 'La repetición indicada no es válida.')
+        elif frecuencia and (tipo_evento or '').lower() == 'feriado':
+            messages.error(request, 'Los feriados no pueden repetirse: regístrelos por fecha.')
+        elif frecuencia and repetir_hasta and fecha_inicio and repetir_hasta < fecha_inicio:
+            messages.error(request, 'La fecha "repetir hasta" debe ser posterior a la de inicio.')
+        elif titulo and fecha_inicio:
             Eventos_Calendario.objects.create(
                 titulo=titulo,
                 tipo_evento=tipo_evento,
-                fecha_inicio=fecha_inicio
+                fecha_inicio=fecha_inicio,
+                frecuencia=frecuencia,
+                intervalo=intervalo,
+                repetir_hasta=repetir_hasta if frecuencia else None,
             )
             # 3. Redirige al calendario (RF7)
             return redirect('calendario')
-            
-    # Se obtienen datos si se necesitan para un selector, pero por ahora solo renderiza
-    return render(request, 'gestion_calendario.html')
+    
+    # Series vigentes, para cancelar ocurrencias puntuales
+    series = Eventos_Calendario.objects.exclude(frecuencia='').filter(
+        Q(repetir_hasta__isnull=True) | Q(repetir_hasta__gte=timezone.localdate())
+    ).order_by('titulo')
+    context = {
+        'frecuencias': Eventos_Calendario.FRECUENCIAS,
+        'series': series,
+    }
+    return render(request, 'gestion_calendario.html', context)
+
+@login_required(login_url='login')
+@user_passes_test(es_subdireccion, login_url='login')
+def cancelar_ocurrencia_view(request, evento_id):
+    """
+    Cancela una ocurrencia de un evento recurrente (ej. la reunión semanal de un feriado)
+    agregando su fecha a las excepciones de la serie.
+    
+    Args:
+        request (HttpRequest): La petición HTTP (POST con 'fecha' YYYY-MM-DD).
+        evento_id (int): ID de la serie.
+        
+    Returns:
+        HttpResponse: Redirige a la gestión del calendario.
+    """
+    evento = get_object_or_404(Eventos_Calendario.objects.exclude(frecuencia=''), pk=evento_id)
+    if request.method == 'POST':
+        try:
+            fecha = datetime.strptime(request.POST.get('fecha', ''), '%Y-%m-%d').date()
+        except ValueError:
+            fecha = None
+        if fecha is None or not es_ocurrencia(evento, fecha):
+            messages.error(request, 'La fecha indicada no corresponde a una ocurrencia de la serie.')
+        else:
+            evento.excepciones = sorted(set(evento.excepciones) | {fecha.isoformat()})
+            evento.save(update_fields=['excepciones'])
+            messages.success(request, f'Ocurrencia del {fecha:%d/%m/%Y} de "{evento.titulo}" cancelada.')
+    return redirect('gestion_calendario')
 
 @login_required(login_url='login')
 def gestion_dias_view(request):
     """
     Vista para gestionar los días administrativos y vacaciones de los funcionarios.
+    Muestra una grilla editable (una consulta para todas las filas) y guarda
+    juntas las filas modificadas, en una transacción (ver saldos.py).
     Filtra según el rol:
     - Director/Subdirección: Ve todos los funcionarios
     - Jefe de Unidad: Solo ve funcionarios de su unidad
@@ -686,62 +776,21 @@ def gestion_dias_view(request):
     if not puede_gestionar(user):
         return redirect('dashboard')
     
-    # Filtrar funcionarios según rol
-    funcionarios_qs = obtener_funcionarios_de_unidad(user).order_by('username')
-    funcionarios_data = []
-    
-    for f in funcionarios_qs:
-        try:
-            dias = f.dias_administrativos
-            vacaciones = dias.vacaciones_restantes
-            admin = dias.admin_restantes
-        except Dias_Administrativos.DoesNotExist:
-            vacaciones = 0
-            admin = 0
-            
-        funcionarios_data.append({
-            'pk': f.pk,
-            'username': f.username,
-            'first_name': f.first_name,
-            'last_name': f.last_name,
-            'vacaciones': vacaciones,
-            'admin': admin,
-            'unidad': f.id_unidad.nombre_unidad if f.id_unidad else 'Sin unidad',
-            'rol': f.id_rol.nombre_rol if f.id_rol else 'Sin rol',
-        })
+    # Filtrar funcionarios según rol; las filas enviadas de otros se ignoran
+    funcionarios = funcionarios_con_saldo(obtener_funcionarios_de_unidad(user))
+    filas = filas_saldos(funcionarios, request.POST if request.method == 'POST' else None)
 
     # Lógica de PROCESAMIENTO (POST)
     if request.method == 'POST':
-        funcionario_id = request.POST.get('funcionario_id')
-        funcionario_obj = get_object_or_404(Funcionarios, pk=funcionario_id)
-        
-        # Verificar que puede modificar a este funcionario
-        if not es_subdireccion(user):
-            if user.id_unidad != funcionario_obj.id_unidad:
-                return redirect('gestion_dias')
-        
-        dias_obj, created = Dias_Administrativos.objects.get_or_create(
-            id_funcionario=funcionario_obj
-        )
-        
-        form = DiasAdministrativosForm(request.POST, instance=dias_obj)
-
-        if form.is_valid():
-            form.save()
-            
-            # Log de auditoría
-            Logs_Auditoria.objects.create(
-                id_usuario_actor=user,
-                accion='Modificación de Días',
-                detalle=f"Se modificaron los días de {funcionario_obj.username}"
-            )
+        # Validar todas las filas (sin cortar en la primera) antes de guardar
+        if all([formulario.is_valid() for _, formulario in filas if formulario.is_bound]):
+            cambiados = guardar_saldos(user, filas)
+            messages.success(request, f'Se actualizaron los días de {len(cambiados)} funcionario(s).')
             return redirect('gestion_dias')
-    
-    form = DiasAdministrativosForm() 
+        messages.error(request, 'Hay valores inválidos; no se guardó ningún cambio.')
     
     context = {
-        'funcionarios': funcionarios_data,
-        'form': form,
+        'filas': filas,
         'es_jefe': user.es_jefe_unidad,
         'unidad_usuario': user.id_unidad.nombre_unidad if user.id_unidad else 'Sin unidad',
     }
@@ -797,12 +846,14 @@ def gestion_licencias_view(request):
 @login_required(login_url='login')
 def reporte_licencias_view(request):
     """
-    Vista para listar licencias registradas.
+    Vista para listar licencias registradas, con días por licencia y totales
+    por funcionario y por unidad calculados en la base de datos.
     - Subdirección/Director: Ve todas las licencias
     - Jefe de Unidad: Ve solo licencias de su unidad
     
     Args:
-        request (HttpRequest): La petición HTTP.
+        request (HttpRequest): La petición HTTP. Filtros opcionales por GET:
+            'desde', 'hasta' (YYYY-MM-DD), 'unidad', 'funcionario' y 'page'.
         
     Returns:
         HttpResponse: Renderiza 'reporte_licencias.html'.
@@ -813,21 +864,42 @@ def reporte_licencias_view(request):
     if not puede_gestionar(user):
         return redirect('dashboard')
     
-    # Filtrar licencias según rol
-    if es_subdireccion(user):
-        # Subdirección ve todas las licencias
-        licencias = Licencias.objects.all().order_by('-fecha_registro')
-    else:
-        # Jefe de Unidad ve solo licencias de su unidad
-        licencias = Licencias.objects.filter(
-            id_funcionario__id_unidad=user.id_unidad
-        ).order_by('-fecha_registro')
+    # Filtrar licencias según rol (Subdirección: todas; Jefe de Unidad: su unidad)
+    try:
+        desde, hasta = fechas_periodo(request.GET)
+        licencias = filtrar_licencias(request.GET, licencias_visibles(user))
+    except ValueError:
+        messages.error(request, 'Filtros inválidos.')
+        return redirect('reporte_licencias')
+    
+    if pide_csv(request):
+        return respuesta_csv('licencias.csv', ENCABEZADOS_LICENCIAS, filas_licencias(licencias))
+    
+    # Totales del periodo (días recortados al rango filtrado)
+    totales = totales_licencias(licencias, desde, hasta, limite_funcionarios=20)
+    
+    # Listado paginado con funcionario y unidad en la misma consulta
+    listado = (
+        licencias.select_related('id_funcionario__id_unidad')
+        .annotate(duracion=expresion_dias())
+        .order_by('-fecha_registro', '-pk')
+    )
+    pagina = Paginator(listado, 50).get_page(request.GET.get('page'))
+    
+    # Filtros actuales para los enlaces de paginación
+    filtros = request.GET.copy()
+    filtros.pop('page', None)
     
     context = {
-        'licencias': licencias,
-        # 2. Eliminamos la línea que causaba el FieldError. 
-        #    La suma de días es un cálculo complejo que haremos después si sobra tiempo.
-        'dias_totales': 0 
+        'licencias': pagina,
+        'dias_totales': totales['total_dias'],
+        'total_licencias': totales['total_licencias'],
+        'totales_unidad': totales['por_unidad'],
+        'totales_funcionario': totales['por_funcionario'],
+        'unidades': Unidades.objects.order_by('nombre_unidad') if es_subdireccion(user) else [],
+        'funcionarios': obtener_funcionarios_de_unidad(user).order_by('last_name', 'first_name'),
+        'filtros': request.GET,
+        'filtros_url': filtros.urlencode(),
     }
     return render(request, 'reporte_licencias.html', context)
 
@@ -848,8 +920,23 @@ def reporte_solicitudes_view(request):
     if not puede_gestionar(user):
         return redirect('dashboard')
     
-    # Obtener solicitudes según rol
-    solicitudes = obtener_solicitudes_para_usuario(user).order_by('-fecha_solicitud')
+    # Exportación CSV con el mismo alcance que la bandeja
+    if pide_csv(request):
+        return respuesta_csv(
+            'solicitudes.csv', ENCABEZADOS_SOLICITUDES, filas_solicitudes(obtener_solicitudes_para_usuario(user))
+        )
+    
+    # Obtener solicitudes según rol, paginadas: el Director ve todo el historial
+    solicitudes = Paginator(
+        obtener_solicitudes_para_usuario(user)
+        .select_related('id_funcionario_solicitante__id_unidad')
+        .order_by('-fecha_solicitud'),
+        50,
+    ).get_page(request.GET.get('page'))
+    # Se lee la página una vez para que la cobertura quede en las mismas instancias
+    solicitudes.object_list = list(solicitudes.object_list)
+    # Ausentes de la unidad durante cada solicitud abierta (un cálculo por unidad)
+    anotar_cobertura(solicitudes.object_list)
     
     # Determinar qué acción puede hacer el usuario
     puede_aprobar_final = es_subdireccion(user)
@@ -861,52 +948,120 @@ def reporte_solicitudes_view(request):
         'puede_pre_aprobar': puede_pre_aprobar,
         'es_jefe': user.es_jefe_unidad,
         'unidad_usuario': user.id_unidad.nombre_unidad if user.id_unidad else 'Sin unidad',
+        # Filtros del formulario de exportación
+        'unidades': Unidades.objects.order_by('nombre_unidad') if puede_aprobar_final else [],
+        'estados': SolicitudesPermiso.ESTADOS,
     }
     return render(request, 'reporte_solicitudes.html', context)
 
 @user_passes_test(es_subdireccion, login_url='login')
 def exportar_solicitudes_excel(request):
     """
-    Exporta las solicitudes pendientes a un archivo Excel.
-    Genera un reporte descargable para gestión externa.
+    Exporta las solicitudes a un archivo Excel.
+    Genera un reporte descargable para gestión externa; el libro se escribe
+    en modo write-only leyendo la base por lotes, por lo que admite exportar
+    años de historial con memoria constante.
+    
+    Args:
+        request (HttpRequest): La petición HTTP. Filtros opcionales por GET:
+            'desde', 'hasta' (YYYY-MM-DD), 'unidad' y 'estado'
+            (por defecto 'Pendiente'; 'todos' exporta cualquier estado).
+        
+    Returns:
+        FileResponse: Archivo Excel (.xlsx) adjunto.
+    """
+    try:
+        solicitudes = filtrar_solicitudes(request.GET)
+    except ValueError:
+        messages.error(request, 'Filtros de exportación inválidos.')
+        return redirect('reporte_solicitudes')
+
+    estado = request.GET.get('estado') or 'Pendiente'
+    sufijo = 'todas' if estado == 'todos' else estado.lower().replace('-', '_')
+    return respuesta_excel(
+        f'solicitudes_{sufijo}.xlsx',
+        'Solicitudes',
+        ENCABEZADOS_SOLICITUDES,
+        filas_solicitudes(solicitudes),
+    )
+
+@login_required(login_url='login')
+def encolar_reporte_view(request):
+    """
+    Encola un reporte para generarlo en segundo plano (comando procesar_reportes).
+    Si el usuario ya pidió el mismo reporte con los mismos filtros y sigue
+    pendiente o vigente, se reutiliza en vez de generarlo de nuevo.
+    
+    Args:
+        request (HttpRequest): POST con 'tipo' (ver trabajos.TIPOS_REPORTE) y sus filtros.
+        
+    Returns:
+        HttpResponse: Redirección a 'Mis Reportes'.
+    """
+    if request.method != 'POST':
+        return redirect('mis_reportes')
+    
+    tipo = request.POST.get('tipo', '')
+    try:
+        trabajo, creado = encolar_reporte(request.user, tipo, request.POST)
+    except ReporteNoPermitido:
+        messages.error(request, 'No tienes permisos para generar este reporte.')
+        return redirect('mis_reportes')
+    except ValueError:
+        messages.error(request, 'Filtros del reporte inválidos.')
+        return redirect('mis_reportes')
+    
+    if creado:
+        messages.success(request, f'Reporte #{trabajo.pk} encolado. Estará disponible aquí en unos minutos.')
+    else:
+        messages.info(request, f'Ya tienes este reporte ({trabajo.estado.lower()}): #{trabajo.pk}.')
+    return redirect('mis_reportes')
+
+@login_required(login_url='login')
+def mis_reportes_view(request):
+    """
+    Lista los reportes en segundo plano del usuario con su estado y enlace de descarga.
     
     Args:
         request (HttpRequest): La petición HTTP.
         
     Returns:
-        HttpResponse: Archivo Excel (.xlsx) adjunto.
-    """
-    response = HttpResponse(content_type='application/ms-excel')
-    response['Content-Disposition'] = 'attachment; filename="solicitudes_pendientes.xlsx"'
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Solicitudes Pendientes"
-
-    # Encabezados
-    headers = ['Funcionario', 'Tipo Permiso', 'Desde', 'Hasta', 'Días', 'Fecha Solicitud', 'Estado']
-    ws.append(headers)
-
-    # Datos
-    solicitudes = SolicitudesPermiso.objects.filter(estado='Pendiente').order_by('-fecha_solicitud')
-    for sol in solicitudes:
-        ws.append([
-            f"{sol.id_funcionario_solicitante.first_name} {sol.id_funcionario_solicitante.last_name}",
-            sol.tipo_permiso,
-            sol.fecha_inicio.strftime('%Y-%m-%d'),
-            sol.fecha_fin.strftime('%Y-%m-%d'),
-            sol.dias_solicitados,
-            sol.fecha_solicitud.strftime('%Y-%m-%d %H:%M'),
-            sol.estado
-        ])
-
-    wb.save(response)
-    return response
+        HttpResponse: Renderiza 'mis_reportes.html'.
+    """
+    trabajos = list(TrabajoReporte.objects.filter(usuario=request.user).order_by('-fecha_creacion')[:50])
+    for trabajo in trabajos:
+        trabajo.nombre = TIPOS_REPORTE.get(trabajo.tipo, {}).get('nombre', trabajo.tipo)
+    
+    context = {
+        'trabajos': trabajos,
+        # La página se recarga sola mientras haya reportes en cola
+        'hay_en_cola': any(t.estado in ('Pendiente', 'En Proceso') for t in trabajos),
+    }
+    return render(request, 'mis_reportes.html', context)
+
+@login_required(login_url='login')
+def descargar_reporte_view(request, trabajo_id):
+    """
+    Descarga el archivo de un reporte terminado y vigente del propio usuario.
+    
+    Args:
+        request (HttpRequest): La petición HTTP.
+        trabajo_id (int): ID del TrabajoReporte.
+        
+    Returns:
+        FileResponse: El archivo generado, o 404 si no existe, no es del usuario o expiró.
+    """
+    trabajo = get_object_or_404(TrabajoReporte, pk=trabajo_id, usuario=request.user, estado='Terminado')
+    if not trabajo.archivo or (trabajo.expira and trabajo.expira <= timezone.now()):
+        raise Http404('El reporte expiró.')
+    return FileResponse(trabajo.archivo.open('rb'), as_attachment=True, filename=trabajo.archivo.name.rsplit('/', 1)[-1])
 
 @login_required(login_url='login')
+@idempotente
 def aprobar_solicitud_view(request, solicitud_id):
     """
-    Procesa la aprobación/pre-aprobación de una solicitud según el rol del usuario.
+    Procesa la aprobación/pre-aprobación/rechazo de una solicitud.
+    Las acciones permitidas por estado y rol están en flujo_solicitudes.TRANSICIONES.
     
     Flujo:
     - Director que solicita: Auto-aprobado
@@ -920,91 +1075,54 @@ def aprobar_solicitud_view(request, solicitud_id):
         user = request.user
         accion = request.POST.get('accion', 'aprobar')
         
-        # --- RECHAZAR (cualquier nivel puede rechazar) ---
-        if accion == 'rechazar':
-            comentario = request.POST.get('comentario_rechazo', '')
-            solicitud.estado = 'Rechazado'
-            solicitud.comentario_rechazo = comentario
-            solicitud.save()
-            
-            # Log de auditoría
-            Logs_Auditoria.objects.create(
-                id_usuario_actor=user,
-                accion='Solicitud Rechazada',
-                detalle=f"Solicitud #{solicitud.pk} de {solicitud.id_funcionario_solicitante.username} rechazada. Motivo: {comentario}"
+        # --- Verificar que no se cruce con permisos aprobados o licencias ---
+        if accion in ('pre_aprobar', 'aprobar'):
+            solicitudes_cruce, licencias_cruce = buscar_solapamientos(
+                solicitud.id_funcionario_solicitante,
+                solicitud.fecha_inicio,
+                solicitud.fecha_fin,
+                excluir_solicitud=solicitud,
+                estados=('Aprobado',),
             )
-            return redirect('reporte_solicitudes')
-        
-        # --- PRE-APROBAR (Solo Jefe de Unidad) ---
-        if accion == 'pre_aprobar' and solicitud.estado == 'Pendiente':
-            if user.es_jefe_unidad:
-                solicitud.estado = 'Pre-Aprobado'
-                solicitud.pre_aprobado_por = user
-                solicitud.fecha_pre_aprobacion = timezone.now()
-                solicitud.save()
-                
-                # Log de auditoría
-                Logs_Auditoria.objects.create(
-                    id_usuario_actor=user,
-                    accion='Solicitud Pre-Aprobada',
-                    detalle=f"Solicitud #{solicitud.pk} de {solicitud.id_funcionario_solicitante.username} pre-aprobada por Jefe de Unidad"
+            if solicitudes_cruce or licencias_cruce:
+                messages.error(
+                    request,
+                    f"La solicitud #{solicitud.pk} se cruza con: {describir_solapamientos(solicitudes_cruce, licencias_cruce)}"
                 )
+                return redirect('reporte_solicitudes')
+        
+        comentario = request.POST.get('comentario_rechazo', '')
+        try:
+            aplicar_transicion(solicitud, accion, user, comentario=comentario)
+        except TransicionInvalida as e:
+            messages.error(request, str(e))
             return redirect('reporte_solicitudes')
         
-        # --- APROBAR FINAL (Solo Subdirección o Director) ---
-        if accion == 'aprobar' and solicitud.estado in ['Pendiente', 'Pre-Aprobado']:
-            if es_subdireccion(user):
-                
-                # Obtener saldos del solicitante
-                saldos, created = Dias_Administrativos.objects.get_or_create(
-                    id_funcionario=solicitud.id_funcionario_solicitante,
-                    defaults={'vacaciones_restantes': 15, 'admin_restantes': 6, 'horas_compensacion': 0}
-                )
-                
-                # Lógica por tipo de permiso
-                tipo = solicitud.tipo_permiso
-                
-                # Licencia Médica: Crea registro en tabla Licencias
-                if tipo == 'licencia':
-                    Licencias.objects.create(
-                        id_funcionario=solicitud.id_funcionario_solicitante,
-                        id_subdireccion_carga=user,
-                        fecha_inicio=solicitud.fecha_inicio,
-                        fecha_fin=solicitud.fecha_fin,
-                        ruta_foto_licencia=solicitud.justificativo_archivo 
-                    )
-                
-                # Vacaciones: Descuenta del saldo
-                elif tipo == 'vacaciones':
-                    saldos.vacaciones_restantes -= solicitud.dias_solicitados
-                    saldos.save()
-                
-                # Día Administrativo: Descuenta del saldo
-                elif tipo == 'administrativo':
-                    saldos.admin_restantes -= solicitud.dias_solicitados
-                    saldos.save()
-                
-                # Compensación: Descuenta horas (8 por día)
-                elif tipo == 'compensacion':
-                    saldos.horas_compensacion -= (solicitud.dias_solicitados * 8)
-                    saldos.save()
-                
-                # Sin goce, Duelo, Hora médica: No descuentan saldo
-                # (solo se aprueban)
-                
-                # Marcar como aprobada
-                solicitud.estado = 'Aprobado'
-                solicitud.aprobado_por = user
-                solicitud.fecha_aprobacion = timezone.now()
-                solicitud.save()
-                
-                # Log de auditoría
-                tipo_display = dict(SolicitudesPermiso.TIPOS_PERMISO).get(tipo, tipo)
-                Logs_Auditoria.objects.create(
-                    id_usuario_actor=user,
-                    accion='Solicitud Aprobada',
-                    detalle=f"Solicitud #{solicitud.pk} ({tipo_display}) de {solicitud.id_funcionario_solicitante.username} aprobada. Días: {solicitud.dias_solicitados}"
-                )
+        # Log de auditoría
+        solicitante = solicitud.id_funcionario_solicitante.username
+        if accion == 'rechazar':
+            registrar_auditoria(
+                user,
+                'Solicitud Rechazada',
+                f"Solicitud #{solicitud.pk} de {solicitante} rechazada. Motivo: {comentario}",
+                codigo='solicitud.rechazada', objeto=solicitud, datos={'motivo': comentario},
+            )
+        elif accion == 'pre_aprobar':
+            registrar_auditoria(
+                user,
+                'Solicitud Pre-Aprobada',
+                f"Solicitud #{solicitud.pk} de {solicitante} pre-aprobada por Jefe de Unidad",
+                codigo='solicitud.pre_aprobada', objeto=solicitud,
+            )
+        else:
+            tipo_display = dict(SolicitudesPermiso.TIPOS_PERMISO).get(solicitud.tipo_permiso, solicitud.tipo_permiso)
+            registrar_auditoria(
+                user,
+                'Solicitud Aprobada',
+                f"Solicitud #{solicitud.pk} ({tipo_display}) de {solicitante} aprobada. Días: {solicitud.dias_solicitados}",
+                codigo='solicitud.aprobada', objeto=solicitud,
+                datos={'tipo': solicitud.tipo_permiso, 'dias': solicitud.dias_solicitados},
+            )
 
     return redirect('reporte_solicitudes')
 
@@ -1029,7 +1147,15 @@ def crear_solicitud_view(request):
             if fecha_fin < fecha_inicio:
                 return render(request, 'gestion_solicitudes.html', {'error': 'La fecha de término no puede ser anterior a la de inicio.'})
             
-            dias_solicitados = (fecha_fin - fecha_inicio).days + 1
+            dias_solicitados = calcular_dias_habiles(fecha_inicio, fecha_fin)
+            if dias_solicitados == 0:
+                return render(request, 'gestion_solicitudes.html', {'error': 'El rango seleccionado no contiene días hábiles.'})
+            
+            solicitudes_cruce, licencias_cruce = buscar_solapamientos(user, fecha_inicio, fecha_fin)
+            if solicitudes_cruce or licencias_cruce:
+                return render(request, 'gestion_solicitudes.html', {
+                    'error': f'Las fechas se cruzan con: {describir_solapamientos(solicitudes_cruce, licencias_cruce)}'
+                })
             
             # Crear la solicitud
             solicitud = SolicitudesPermiso.objects.create(
@@ -1039,27 +1165,21 @@ def crear_solicitud_view(request):
                 fecha_fin=fecha_fin,
                 dias_solicitados=dias_solicitados,
                 justificativo_archivo=archivo,
-                estado='Pendiente'
+                estado='Pendiente',
+                aprobador_actual=bandeja_inicial(user)
             )
             
             # --- CASO ESPECIAL: Director solicita (Auto-aprobación) ---
             if es_director(user):
                 # Auto-aprobar y descontar días
-                if tipo in ['vacaciones', 'administrativo']:
-                    campo = 'vacaciones_restantes' if tipo == 'vacaciones' else 'admin_restantes'
-                    Dias_Administrativos.objects.filter(id_funcionario=user).update(
-                        **{campo: F(campo) - dias_solicitados}
-                    )
-                
-                solicitud.estado = 'Aprobado'
-                solicitud.aprobado_por = user
-                solicitud.fecha_aprobacion = timezone.now()
-                solicitud.save()
+                aplicar_transicion(solicitud, 'auto_aprobar', user)
                 
-                Logs_Auditoria.objects.create(
-                    id_usuario_actor=user,
-                    accion='Solicitud Auto-Aprobada (Director)',
-                    detalle=f"Director {user.username} auto-aprobó solicitud de {tipo}. Días: {dias_solicitados}"
+                registrar_auditoria(
+                    user,
+                    'Solicitud Auto-Aprobada (Director)',
+                    f"Director {user.username} auto-aprobó solicitud de {tipo}. Días: {dias_solicitados}",
+                    codigo='solicitud.auto_aprobada', objeto=solicitud,
+                    datos={'tipo': tipo, 'dias': dias_solicitados},
                 )
             
             return redirect('historial_personal')
@@ -1109,10 +1229,11 @@ def admin_roles_view(request):
             user.save()
             
             # Registrar en Logs (RF18)
-            Logs_Auditoria.objects.create(
-                id_usuario_actor=request.user,
-                accion='Cambio de Rol',
-                detalle=f"Se cambió el rol de {user.username} a {role.nombre_rol}"
+            registrar_auditoria(
+                request.user,
+                'Cambio de Rol',
+                f"Se cambió el rol de {user.username} a {role.nombre_rol}",
+                codigo='usuario.rol_cambiado', objeto=user, datos={'rol': role.pk},
             )
             
         except (Funcionarios.DoesNotExist, Roles.DoesNotExist):
@@ -1133,17 +1254,40 @@ def admin_roles_view(request):
 def admin_logs_view(request):
     """
     Vista para visualizar los logs de auditoría del sistema.
-    Permite al Administrador rastrear acciones críticas.
+    Permite al Administrador rastrear acciones críticas, filtrando por actor,
+    acción y rango de fechas. Pagina por cursor (ver auditoria.pagina_logs),
+    así cualquier página de cualquier filtro cuesta lo mismo.
     
     Args:
-        request (HttpRequest): La petición HTTP.
+        request (HttpRequest): La petición HTTP con 'actor', 'accion', 'desde',
+            'hasta' y el cursor 'antes'/'despues' (todos opcionales).
         
     Returns:
         HttpResponse: Renderiza la tabla de logs.
     """
-    logs_list = Logs_Auditoria.objects.all().order_by('-fecha_hora')
+    try:
+        logs_list = filtrar_logs(request.GET)
+        # La exportación no necesita la página ni los filtros del formulario
+        if pide_csv(request):
+            return respuesta_csv('logs_auditoria.csv', ENCABEZADOS_LOGS, filas_logs(logs_list))
+        pagina = pagina_logs(logs_list, request.GET)
+    except ValueError:
+        messages.error(request, 'Filtros inválidos.')
+        return redirect('logs_auditoria')
+    
+    # Filtros actuales para los enlaces de paginación
+    filtros = request.GET.copy()
+    for clave in ('antes', 'despues'):
+        filtros.pop(clave, None)
+    
     context = {
-        'logs': logs_list
+        'logs': pagina['registros'],
+        'cursor_antes': pagina['antes'],
+        'cursor_despues': pagina['despues'],
+        'actores': actores_registrados(),
+        'acciones': acciones_registradas(),
+        'filtros': request.GET,
+        'filtros_url': filtros.urlencode(),
     }
     return render(request, 'admin_logs.html', context)
 
@@ -1169,6 +1313,11 @@ def historial_personal_view(request):
     # 2. Historial de licencias: licencias emitidas a este funcionario
     licencias_recibidas = Licencias.objects.filter(id_funcionario=user).order_by('-fecha_inicio')
     
+    if pide_csv(request):
+        return respuesta_csv(
+            f'historial_{user.username}.csv', ENCABEZADOS_HISTORIAL, filas_historial(solicitudes, licencias_recibidas)
+        )
+    
     # 3. Saldos del funcionario
     saldos, created = Dias_Administrativos.objects.get_or_create(
         id_funcionario=user,
@@ -1183,34 +1332,178 @@ def historial_personal_view(request):
     return render(request, 'historial_personal.html', context)
 
 @login_required(login_url='login')
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_eventos, last_modified_func=ultima_modificacion_eventos)
 def eventos_json_view(request):
     """
     Vista que retorna los eventos del calendario en formato JSON para FullCalendar.
-    Adapta los datos del modelo Eventos_Calendario al formato esperado por la librería JS.
+    Solo entrega los eventos que se solapan con la ventana visible. Si el calendario
+    no cambió desde la última visita (ETag/Last-Modified), responde 304 leyendo solo su versión.
+    Con 'capa=ausencias' entrega en cambio los permisos aprobados y licencias de los
+    funcionarios que el usuario gestiona (Jefe: su unidad; Subdirección: todos).
     
     Args:
-        request (HttpRequest): La petición HTTP.
+        request (HttpRequest): La petición HTTP con 'start' y 'end' (ISO, fin exclusivo)
+            enviados por FullCalendar (sin ellos se usa el mes actual) y 'capa' opcional.
         
     Returns:
-        JsonResponse: Lista de eventos en formato JSON.
-    """
-    # 1. Obtener todos los eventos
-    eventos = Eventos_Calendario.objects.all()
-    
-    # 2. Adaptar los datos al formato específico que FullCalendar espera
-    data = []
-    for evento in eventos:
-        data.append({
-            'title': f"{evento.tipo_evento}: {evento.titulo}",
-            # Formato YYYY-MM-DD para FullCalendar
-            'start': evento.fecha_inicio.strftime('%Y-%m-%d'), 
-            # Si hay fecha fin, la usa, sino, usa la de inicio
-            'end': evento.fecha_fin.strftime('%Y-%m-%d') if evento.fecha_fin else evento.fecha_inicio.strftime('%Y-%m-%d'),
-            'color': '#f4a460' if evento.tipo_evento == 'Feriado' else '#1E4A7B',
-            'allDay': True,
-        })
+        JsonResponse: Lista de eventos en formato JSON, o un error 400.
+    """
+    try:
+        inicio, fin = ventana_calendario(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    if es_capa_ausencias(request):
+        contenido = ausencias_serializadas(
+            request.user, obtener_funcionarios_de_unidad(request.user), inicio, fin,
+            version_calendario(CACHE_VERSION_AUSENCIAS, request),
+        )
+    else:
+        contenido = feed_serializado(inicio, fin, version_calendario(request=request))
+    return HttpResponse(contenido, content_type='application/json')
+
+@login_required(login_url='login')
+@user_passes_test(es_subdireccion, login_url='login')
+def analitica_ausencias_view(request):
+    """
+    Vista de analítica de ausencias: días aprobados por unidad, tipo de permiso
+    y mes (incluye licencias médicas). Reemplaza los resúmenes armados a mano
+    desde la exportación a Excel.
+    
+    Args:
+        request (HttpRequest): La petición HTTP con 'desde' y 'hasta' (YYYY-MM) opcionales.
         
-    return JsonResponse(data, safe=False)
+    Returns:
+        HttpResponse: Renderiza 'analitica_ausencias.html'.
+    """
+    try:
+        desde, hasta = rango_meses(request.GET)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('analitica_ausencias')
+    
+    context = {
+        'pivote': pivote_ausencias(desde, hasta),
+        'desde': desde,
+        'hasta': hasta,
+    }
+    return render(request, 'analitica_ausencias.html', context)
+
+@login_required(login_url='login')
+@user_passes_test(es_subdireccion, login_url='login')
+def historial_mensual_view(request):
+    """
+    Comparación interanual de volúmenes (solicitudes, días de permiso y de licencia,
+    registros de auditoría) leída desde los resúmenes mensuales, sin recorrer el historial.
+    
+    Args:
+        request (HttpRequest): La petición HTTP con 'anio' opcional.
+        
+    Returns:
+        HttpResponse: Renderiza 'historial_mensual.html'.
+    """
+    try:
+        anio = int(request.GET.get('anio') or timezone.localdate().year)
+    except ValueError:
+        anio = timezone.localdate().year
+    
+    comparacion = comparacion_interanual(anio)
+    nombres_meses = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+                     'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+    context = {
+        'anio': anio,
+        'anio_anterior': anio - 1,
+        'filas': zip(nombres_meses, comparacion['meses']),
+        'totales': comparacion['totales'],
+        'actualizado': comparacion['actualizado'],
+    }
+    return render(request, 'historial_mensual.html', context)
+
+@login_required(login_url='login')
+@user_passes_test(es_subdireccion, login_url='login')
+def ausencias_pivote_json_view(request):
+    """
+    Retorna en JSON el pivote de ausencias aprobadas (unidad x tipo x mes).
+    Los meses cerrados se calculan una vez y se guardan (ver estadisticas.py).
+    
+    Args:
+        request (HttpRequest): La petición HTTP con 'desde' y 'hasta' (YYYY-MM) opcionales.
+        
+    Returns:
+        JsonResponse: {'meses': [...], 'filas': [...]} o un error 400.
+    """
+    try:
+        desde, hasta = rango_meses(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse(pivote_ausencias(desde, hasta))
+
+@login_required(login_url='login')
+def dias_habiles_json_view(request):
+    """
+    Retorna en JSON la cantidad de días hábiles entre dos fechas.
+    Lo usa el formulario de solicitudes para mostrar los días que se descontarán.
+    
+    Args:
+        request (HttpRequest): La petición HTTP con 'inicio' y 'fin' (YYYY-MM-DD).
+        
+    Returns:
+        JsonResponse: {'dias': N} o un error 400 si las fechas son inválidas.
+    """
+    try:
+        inicio = datetime.strptime(request.GET.get('inicio', ''), '%Y-%m-%d').date()
+        fin = datetime.strptime(request.GET.get('fin', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Formato de fecha inválido.'}, status=400)
+    
+    return JsonResponse({'dias': calcular_dias_habiles(inicio, fin)})
+
+@login_required(login_url='login')
+def cobertura_json_view(request):
+    """
+    Retorna en JSON la cobertura diaria de una unidad para un mes.
+    Jefe de Unidad: solo su unidad. Subdirección/Director: cualquier unidad.
+    
+    Args:
+        request (HttpRequest): La petición HTTP con 'unidad' (opcional, por defecto
+            la del usuario) y 'mes' (YYYY-MM, por defecto el mes actual).
+        
+    Returns:
+        JsonResponse: dotación y ausentes/disponibles por día, o un error 400/403.
+    """
+    user = request.user
+    if not puede_gestionar(user):
+        return JsonResponse({'error': 'No autorizado.'}, status=403)
+    
+    try:
+        id_unidad = int(request.GET.get('unidad') or user.id_unidad_id or 0)
+        mes = datetime.strptime(request.GET.get('mes') or timezone.localdate().strftime('%Y-%m'), '%Y-%m')
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos.'}, status=400)
+    
+    if not es_subdireccion(user) and id_unidad != user.id_unidad_id:
+        return JsonResponse({'error': 'Solo puedes consultar la cobertura de tu unidad.'}, status=403)
+    if not Unidades.objects.filter(pk=id_unidad).exists():
+        return JsonResponse({'error': 'Unidad no encontrada.'}, status=404)
+    
+    cobertura = cobertura_mes(id_unidad, mes.year, mes.month)
+    dotacion = cobertura['dotacion']
+    dias = [
+        {
+            'fecha': (cobertura['desde'] + timedelta(days=i)).isoformat(),
+            'ausentes': ausentes,
+            'disponibles': max(dotacion - ausentes, 0),
+        }
+        for i, ausentes in enumerate(cobertura['ausentes'])
+    ]
+    return JsonResponse({
+        'unidad': id_unidad,
+        'mes': mes.strftime('%Y-%m'),
+        'dotacion': dotacion,
+        'dias': dias,
+    })
 
 @login_required(login_url='login')
 def crear_comunicado_view(request):
@@ -1251,10 +1544,12 @@ def crear_comunicado_view(request):
             
             # Registrar en Logs
             destino_txt = "Global" if unidad_destino is None else unidad_destino.nombre_unidad
-            Logs_Auditoria.objects.create(
-                id_usuario_actor=user,
-                accion='Creación de Comunicado',
-                detalle=f"Se publicó comunicado '{titulo}' para: {destino_txt}"
+            registrar_auditoria(
+                user,
+                'Creación de Comunicado',
+                f"Se publicó comunicado '{titulo}' para: {destino_txt}",
+                codigo='comunicado.creado', objeto=comunicado,
+                datos={'unidad_destino': getattr(unidad_destino, 'pk', None)},
             )
             
             return redirect('dashboard')
@@ -1292,10 +1587,11 @@ def editar_comunicado_view(request, comunicado_id):
             comunicado.save()
             
             # Registrar en Logs
-            Logs_Auditoria.objects.create(
-                id_usuario_actor=user,
-                accion='Edición de Comunicado',
-                detalle=f"Se editó el comunicado ID {comunicado.id}: {titulo}"
+            registrar_auditoria(
+                user,
+                'Edición de Comunicado',
+                f"Se editó el comunicado ID {comunicado.id}: {titulo}",
+                codigo='comunicado.editado', objeto=comunicado,
             )
             
             return redirect('dashboard')
@@ -1317,10 +1613,11 @@ def eliminar_comunicado_view(request, comunicado_id):
         return redirect('dashboard')
     
     # Registrar en Logs antes de borrar
-    Logs_Auditoria.objects.create(
-        id_usuario_actor=user,
-        accion='Eliminación de Comunicado',
-        detalle=f"Se eliminó el comunicado: {comunicado.titulo}"
+    registrar_auditoria(
+        user,
+        'Eliminación de Comunicado',
+        f"Se eliminó el comunicado: {comunicado.titulo}",
+        codigo='comunicado.eliminado', objeto=comunicado, datos={'titulo': comunicado.titulo},
     )
     
     comunicado.delete()
@@ -1344,6 +1641,8 @@ def gestion_usuarios_view(request):
     
     # Obtener todos los funcionarios (excepto superusuarios)
     funcionarios = Funcionarios.objects.filter(is_superuser=False).select_related('id_rol', 'id_unidad').order_by('id_unidad__nombre_unidad', 'last_name')
+    if pide_csv(request):
+        return respuesta_csv('funcionarios.csv', ENCABEZADOS_FUNCIONARIOS, filas_funcionarios(funcionarios))
     unidades = Unidades.objects.filter(activa=True).order_by('nombre_unidad')
     roles = Roles.objects.all().order_by('nivel_jerarquico')
     
@@ -1402,10 +1701,12 @@ def crear_usuario_view(request):
             Dias_Administrativos.objects.create(id_funcionario=nuevo_usuario)
             
             # Registrar en logs
-            Logs_Auditoria.objects.create(
-                id_usuario_actor=user,
-                accion='Creación de Usuario',
-                detalle=f"Se creó el usuario: {username} ({first_name} {last_name}) - Unidad: {nuevo_usuario.id_unidad}"
+            registrar_auditoria(
+                user,
+                'Creación de Usuario',
+                f"Se creó el usuario: {username} ({first_name} {last_name}) - Unidad: {nuevo_usuario.id_unidad}",
+                codigo='usuario.creado', objeto=nuevo_usuario,
+                datos={'unidad': nuevo_usuario.id_unidad_id, 'rol': nuevo_usuario.id_rol_id},
             )
             
             return redirect('gestion_usuarios')
@@ -1417,6 +1718,43 @@ def crear_usuario_view(request):
     return render(request, 'crear_usuario.html', context)
 
 
+@login_required(login_url='login')
+def importar_usuarios_view(request):
+    """
+    Vista para importar funcionarios en lote desde un archivo CSV o Excel.
+    Valida todas las filas antes de crear usuarios: si alguna tiene errores
+    no se crea ninguno y se muestran todos los errores (ver importacion.py).
+    """
+    user = request.user
+    
+    if not es_subdireccion(user):
+        return redirect('dashboard')
+    
+    errores = []
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            errores = [(0, 'Debe seleccionar un archivo.')]
+        else:
+            try:
+                creados = importar_funcionarios(archivo, user)
+            except ImportacionInvalida as e:
+                errores = e.errores
+            except IntegrityError:
+                # Otro usuario creó uno de los nombres entre la validación y la inserción
+                errores = [(0, 'Uno de los usuarios se creó mientras se importaba; intente nuevamente.')]
+            else:
+                messages.success(request, f'Se importaron {len(creados)} funcionarios.')
+                return redirect('gestion_usuarios')
+    
+    context = {
+        'errores': errores,
+        'unidades': Unidades.objects.filter(activa=True).order_by('nombre_unidad'),
+        'roles': Roles.objects.all().order_by('nivel_jerarquico'),
+    }
+    return render(request, 'importar_usuarios.html', context)
+
+
 @login_required(login_url='login')
 def editar_usuario_view(request, usuario_id):
     """
@@ -1455,16 +1793,20 @@ def editar_usuario_view(request, usuario_id):
         usuario.save()
         
         # Registrar en logs
-        Logs_Auditoria.objects.create(
-            id_usuario_actor=user,
-            accion='Edición de Usuario',
-            detalle=f"Se editó el usuario: {usuario.username}"
+        registrar_auditoria(
+            user,
+            'Edición de Usuario',
+            f"Se editó el usuario: {usuario.username}",
+            codigo='usuario.editado', objeto=usuario,
+            datos={'unidad': usuario.id_unidad_id, 'rol': usuario.id_rol_id, 'es_jefe_unidad': es_jefe,
+                   'cambio_password': bool(nueva_password)},
         )
         
         return redirect('gestion_usuarios')
     
     context = {
         'usuario': usuario,
+        'historial': historial_de(usuario).select_related('id_usuario_actor')[:20],
         'unidades': Unidades.objects.filter(activa=True).order_by('nombre_unidad'),
         'roles': Roles.objects.all().order_by('nivel_jerarquico'),
     }
@@ -1491,10 +1833,11 @@ def desactivar_usuario_view(request, usuario_id):
     usuario.save()
     
     estado = "activado" if usuario.is_active else "desactivado"
-    Logs_Auditoria.objects.create(
-        id_usuario_actor=user,
-        accion=f'Usuario {estado.capitalize()}',
-        detalle=f"Se {estado} el usuario: {usuario.username}"
+    registrar_auditoria(
+        user,
+        f'Usuario {estado.capitalize()}',
+        f"Se {estado} el usuario: {usuario.username}",
+        codigo=f'usuario.{estado}', objeto=usuario,
     )
     
     return redirect('gestion_usuarios')
\ No newline at end of file